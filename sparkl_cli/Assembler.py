@@ -0,0 +1,310 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Incremental assembly of listen events into transaction trees.
+
+Each event is assigned to a transaction by, in order:
+
+    1. its txn id, if it has one.
+    2. the transaction of any event named in its cause list.
+    3. otherwise it starts a new transaction keyed by its own id.
+
+An assembled transaction is emitted as:
+
+    {
+        "tag": "txn",
+        "attr": {
+            "id": "C-E2-4V0Q-000",
+            "status": "complete",
+            "events": 12,
+            "first": 1530000000123,
+            "last": 1530000000456,
+            "duration_ms": 333
+        },
+        "content": [...]
+    }
+
+where content holds the root events, each with the events it caused
+appended to its own content, and status is one of:
+
+    complete
+        an event matched the end predicate.
+
+    idle
+        no event arrived for the idle time.
+
+    timeout
+        the transaction was open for longer than the timeout.
+
+    evicted
+        it was the least recently active when the open transactions
+        or their events reached the limit.
+
+    eof
+        it was still open at the end of the input.
+
+Events arriving for a recently emitted transaction are counted as
+late and dropped, rather than starting a fragment. Events with no
+txn, known cause or id are counted as unkeyed and dropped.
+
+Time is given by the caller, either arrival time or event time, so
+that replayed input can be assembled as it happened.
+"""
+from __future__ import print_function
+
+import heapq
+import itertools
+from collections import (
+    OrderedDict)
+
+from sparkl_cli import (
+    event)
+
+# Transaction keys remembered after emission, to drop late events.
+CLOSED_KEYS = 10000
+
+STATUSES = ("complete", "idle", "timeout", "evicted", "eof")
+
+
+class Transaction(object):  # pylint: disable=too-few-public-methods
+    """
+    The events received so far for one transaction.
+    """
+
+    def __init__(self, key, now):
+        self.key = key
+        self.active = now
+        self.events = []
+
+
+class Assembler(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Assembles events into transactions, bounded by the idle time,
+    timeout and limits on open transactions and events. Each method
+    returns the list of transactions emitted as a result.
+    """
+
+    def __init__(self, idle_secs=5.0, timeout_secs=60.0,
+                 max_txns=10000, max_events=1000000, end=None):
+        self.idle_secs = idle_secs
+        self.timeout_secs = timeout_secs
+        self.max_txns = max_txns
+        self.max_events = max_events
+        self.end = end
+
+        # Open transactions, least recently active first.
+        self.open = OrderedDict()
+        self.owners = {}
+        self.closed = OrderedDict()
+        self.deadlines = []
+        self.sequence = itertools.count()
+        self.events = 0
+
+        self.counts = dict.fromkeys(STATUSES, 0)
+        self.counts["late"] = 0
+        self.counts["unkeyed"] = 0
+
+    def add(self, term, now):
+        """
+        Adds the event received at time now.
+        """
+        emitted = self.expire(now)
+
+        key = self.__key(term)
+        if key is None:
+            self.counts["unkeyed"] += 1
+            return emitted
+        if key in self.closed:
+            self.counts["late"] += 1
+            return emitted
+
+        txn = self.open.get(key)
+        if txn is None:
+            txn = Transaction(key, now)
+            self.open[key] = txn
+            heapq.heappush(
+                self.deadlines,
+                (now + self.timeout_secs, next(self.sequence), txn))
+        else:
+            self.open.move_to_end(key)
+            txn.active = now
+
+        txn.events.append(term)
+        self.events += 1
+        event_id = event.event_id(term)
+        if event_id is not None:
+            self.owners[event_id] = key
+
+        if self.end and self.end(term):
+            emitted.append(self.__emit(txn, "complete"))
+
+        while self.open and (len(self.open) > self.max_txns or
+                             self.events > self.max_events):
+            (_, oldest) = next(iter(self.open.items()))
+            emitted.append(self.__emit(oldest, "evicted"))
+
+        return emitted
+
+    def __key(self, term):
+        """
+        Returns the transaction key of the event, or None if it has
+        neither txn, known cause nor id.
+        """
+        key = event.txn(term)
+        if key is not None:
+            return key
+
+        for cause in event.causes(term):
+            key = self.owners.get(cause)
+            if key is not None:
+                return key
+
+        return event.event_id(term)
+
+    def expire(self, now):
+        """
+        Emits transactions idle or open for too long at time now.
+        """
+        emitted = []
+        while self.open:
+            (_, txn) = next(iter(self.open.items()))
+            if now - txn.active < self.idle_secs:
+                break
+            emitted.append(self.__emit(txn, "idle"))
+
+        while self.deadlines and self.deadlines[0][0] <= now:
+            (_, _, txn) = heapq.heappop(self.deadlines)
+            if self.open.get(txn.key) is txn:
+                emitted.append(self.__emit(txn, "timeout"))
+
+        # Drop heap entries of emitted transactions once they dominate.
+        if len(self.deadlines) > 2 * len(self.open) + 64:
+            self.deadlines = [
+                entry for entry in self.deadlines
+                if self.open.get(entry[2].key) is entry[2]]
+            heapq.heapify(self.deadlines)
+
+        return emitted
+
+    def next_expiry(self):
+        """
+        Returns the time at which the next transaction can expire,
+        or None if none are open.
+        """
+        if not self.open:
+            return None
+
+        (_, txn) = next(iter(self.open.items()))
+        result = txn.active + self.idle_secs
+        if self.deadlines:
+            result = min(result, self.deadlines[0][0])
+        return result
+
+    def drain(self):
+        """
+        Emits all open transactions, at the end of input.
+        """
+        return [self.__emit(txn, "eof")
+                for txn in list(self.open.values())]
+
+    def __emit(self, txn, status):
+        """
+        Closes the transaction and returns its tree.
+        """
+        del self.open[txn.key]
+        self.events -= len(txn.events)
+        for term in txn.events:
+            self.owners.pop(event.event_id(term), None)
+
+        self.closed[txn.key] = True
+        if len(self.closed) > CLOSED_KEYS:
+            self.closed.popitem(last=False)
+
+        self.counts[status] += 1
+        return tree(txn.key, status, txn.events)
+
+    def stats(self):
+        """
+        Returns the struct of counts by status.
+        """
+        attr = dict(self.counts)
+        attr["open"] = len(self.open)
+        return {
+            "tag": "txn_stats",
+            "attr": attr
+        }
+
+
+def tree(key, status, events):
+    """
+    Returns the transaction struct, with each event nested in the
+    content of the first of its causes in the transaction.
+    """
+    nodes = OrderedDict()
+    for term in events:
+        attr = dict(term.get("attr") or {})
+        for prop in ("id", "timestamp"):
+            if prop in term:
+                attr.setdefault(prop, term[prop])
+        node = {
+            "tag": term.get("tag"),
+            "attr": attr,
+            "content": list(term.get("content") or [])
+        }
+        nodes[event.event_id(term) or id(node)] = node
+
+    parents = {}
+    for node_id in nodes:
+        for cause in event.causes(nodes[node_id]):
+            if cause in nodes and not caused_by(parents, cause, node_id):
+                parents[node_id] = cause
+                break
+
+    roots = []
+    for (node_id, node) in nodes.items():
+        if node_id in parents:
+            nodes[parents[node_id]]["content"].append(node)
+        else:
+            roots.append(node)
+
+    stamps = [stamp for stamp in map(event.timestamp, events)
+              if stamp is not None]
+    attr = {
+        "id": key,
+        "status": status,
+        "events": len(events)
+    }
+    if stamps:
+        attr["first"] = min(stamps)
+        attr["last"] = max(stamps)
+        attr["duration_ms"] = attr["last"] - attr["first"]
+
+    return {
+        "tag": "txn",
+        "attr": attr,
+        "content": roots
+    }
+
+
+def caused_by(parents, node_id, ancestor):
+    """
+    Returns True if the ancestor is the node or one of its parents,
+    so that a cause cycle is not nested.
+    """
+    while node_id is not None:
+        if node_id == ancestor:
+            return True
+        node_id = parents.get(node_id)
+    return False
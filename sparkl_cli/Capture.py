@@ -0,0 +1,252 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Websocket traffic capture and replay for offline Service profiling.
+
+A capture file is gzip-compressed JSON, one term per line. The first
+line is a header:
+
+    {"service": "Scratch/Primes/REST", "start": 1530000000.0}
+
+and each following line is a frame:
+
+    [0.0153, "in", "{\"request\": \"Mix/Test\", ...}"]
+
+where the first element is the offset in seconds from the start,
+the second is "in" or "out" and the third is the frame text.
+
+The RecordingSocket wraps a live websocket, recording every frame.
+The ReplaySocket stands in for a websocket, yielding the captured
+inbound request and consume frames and discarding the replies sent.
+
+Solicits sent during replay are answered at once, through the deliver
+function of the ReplaySocket, with the responses captured for the
+same solicit path in turn. A solicit with no captured response gets
+the DEFAULT_RESPONSE, with no data.
+"""
+from __future__ import print_function
+
+import gzip
+import threading
+import time
+from timeit import default_timer
+
+from sparkl_cli import (
+    codec)
+
+INBOUND = "in"
+OUTBOUND = "out"
+
+# Inbound frames replayed into the implementation module. Responses
+# are not replayed in sequence since they answer solicits made by the
+# original run, but are used to answer the solicits of the replay.
+REPLAYED = ("request", "consume")
+
+DEFAULT_RESPONSE = "Ok"
+
+
+class Recorder(object):
+    """
+    Appends timestamped frames to a capture file.
+    """
+
+    def __init__(self, path, service):
+        """
+        Creates the capture file and writes the header line.
+        """
+        self.lock = threading.Lock()
+        self.file = gzip.open(path, "wt")
+        self.start = default_timer()
+        self.__write({
+            "service": service,
+            "start": time.time()})
+
+    def record(self, direction, message):
+        """
+        Writes one frame with its offset from the start of capture.
+        """
+        offset = round(default_timer() - self.start, 6)
+        self.__write([offset, direction, message])
+
+    def __write(self, term):
+        """
+        Writes the term as a single line.
+        """
+        line = codec.dumps(term) + "\n"
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(line)
+
+    def close(self):
+        """
+        Flushes and closes the capture file.
+        """
+        with self.lock:
+            self.file.close()
+
+
+class RecordingSocket(object):
+    """
+    Wraps a connected websocket, recording inbound and outbound
+    frames.
+    """
+
+    def __init__(self, connected_ws, recorder):
+        self.ws = connected_ws
+        self.recorder = recorder
+
+    def __iter__(self):
+        for message in self.ws:
+            self.recorder.record(INBOUND, message)
+            yield message
+
+    def send(self, message):
+        """
+        Records then sends the message.
+        """
+        self.recorder.record(OUTBOUND, message)
+        self.ws.send(message)
+
+    def close(self):
+        """
+        Closes the websocket and the capture file.
+        """
+        self.ws.close()
+        self.recorder.close()
+
+
+class ReplaySocket(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Iterates over the captured inbound request and consume frames,
+    at their original pace relative to the first of them or, if
+    max_speed is set, as fast as they can be handled.
+
+    Sent replies are counted and discarded. Sent solicits are counted
+    and answered by passing a response message to the deliver
+    function, see the module notes.
+    """
+
+    def __init__(self, path, max_speed=False):
+        self.path = path
+        self.max_speed = max_speed
+        self.received = 0
+        self.sent = 0
+        self.solicits = 0
+        self.defaulted = 0
+        self.elapsed = 0.0
+        self.closed = False
+        self.deliver = None
+        self.responses = read_responses(path)
+        self.lock = threading.Lock()
+
+    def __iter__(self):
+        start = default_timer()
+        first = None
+        for (offset, message) in read_capture(self.path):
+            if self.closed:
+                break
+
+            if first is None:
+                first = offset
+
+            if not self.max_speed:
+                delay = offset - first - (default_timer() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            self.received += 1
+            yield message
+
+        self.elapsed = default_timer() - start
+
+    def send(self, message):
+        """
+        Answers a solicit, otherwise discards the message.
+        """
+        term = codec.loads(message)
+        if "solicit" not in term:
+            self.sent += 1
+            return
+
+        with self.lock:
+            self.solicits += 1
+            captured = self.responses.get(term["solicit"])
+            if captured:
+                response = captured.pop(0)
+                captured.append(response)
+            else:
+                self.defaulted += 1
+                response = {
+                    "response": term["solicit"] + "/" + DEFAULT_RESPONSE}
+
+        response = dict(response, id=term["id"])
+        if self.deliver:
+            self.deliver(codec.dumps(response))
+
+    def close(self):
+        """
+        Stops the replay at the next frame.
+        """
+        self.closed = True
+
+
+def read_capture(path):
+    """
+    Generates (offset, message) for each replayed inbound frame
+    in the capture file.
+    """
+    with gzip.open(path, "rt") as capture:
+        capture.readline()
+        for line in capture:
+            (offset, direction, message) = codec.loads(line)
+            if direction != INBOUND or not message:
+                continue
+
+            term = codec.loads(message)
+            if any(key in term for key in REPLAYED):
+                yield (offset, message)
+
+
+def read_responses(path):
+    """
+    Returns the dict of solicit path to the list of inbound responses
+    captured for it, in order and without their ids.
+    """
+    solicits = {}
+    responses = {}
+    with gzip.open(path, "rt") as capture:
+        capture.readline()
+        for line in capture:
+            (_offset, direction, message) = codec.loads(line)
+            if not message:
+                continue
+
+            term = codec.loads(message)
+            if direction == OUTBOUND and "solicit" in term:
+                solicits[term.get("id")] = term["solicit"]
+            elif direction == INBOUND and "response" in term:
+                solicit_path = solicits.pop(
+                    term.get("id"), term["response"].rsplit("/", 1)[0])
+                term.pop("id", None)
+                responses.setdefault(solicit_path, []).append(term)
+    return responses
+
+
+def read_header(path):
+    """
+    Returns the header term of the capture file.
+    """
+    with gzip.open(path, "rt") as capture:
+        return codec.loads(capture.readline())
@@ -0,0 +1,100 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Pairs listen events into request and reply, or solicit and response,
+durations.
+
+A request or solicit event is held until an event of the matching
+end tag names it in its cause list. The duration is the difference
+of the event timestamps, or of the arrival times given by the caller
+where either event has no timestamp.
+
+At most MAX_PENDING starts are held, the oldest being dropped and
+counted as unmatched, so that starts with no end do not accumulate.
+"""
+from __future__ import print_function
+
+from collections import (
+    OrderedDict)
+
+from sparkl_cli import (
+    event)
+
+# End event tag to the start event tag it completes.
+PAIRS = {
+    "reply": "request",
+    "response": "solicit"
+}
+
+STARTS = frozenset(PAIRS.values())
+
+MAX_PENDING = 100000
+
+
+class Correlator(object):  # pylint: disable=too-few-public-methods
+    """
+    Matches end events to the start events they were caused by.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self.pending = OrderedDict()
+        self.unmatched = 0
+
+    def feed(self, term, now=None):
+        """
+        Adds the event, received at time now in seconds. Returns the
+        tuple (start tag, start event, seconds) if it ends a pending
+        start, otherwise None.
+        """
+        tag = term.get("tag") if isinstance(term, dict) else None
+
+        if tag in STARTS:
+            event_id = event.event_id(term)
+            if event_id is not None:
+                self.pending[event_id] = (term, now)
+                if len(self.pending) > self.max_pending:
+                    self.pending.popitem(last=False)
+                    self.unmatched += 1
+            return None
+
+        start_tag = PAIRS.get(tag)
+        if start_tag is None:
+            return None
+
+        for cause in event.causes(term):
+            (start, arrived) = self.pending.get(cause, (None, None))
+            if start is not None and start.get("tag") == start_tag:
+                del self.pending[cause]
+                return (start_tag, start, duration(
+                    start, arrived, term, now))
+
+        return None
+
+
+def duration(start, start_arrived, end, end_arrived):
+    """
+    Returns the seconds from the start to the end event, by timestamp
+    if both have one, otherwise by arrival time, or None.
+    """
+    start_stamp = event.timestamp(start)
+    end_stamp = event.timestamp(end)
+    if start_stamp is not None and end_stamp is not None:
+        return max(0, end_stamp - start_stamp) / 1000.0
+
+    if start_arrived is not None and end_arrived is not None:
+        return max(0.0, end_arrived - start_arrived)
+
+    return None
@@ -0,0 +1,192 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Rolling aggregation of listen events for the top command.
+
+Events are fed from the listen thread and counted into per-operation
+Windows. The display thread takes a snapshot at its own fixed rate,
+so the cost of drawing does not depend on the event rate.
+
+Each event counts towards the operation given by its name, or its
+tag if it has none. Events with error in their tag count as errors.
+Request to reply and solicit to response durations, see the
+Correlator module, are recorded against the start event operation.
+A transaction is active if any of its events arrived in the window.
+"""
+from __future__ import print_function
+
+import threading
+from collections import (
+    OrderedDict)
+
+from sparkl_cli import (
+    event)
+
+from sparkl_cli.Correlator import (
+    Correlator)
+
+from sparkl_cli.Subscription import (
+    GAP_TAG)
+
+from sparkl_cli.Window import (
+    SECS,
+    Window)
+
+# Display columns as (attribute, width, value format).
+COLUMNS = (
+    ("operation", 32, ".32s"),
+    ("ev/s", 9, ".1f"),
+    ("err%", 6, ".1f"),
+    ("replies", 7, "d"),
+    ("p50ms", 9, ".2f"),
+    ("p90ms", 9, ".2f"),
+    ("p99ms", 9, ".2f"),
+    ("maxms", 9, ".2f"))
+
+
+class Dashboard(object):
+    """
+    Thread-safe rolling counters over listen events.
+    """
+
+    def __init__(self, secs=SECS):
+        self.secs = secs
+        self.lock = threading.Lock()
+        self.total = Window(secs)
+        self.operations = {}
+        self.correlator = Correlator()
+        self.txns = OrderedDict()
+        self.gaps = 0
+
+    def feed(self, term, now):
+        """
+        Counts the event received at time now.
+        """
+        if not isinstance(term, dict):
+            return
+
+        tag = term.get("tag") or ""
+        with self.lock:
+            if tag == GAP_TAG:
+                self.gaps += 1
+                return
+
+            error = "error" in tag
+            self.total.count(now, error)
+            self.__operation(str(event.name(term) or tag)).count(now, error)
+
+            txn = event.txn(term)
+            if txn is not None:
+                self.txns.pop(txn, None)
+                self.txns[txn] = now
+
+            paired = self.correlator.feed(term, now)
+            if paired:
+                (start_tag, start, secs) = paired
+                if secs is not None:
+                    self.__operation(
+                        str(event.name(start) or start_tag)).observe(now, secs)
+
+    def __operation(self, name):
+        """
+        Returns the window for the operation, creating it if needed.
+        """
+        window = self.operations.get(name)
+        if window is None:
+            window = self.operations[name] = Window(self.secs)
+        return window
+
+    def snapshot(self, now):
+        """
+        Returns the struct of the window totals, and one operation
+        element per operation active in the window, busiest first.
+        """
+        with self.lock:
+            while self.txns:
+                (txn, seen) = next(iter(self.txns.items()))
+                if now - seen < self.secs:
+                    break
+                del self.txns[txn]
+
+            content = []
+            for (name, window) in self.operations.items():
+                histogram = window.histogram(now)
+                if not histogram.count and not window.rate(now):
+                    continue
+                content.append({
+                    "tag": "operation",
+                    "attr": {
+                        "operation": name,
+                        "ev/s": window.rate(now),
+                        "err%": 100.0 * window.error_rate(now),
+                        "replies": histogram.count,
+                        "p50ms": 1000.0 * histogram.percentile(50),
+                        "p90ms": 1000.0 * histogram.percentile(90),
+                        "p99ms": 1000.0 * histogram.percentile(99),
+                        "maxms": 1000.0 * histogram.max
+                    }
+                })
+
+            attr = {
+                "window": self.secs,
+                "rate": self.total.rate(now),
+                "error_rate": self.total.error_rate(now),
+                "active_txns": len(self.txns),
+                "pending": len(self.correlator.pending),
+                "gaps": self.gaps
+            }
+
+        content.sort(key=lambda op: -op["attr"]["ev/s"])
+        return {
+            "tag": "top",
+            "attr": attr,
+            "content": content
+        }
+
+
+def render(snapshot):
+    """
+    Returns the lines of text displaying the snapshot.
+    """
+    attr = snapshot["attr"]
+    lines = [
+        "events/s {Rate:.1f}  errors {Errors:.1f}%  "
+        "active txns {Txns}  pending {Pending}  gaps {Gaps}  "
+        "(last {Window}s)".format(
+            Rate=attr["rate"],
+            Errors=100.0 * attr["error_rate"],
+            Txns=attr["active_txns"],
+            Pending=attr["pending"],
+            Gaps=attr["gaps"],
+            Window=attr["window"]),
+        "",
+        " ".join(
+            "{:{Align}{Width}}".format(
+                name,
+                Align="<" if fmt == ".32s" else ">",
+                Width=width)
+            for (name, width, fmt) in COLUMNS)]
+
+    for operation in snapshot["content"]:
+        values = operation["attr"]
+        lines.append(" ".join(
+            "{:{Align}{Width}{Format}}".format(
+                values[name],
+                Align="<" if fmt == ".32s" else ">",
+                Width=width,
+                Format=fmt)
+            for (name, width, fmt) in COLUMNS))
+
+    return lines
@@ -0,0 +1,98 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Single timer thread for many deadlines.
+
+Deadlines are kept in a heap ordered by expiry, so adding one costs
+a heap push rather than a thread per timer. Cancelled deadlines stay
+in the heap until they reach the top, then are discarded.
+"""
+from __future__ import print_function
+
+import heapq
+import itertools
+import threading
+import traceback
+from timeit import default_timer
+
+
+class Deadlines(threading.Thread):
+    """
+    Daemon thread calling fun() for each deadline that expires
+    without being cancelled.
+    """
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.condition = threading.Condition()
+        self.heap = []
+        self.sequence = itertools.count()
+        self.closed = False
+
+    def add(self, secs, fun):
+        """
+        Calls fun() after secs unless cancelled. Returns the entry
+        to pass to cancel.
+        """
+        entry = [default_timer() + secs, next(self.sequence), fun]
+        with self.condition:
+            heapq.heappush(self.heap, entry)
+            if self.heap[0] is entry:
+                self.condition.notify()
+        return entry
+
+    @staticmethod
+    def cancel(entry):
+        """
+        Cancels the deadline if not already expired.
+        """
+        entry[2] = None
+
+    def run(self):
+        """
+        Sleeps until the earliest deadline, then calls back every
+        expired deadline that was not cancelled.
+        """
+        while True:
+            with self.condition:
+                if self.closed:
+                    return
+
+                expired = []
+                now = default_timer()
+                while self.heap and self.heap[0][0] <= now:
+                    expired.append(heapq.heappop(self.heap))
+
+                if not expired:
+                    timeout = self.heap[0][0] - now if self.heap else None
+                    self.condition.wait(timeout)
+                    continue
+
+            for (_, _, fun) in expired:
+                if fun:
+                    try:
+                        fun()
+                    except Exception:  # pylint: disable=broad-except
+                        traceback.print_exc()
+
+    def close(self):
+        """
+        Stops the thread, dropping any remaining deadlines.
+        """
+        with self.condition:
+            self.closed = True
+            self.heap = []
+            self.condition.notify()
@@ -0,0 +1,233 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Websocket client with the permessage-deflate extension of RFC 7692,
+which the websocket-client library does not provide.
+
+The extension is offered in the opening handshake, and used only if
+the node accepts it. Otherwise the websocket behaves exactly as a
+plain websocket-client WebSocket.
+
+Received messages with the RSV1 bit set are inflated. Once the
+extension is negotiated, text is checked as UTF-8 after inflating
+instead of on the wire, unless skip_utf8_validation is set. Sent messages
+of at least MIN_COMPRESS bytes are deflated, others are sent as they
+are, which the extension allows. The compression context is kept
+between messages unless the node asks otherwise.
+
+Payload bytes are counted in both directions, as sent or received on
+the wire and as raw text, to show the saving:
+
+    bytes_in_wire, bytes_in_raw, bytes_out_wire, bytes_out_raw
+
+If a counter function of (metric, increment) is set, each count is
+also passed to it, for example to a service Metrics.
+"""
+from __future__ import print_function
+
+import threading
+import zlib
+
+import websocket
+
+from websocket import (
+    ABNF,
+    WebSocketPayloadException,
+    WebSocketProtocolException)
+
+from websocket._abnf import (  # pylint: disable=protected-access
+    frame_buffer)
+
+from websocket._utils import (  # pylint: disable=protected-access
+    validate_utf8)
+
+EXTENSION = "permessage-deflate"
+
+OFFER = "Sec-WebSocket-Extensions: " + EXTENSION + \
+    "; client_max_window_bits"
+
+# Trailer removed from each deflated message, and restored to inflate.
+TAIL = b"\x00\x00\xff\xff"
+
+MIN_COMPRESS = 128
+
+COUNTERS = (
+    "bytes_in_wire", "bytes_in_raw", "bytes_out_wire", "bytes_out_raw")
+
+
+class DeflateFrameBuffer(frame_buffer):
+    """
+    Frame reader which accepts the RSV1 bit, noting it on the first
+    frame of each message instead of failing validation.
+    """
+
+    def __init__(self, recv_fn, skip_utf8_validation):
+        frame_buffer.__init__(self, recv_fn, skip_utf8_validation)
+        self.compressed = False
+
+    def recv_header(self):
+        """
+        Reads the header, clearing RSV1 on data frames.
+        """
+        frame_buffer.recv_header(self)
+        (fin, rsv1, rsv2, rsv3, opcode, has_mask, length) = self.header
+        if opcode in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY):
+            self.compressed = bool(rsv1)
+            rsv1 = 0
+        self.header = (fin, rsv1, rsv2, rsv3, opcode, has_mask, length)
+
+
+class DeflateWebSocket(websocket.WebSocket):
+    """
+    WebSocket negotiating permessage-deflate, see the module notes.
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, compress=True, **options):
+        websocket.WebSocket.__init__(self, **options)
+        self.compress = compress
+        self.validate_utf8 = not options.get("skip_utf8_validation")
+        self.deflating = False
+        self.inflater = None
+        self.deflater = None
+        self.reset_deflater = False
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.counter = None
+
+        # Messages must be sent in the order they were deflated.
+        self.send_lock = threading.Lock()
+        if compress:
+            self.frame_buffer = DeflateFrameBuffer(
+                self._recv, not self.validate_utf8)
+
+    def connect(self, url, **options):
+        """
+        Connects, offering the extension if compress is set.
+        """
+        if self.compress:
+            options["header"] = list(options.get("header") or []) + [OFFER]
+        websocket.WebSocket.connect(self, url, **options)
+
+        params = accepted(self.getheaders() or {})
+        if self.compress and params is not None:
+            window = int(params.get("client_max_window_bits") or 15)
+            self.deflating = True
+            self.inflater = zlib.decompressobj(-15)
+            self.deflater = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -window)
+            self.reset_deflater = "client_no_context_takeover" in params
+
+            # Compressed text is not UTF-8 until inflated.
+            self.cont_frame.skip_utf8_validation = True
+
+    def recv_data_frame(self, control_frame=False):
+        """
+        Receives the next message, inflating it if compressed.
+        """
+        (opcode, frame) = websocket.WebSocket.recv_data_frame(
+            self, control_frame)
+        if opcode not in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY):
+            return (opcode, frame)
+
+        wire = len(frame.data)
+        if self.deflating and self.frame_buffer.compressed:
+            try:
+                frame.data = self.inflater.decompress(frame.data + TAIL)
+            except zlib.error as exception:
+                raise WebSocketProtocolException(
+                    "Bad compressed message: " + str(exception))
+
+        if self.deflating and self.validate_utf8 and \
+                opcode == ABNF.OPCODE_TEXT and not validate_utf8(frame.data):
+            raise WebSocketPayloadException(
+                "Invalid UTF-8 in text message")
+
+        self.count("bytes_in_wire", wire)
+        self.count("bytes_in_raw", len(frame.data))
+        return (opcode, frame)
+
+    def create_frame(self, payload, opcode=ABNF.OPCODE_TEXT):
+        """
+        Returns the frame for the payload, deflated if negotiated and
+        large enough. Call with the send_lock held.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        raw = len(payload)
+
+        compressed = self.deflating and raw >= MIN_COMPRESS
+        if compressed:
+            flush = zlib.Z_FULL_FLUSH if self.reset_deflater \
+                else zlib.Z_SYNC_FLUSH
+            payload = self.deflater.compress(payload) + \
+                self.deflater.flush(flush)
+            if payload.endswith(TAIL):
+                payload = payload[:-len(TAIL)]
+
+        frame = ABNF(1, int(compressed), 0, 0, opcode, 1, payload)
+        self.count("bytes_out_wire", len(payload))
+        self.count("bytes_out_raw", raw)
+        return frame
+
+    def send(self, payload, opcode=ABNF.OPCODE_TEXT):
+        """
+        Sends the payload as one message.
+        """
+        with self.send_lock:
+            return self.send_frame(self.create_frame(payload, opcode))
+
+    def send_texts(self, texts):
+        """
+        Sends each text as a text message, all in one write.
+        """
+        with self.send_lock:
+            data = b"".join(
+                self.create_frame(text).format() for text in texts)
+            with self.lock:
+                if not self.connected:
+                    raise websocket.WebSocketConnectionClosedException(
+                        "socket is already closed.")
+                self.sock.sendall(data)
+
+    def count(self, metric, increment):
+        """
+        Adds to the byte counter, and passes it to any counter function.
+        """
+        self.counts[metric] += increment
+        if self.counter:
+            self.counter(metric, increment)
+
+
+def accepted(headers):
+    """
+    Returns the dict of permessage-deflate parameters accepted in the
+    handshake response headers, or None if not accepted.
+    """
+    for (name, value) in headers.items():
+        if name.lower() != "sec-websocket-extensions":
+            continue
+
+        for extension in value.split(","):
+            parts = [part.strip() for part in extension.split(";")]
+            if parts[0] != EXTENSION:
+                continue
+
+            params = {}
+            for part in parts[1:]:
+                (key, _, param) = part.partition("=")
+                params[key.strip()] = param.strip().strip('"') or None
+            return params
+
+    return None
@@ -0,0 +1,259 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Compiled event filter and projection, used by listen.
+
+An event is kept if it matches every given criterion:
+
+    tags
+        the event tag is one of these, e.g. error or data_event.
+
+    names
+        the attr.name is one of these, e.g. an operation name.
+
+    subject ids
+        the attr.subject id is one of these.
+
+    where expressions
+        PATH OP VALUE, where OP is one of = != < <= > >= or ~ for
+        substring match. VALUE is read as JSON if possible, otherwise
+        as a string, except that for ~ it is always the text given.
+        For example:
+
+            attr.name=Test
+            field.n>100
+            content[0].attr.name~div
+
+Paths select into the event with dot-separated keys and [n] list
+indexes, with an optional leading dot as in jq. The path field.NAME
+selects the value of the datum with that name in the event content.
+
+Projection replaces each kept event with its tag and the selected
+paths as attributes.
+
+Before an event is decoded, the raw text is checked for the literal
+strings any match requires, so most unwanted events are dropped
+without decoding. Only simple ASCII values are checked this way,
+since others may be escaped differently in the raw text.
+"""
+from __future__ import print_function
+
+import json
+import operator
+import re
+
+from sparkl_cli.CliException import (
+    CliException)
+
+OPERATORS = (
+    ("!=", operator.ne),
+    ("<=", operator.le),
+    (">=", operator.ge),
+    ("=", operator.eq),
+    ("<", operator.lt),
+    (">", operator.gt),
+    ("~", lambda value, part: part in str(value)))
+
+WHERE = re.compile(
+    r"^\s*([^!<>=~\s]+)\s*(!=|<=|>=|=|<|>|~)\s*(.*)$")
+
+STEP = re.compile(r"([^.\[\]]+)|\[(\d+)\]")
+
+# Values which appear in the raw JSON text exactly as given. Not /,
+# which may be sent escaped as \/.
+LITERAL = re.compile(r"^[A-Za-z0-9_ .:@-]+$")
+
+MISSING = object()
+
+
+class Filter(object):
+    """
+    Compiled predicates and projection over event terms.
+    """
+
+    def __init__(self, tags=None, names=None, subject_ids=None,
+                 wheres=None, selects=None):
+        self.predicates = []
+        self.needles = []
+        self.selects = [(path, compile_path(path))
+                        for path in selects or []]
+
+        self.__any_of(["tag"], tags)
+        self.__any_of(["attr", "name"], names)
+        self.__any_of(["attr", "subject"], subject_ids)
+        for where in wheres or []:
+            self.__where(where)
+
+    def __any_of(self, steps, values):
+        """
+        Adds the predicate that the path value is one of the values.
+        """
+        if not values:
+            return
+
+        values = frozenset(values)
+        getter = path_getter(steps)
+        self.predicates.append(
+            lambda term: getter(term) in values)
+
+        # A single value must appear literally.
+        if len(values) == 1:
+            self.__needle(next(iter(values)))
+
+    def __where(self, where):
+        """
+        Compiles and adds a PATH OP VALUE predicate.
+        """
+        match = WHERE.match(where)
+        if not match:
+            raise CliException(
+                "Bad filter expression: {Where}".format(
+                    Where=where))
+
+        (path, symbol, text) = match.groups()
+        if symbol == "~":
+            value = text
+        else:
+            try:
+                value = json.loads(text)
+            except ValueError:
+                value = text
+
+        fun = dict(OPERATORS)[symbol]
+        getter = compile_path(path)
+
+        def predicate(term):
+            """
+            Compares the path value, false if missing or incomparable.
+            """
+            actual = getter(term)
+            if actual is MISSING:
+                return False
+            try:
+                return fun(actual, value)
+            except TypeError:
+                return False
+
+        self.predicates.append(predicate)
+        if symbol in ("=", "~") and isinstance(value, str):
+            self.__needle(value)
+
+    def __needle(self, value):
+        """
+        Adds the value to the literal strings the raw text must
+        contain, if it is simple enough to appear unescaped.
+        """
+        if isinstance(value, str) and LITERAL.match(value):
+            self.needles.append(value.encode("utf-8"))
+
+    def prefilter(self, message):
+        """
+        Returns False if the raw message cannot match.
+        """
+        if isinstance(message, str):
+            message = message.encode("utf-8")
+        for needle in self.needles:
+            if needle not in message:
+                return False
+        return True
+
+    def match(self, term):
+        """
+        Returns True if the decoded term matches every predicate.
+        """
+        for predicate in self.predicates:
+            if not predicate(term):
+                return False
+        return True
+
+    def project(self, term):
+        """
+        Returns the term, or its projection if any paths are selected.
+        """
+        if not self.selects:
+            return term
+
+        attr = {}
+        for (path, getter) in self.selects:
+            value = getter(term)
+            if value is not MISSING:
+                attr[path] = value
+
+        return {
+            "tag": term.get("tag") if isinstance(term, dict) else None,
+            "attr": attr
+        }
+
+    def __bool__(self):
+        return bool(self.predicates or self.selects)
+
+
+def compile_path(path):
+    """
+    Returns a function of a term which returns the value at the path,
+    or MISSING.
+    """
+    path = path.lstrip(".")
+    if path.startswith("field."):
+        return field_getter(path[len("field."):])
+
+    steps = []
+    for (key, index) in STEP.findall(path):
+        steps.append(int(index) if index else key)
+    if not steps:
+        raise CliException(
+            "Bad path: {Path}".format(
+                Path=path))
+    return path_getter(steps)
+
+
+def path_getter(steps):
+    """
+    Returns a function of a term which follows the key and index steps.
+    """
+    def getter(term):
+        """
+        Returns the value at the steps, or MISSING.
+        """
+        for step in steps:
+            try:
+                term = term[step]
+            except (KeyError, IndexError, TypeError):
+                return MISSING
+        return term
+
+    return getter
+
+
+def field_getter(name):
+    """
+    Returns a function of an event which returns the value of the
+    named datum in its content, or MISSING.
+    """
+    def getter(term):
+        """
+        Scans the content for the datum.
+        """
+        if not isinstance(term, dict):
+            return MISSING
+
+        for item in term.get("content") or []:
+            if isinstance(item, dict) and \
+                    item.get("attr", {}).get("name") == name:
+                content = item.get("content") or [MISSING]
+                return content[0]
+        return MISSING
+
+    return getter
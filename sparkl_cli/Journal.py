@@ -0,0 +1,344 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+On-disk journal of listen events, and indexed replay.
+
+The journal directory holds segments named by the epoch milliseconds
+at which they were started:
+
+    journal-1530000000123.gz
+        the events as NDJSON, in blocks of up to BLOCK_EVENTS events.
+        Each block is a separate gzip member, so the file as a whole
+        is still readable with zcat.
+
+    journal-1530000000123.idx
+        the sparse index, one NDJSON line per block, written once the
+        block is on disk:
+
+        {"offset": 0, "length": 4096, "count": 256,
+         "first": 1530000000123, "last": 1530000001456,
+         "keys": ["C-E2-4V0Q-000", ...]}
+
+        where offset and length locate the gzip member, first and
+        last bound the event timestamps, and keys are the distinct
+        transaction, event and cause ids in the block.
+
+Replay reads the index files only, then decompresses just the blocks
+which can hold events in the time range and with the id asked for,
+which may be a transaction id, or an event id to find that event and
+the events it caused.
+
+An event is journalled after it happens, so the events of a segment
+have timestamps before the next segment was started, give or take
+the clock skew between node and client. A segment whose successor was
+started before the time range is skipped without reading its index.
+A segment started after the time range can still hold events which
+arrived late, so there the index bounds are used.
+
+Events without a timestamp are replayed only when no time range is
+given, and do not count towards the first and last of their block.
+
+A partly filled block is written once BLOCK_SECS old, by a background
+thread if no more events arrive, so that a quiet stream loses at most
+that much on a kill.
+
+A new segment is started once the current one reaches SEGMENT_BYTES.
+Segments last written more than the retention time ago are deleted.
+"""
+from __future__ import print_function
+
+import bisect
+import glob
+import gzip
+import os
+import re
+import threading
+import time
+
+from sparkl_cli import (
+    codec,
+    event)
+
+BLOCK_EVENTS = 256
+
+# Seconds after which a partly filled block is written.
+BLOCK_SECS = 5.0
+
+SEGMENT_BYTES = 16 * 1024 * 1024
+
+SEGMENT = re.compile(r"journal-(\d+)\.gz$")
+
+# Most milliseconds a node clock is taken to be ahead of ours.
+CLOCK_SKEW_MS = 60000
+
+
+class Journal(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Appends events to the current segment in the journal directory.
+    """
+
+    def __init__(self, directory, retain_days=None,
+                 block_events=BLOCK_EVENTS, segment_bytes=SEGMENT_BYTES):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.retain_secs = retain_days * 86400 if retain_days else None
+        self.block_events = block_events
+        self.segment_bytes = segment_bytes
+        self.data = None
+        self.index = None
+        self.block = []
+        self.block_started = None
+        self.first = None
+        self.last = None
+        self.keys = set()
+        self.lock = threading.RLock()
+        self.closed = threading.Event()
+        self.flusher = None
+
+    def append(self, term):
+        """
+        Adds the event to the current block, writing the block when
+        full or old enough.
+        """
+        stamp = event.timestamp(term)
+        keys = [event.txn(term), event.event_id(term)] + \
+            event.causes(term)
+        text = codec.dumps(term)
+
+        with self.lock:
+            if not self.block:
+                self.block_started = time.time()
+                self.first = self.last = None
+            if stamp is not None:
+                self.first = stamp if self.first is None else \
+                    min(self.first, stamp)
+                self.last = stamp if self.last is None else \
+                    max(self.last, stamp)
+
+            self.keys.update(
+                key for key in keys if isinstance(key, str))
+            self.block.append(text)
+
+            if len(self.block) >= self.block_events or \
+                    time.time() - self.block_started >= BLOCK_SECS:
+                self.__write_block()
+
+        if not self.flusher:
+            self.flusher = threading.Thread(target=self.__flush_loop)
+            self.flusher.daemon = True
+            self.flusher.start()
+
+    def __flush_loop(self):
+        """
+        Writes a partly filled block once old enough, until closed.
+        """
+        while not self.closed.wait(BLOCK_SECS / 5):
+            with self.lock:
+                if self.block and \
+                        time.time() - self.block_started >= BLOCK_SECS:
+                    self.__write_block()
+
+    def flush(self):
+        """
+        Writes the current block as one gzip member, then its index
+        line.
+        """
+        with self.lock:
+            self.__write_block()
+
+    def __write_block(self):
+        """
+        Writes the current block, with the lock held.
+        """
+        if not self.block:
+            return
+
+        if self.data is None:
+            self.__start_segment()
+
+        member = gzip.compress(
+            ("\n".join(self.block) + "\n").encode("utf-8"))
+        offset = self.data.tell()
+        self.data.write(member)
+        self.data.flush()
+
+        self.index.write(codec.dumps({
+            "offset": offset,
+            "length": len(member),
+            "count": len(self.block),
+            "first": self.first,
+            "last": self.last,
+            "keys": sorted(self.keys)
+        }) + "\n")
+        self.index.flush()
+
+        self.block = []
+        self.keys = set()
+        if self.data.tell() >= self.segment_bytes:
+            self.__end_segment()
+
+    def __start_segment(self):
+        """
+        Opens a new segment and its index, pruning old segments.
+        """
+        self.prune()
+        start = int(time.time() * 1000)
+        while True:
+            base = os.path.join(
+                self.directory,
+                "journal-{Start:013d}".format(Start=start))
+            if not os.path.exists(base + ".gz"):
+                break
+            start += 1
+
+        # pylint: disable=consider-using-with
+        self.data = open(base + ".gz", "ab")
+        self.index = open(base + ".idx", "a")
+
+    def __end_segment(self):
+        """
+        Closes the current segment.
+        """
+        self.data.close()
+        self.index.close()
+        self.data = self.index = None
+
+    def prune(self):
+        """
+        Deletes segments last written before the retention time.
+        """
+        if not self.retain_secs:
+            return
+
+        oldest = time.time() - self.retain_secs
+        for (_, data_path, index_path) in segments(self.directory):
+            if os.path.getmtime(data_path) < oldest:
+                for path in (data_path, index_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def close(self):
+        """
+        Writes any partial block and closes the segment.
+        """
+        self.closed.set()
+        with self.lock:
+            self.__write_block()
+            if self.data:
+                self.__end_segment()
+
+
+def segments(directory):
+    """
+    Returns the sorted list of (start, data path, index path) for the
+    segments in the journal directory.
+    """
+    result = []
+    for data_path in glob.glob(os.path.join(directory, "journal-*.gz")):
+        match = SEGMENT.search(data_path)
+        if match:
+            result.append((
+                int(match.group(1)),
+                data_path,
+                data_path[:-len(".gz")] + ".idx"))
+    return sorted(result)
+
+
+def read_index(index_path):
+    """
+    Returns the list of block index entries. A partly written last
+    line is ignored.
+    """
+    entries = []
+    if not os.path.exists(index_path):
+        return entries
+
+    with open(index_path) as index:
+        for line in index:
+            try:
+                entries.append(codec.loads(line))
+            except ValueError:
+                break
+    return entries
+
+
+def replay(directory, from_ms=None, to_ms=None, txn=None):
+    """
+    Generator yielding the journalled events with timestamps in the
+    range, inclusive, and if given with the txn as transaction id,
+    event id or cause id, in the order they were written.
+    """
+    listed = segments(directory)
+    for (number, (_, data_path, index_path)) in enumerate(listed):
+        if from_ms is not None and number + 1 < len(listed) and \
+                listed[number + 1][0] + CLOCK_SKEW_MS <= from_ms:
+            continue
+
+        blocks = [entry for entry in read_index(index_path)
+                  if block_matches(entry, from_ms, to_ms, txn)]
+        if not blocks:
+            continue
+
+        with open(data_path, "rb") as data:
+            for entry in blocks:
+                data.seek(entry["offset"])
+                member = gzip.decompress(data.read(entry["length"]))
+                for line in member.splitlines():
+                    term = codec.loads(line)
+                    if event_matches(term, from_ms, to_ms, txn):
+                        yield term
+
+
+def block_matches(entry, from_ms, to_ms, txn):
+    """
+    Returns True if the indexed block can hold matching events. A
+    block without timestamped events matches no time range.
+    """
+    if from_ms is not None or to_ms is not None:
+        if entry["first"] is None:
+            return False
+    if from_ms is not None and entry["last"] < from_ms:
+        return False
+    if to_ms is not None and entry["first"] > to_ms:
+        return False
+    if txn is not None:
+        keys = entry["keys"]
+        index = bisect.bisect_left(keys, txn)
+        if index == len(keys) or keys[index] != txn:
+            return False
+    return True
+
+
+def event_matches(term, from_ms, to_ms, txn):
+    """
+    Returns True if the event is in the time range and has the txn as
+    transaction, event or cause id. An event without a timestamp is in
+    no time range.
+    """
+    stamp = event.timestamp(term)
+    if from_ms is not None or to_ms is not None:
+        if stamp is None:
+            return False
+    if from_ms is not None and stamp < from_ms:
+        return False
+    if to_ms is not None and stamp > to_ms:
+        return False
+
+    if txn is not None and txn not in (
+            [event.txn(term), event.event_id(term)] + event.causes(term)):
+        return False
+
+    return True
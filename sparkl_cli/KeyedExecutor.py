@@ -0,0 +1,94 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Thread pool executor which runs tasks sharing a key one at a time,
+in the order submitted, while tasks with different keys run
+concurrently.
+
+Each key with queued tasks occupies at most one worker at a time.
+After each task the next task for that key is resubmitted to the
+pool, so a busy key cannot starve the others.
+
+Once shut down, tasks submitted or still queued are dropped.
+"""
+from __future__ import print_function
+
+import collections
+import threading
+import traceback
+
+from concurrent.futures import (
+    ThreadPoolExecutor)
+
+
+class KeyedExecutor(object):
+    """
+    Ordered-by-key executor over a shared thread pool.
+    """
+
+    def __init__(self, workers):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.queues = {}
+        self.closed = False
+
+    def submit(self, key, fun, *args):
+        """
+        Runs fun(*args) after all tasks previously submitted with the
+        same key have completed.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            queue = self.queues.get(key)
+            if queue is not None:
+                queue.append((fun, args))
+                return
+            self.queues[key] = collections.deque()
+            self.pool.submit(self.__run, key, fun, args)
+
+    def __run(self, key, fun, args):
+        """
+        Runs the task, then resubmits the next task for the key if any.
+        Exceptions are printed so that the key is not left blocked.
+        """
+        try:
+            fun(*args)
+        except Exception:  # pylint: disable=broad-except
+            traceback.print_exc()
+
+        with self.lock:
+            queue = self.queues[key]
+            if not queue or self.closed:
+                del self.queues[key]
+                return
+            (fun, args) = queue.popleft()
+            self.pool.submit(self.__run, key, fun, args)
+
+    def pending(self):
+        """
+        Returns the number of tasks queued behind a running task.
+        """
+        with self.lock:
+            return sum(len(queue) for queue in self.queues.values())
+
+    def shutdown(self, wait=True):
+        """
+        Stops accepting tasks, drops queued tasks and optionally waits
+        for running tasks.
+        """
+        with self.lock:
+            self.closed = True
+        self.pool.shutdown(wait=wait)
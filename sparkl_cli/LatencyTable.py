@@ -0,0 +1,127 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Latency percentiles grouped by kind, such as request or solicit, and
+operation or service name, used by the stats command.
+
+By default each group keeps every duration in a flat array of doubles,
+so percentiles are exact, by nearest rank as in the load command, see
+Metrics.percentile. Where NumPy is installed the array is sorted and
+indexed as an ndarray, otherwise as a list.
+
+In streaming mode each group keeps a fixed-bucket Histogram instead,
+so memory does not grow with the input and percentiles are estimated
+within a bucket, see the Metrics module.
+"""
+from __future__ import print_function
+
+from array import (
+    array)
+
+from sparkl_cli.Metrics import (
+    Histogram,
+    rank_index)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+PERCENTILES = (50, 90, 99)
+
+
+class LatencyTable(object):
+    """
+    Durations in seconds grouped by (kind, name).
+    """
+
+    def __init__(self, streaming=False):
+        self.streaming = streaming
+        self.groups = {}
+
+    def add(self, kind, name, secs):
+        """
+        Records a duration for the group.
+        """
+        key = (kind, name)
+        group = self.groups.get(key)
+        if group is None:
+            group = Histogram() if self.streaming else array("d")
+            self.groups[key] = group
+
+        if self.streaming:
+            group.observe(secs)
+        else:
+            group.append(secs)
+
+    def rows(self):
+        """
+        Returns the list of latency structs, one per group, sorted by
+        kind and name, with durations in milliseconds.
+        """
+        result = []
+        for key in sorted(self.groups):
+            (kind, name) = key
+            group = self.groups[key]
+            if self.streaming:
+                attr = summary_histogram(group)
+            else:
+                attr = summary_exact(group)
+
+            attr["kind"] = kind
+            attr["name"] = name
+            result.append({
+                "tag": "latency",
+                "attr": attr
+            })
+        return result
+
+
+def summary_histogram(histogram):
+    """
+    Returns the count, estimated percentiles and max of the histogram.
+    """
+    attr = {
+        "count": histogram.count,
+        "max": 1000.0 * histogram.max
+    }
+    for percent in PERCENTILES:
+        attr["p" + str(percent)] = 1000.0 * histogram.percentile(percent)
+    return attr
+
+
+def summary_exact(durations):
+    """
+    Returns the count, percentiles and max of the array of durations.
+    """
+    indexes = [rank_index(len(durations), percent)
+               for percent in PERCENTILES]
+    if numpy is not None:
+        values = numpy.sort(
+            numpy.frombuffer(durations, dtype=numpy.float64))
+        percentiles = values[indexes].tolist()
+        highest = float(values[-1])
+    else:
+        values = sorted(durations)
+        percentiles = [values[index] for index in indexes]
+        highest = values[-1]
+
+    attr = {
+        "count": len(durations),
+        "max": 1000.0 * highest
+    }
+    for (percent, value) in zip(PERCENTILES, percentiles):
+        attr["p" + str(percent)] = 1000.0 * value
+    return attr
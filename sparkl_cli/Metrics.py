@@ -0,0 +1,351 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Per-operation counters and latency histograms.
+
+An instance of this class is held by each Service. Counters and
+histograms are keyed by metric name and operation path, for example
+("request", "Mix/Test") or ("handler", "Mix/Test").
+
+The snapshot method returns the usual tag/attr/content struct so it
+can be displayed with show_struct. The prometheus method returns the
+Prometheus text exposition format, which the serve method makes
+available on a local HTTP endpoint.
+"""
+from __future__ import print_function
+
+import bisect
+import math
+import threading
+
+from http.server import (
+    BaseHTTPRequestHandler,
+    HTTPServer)
+
+# Upper bounds in seconds of the histogram buckets. The last
+# bucket is unbounded (+Inf).
+BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PERCENTILES = (50, 90, 99)
+
+PROMETHEUS_PREFIX = "sparkl_service_"
+
+
+class Histogram(object):
+    """
+    Fixed-bucket latency histogram. Percentiles are estimated
+    by interpolating within the bucket that holds them.
+    """
+
+    def __init__(self, bounds=BUCKETS):
+        """
+        Creates an empty histogram with one more bucket than bounds.
+        """
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """
+        Records a single value in seconds.
+        """
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        """
+        Returns the estimated value below which the given percentage
+        of observations fall, or 0.0 if there are none.
+        """
+        if not self.count:
+            return 0.0
+
+        rank = self.count * percent / 100.0
+        seen = 0
+        for (index, bucket) in enumerate(self.buckets):
+            if bucket and seen + bucket >= rank:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index] \
+                    if index < len(self.bounds) else self.max
+                upper = min(upper, self.max)
+                fraction = (rank - seen) / bucket
+                return min(lower + (upper - lower) * fraction, self.max)
+            seen += bucket
+
+        return self.max
+
+    def attr(self):
+        """
+        Returns the summary attributes of the histogram.
+        """
+        attr = {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "max": self.max
+        }
+        for percent in PERCENTILES:
+            attr["p" + str(percent)] = self.percentile(percent)
+        return attr
+
+
+class Metrics(object):
+    """
+    Thread-safe collection of counters and histograms keyed by
+    (metric, path).
+    """
+
+    def __init__(self, name):
+        """
+        The name identifies the owner, usually the service path, and
+        is used as a label in the Prometheus output.
+        """
+        self.name = name
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.server = None
+
+    def count(self, metric, path, increment=1):
+        """
+        Increments the counter for the metric and operation path.
+        """
+        key = (metric, path)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + increment
+
+    def observe(self, metric, path, value):
+        """
+        Records the value in seconds in the histogram for the metric
+        and operation path.
+        """
+        key = (metric, path)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self):
+        """
+        Returns a struct with one operation element per path, holding
+        the counters as attributes and the histogram summaries as
+        content.
+        """
+        operations = {}
+
+        def operation(path):
+            """
+            Returns the struct for the path, creating it if needed.
+            """
+            if path not in operations:
+                operations[path] = {
+                    "tag": "operation",
+                    "attr": {
+                        "path": path
+                    },
+                    "content": []
+                }
+            return operations[path]
+
+        with self.lock:
+            for ((metric, path), value) in self.counters.items():
+                operation(path)["attr"][metric] = value
+
+            for ((metric, path), histogram) in self.histograms.items():
+                attr = histogram.attr()
+                attr["metric"] = metric
+                operation(path)["content"].append({
+                    "tag": "latency",
+                    "attr": attr
+                })
+
+        content = []
+        for path in sorted(operations):
+            struct = operations[path]
+            struct["content"].sort(
+                key=lambda latency: latency["attr"]["metric"])
+            content.append(struct)
+
+        return {
+            "tag": "metrics",
+            "attr": {
+                "name": self.name
+            },
+            "content": content
+        }
+
+    def prometheus(self):
+        """
+        Returns the counters and histograms in Prometheus text
+        exposition format.
+        """
+        return prometheus([self])
+
+    def families(self):
+        """
+        Returns a dict of Prometheus metric family name to the tuple
+        (type, sample lines) for this instance.
+        """
+        families = {}
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, list(histogram.buckets), histogram.count,
+                 histogram.sum) for (key, histogram)
+                in self.histograms.items())
+
+        for ((metric, path), value) in counters:
+            name = PROMETHEUS_PREFIX + metric + "_total"
+            (_, lines) = families.setdefault(name, ("counter", []))
+            lines.append("{Name}{{{Labels}}} {Value}".format(
+                Name=name,
+                Labels=self.__labels(path),
+                Value=value))
+
+        for ((metric, path), buckets, count, total) in histograms:
+            name = PROMETHEUS_PREFIX + metric + "_seconds"
+            (_, lines) = families.setdefault(name, ("histogram", []))
+            labels = self.__labels(path)
+            cumulative = 0
+            for (index, bucket) in enumerate(buckets):
+                cumulative += bucket
+                bound = repr(BUCKETS[index]) \
+                    if index < len(BUCKETS) else "+Inf"
+                lines.append("{Name}_bucket{{{Labels},le=\"{Le}\"}} "
+                             "{Value}".format(
+                                 Name=name,
+                                 Labels=labels,
+                                 Le=bound,
+                                 Value=cumulative))
+            lines.append("{Name}_sum{{{Labels}}} {Value}".format(
+                Name=name, Labels=labels, Value=repr(total)))
+            lines.append("{Name}_count{{{Labels}}} {Value}".format(
+                Name=name, Labels=labels, Value=count))
+
+        return families
+
+    def __labels(self, path):
+        """
+        Returns the Prometheus label string for the path.
+        """
+        return "service=\"{Service}\",path=\"{Path}\"".format(
+            Service=escape_label(self.name),
+            Path=escape_label(path))
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Serves the Prometheus text on the local HTTP port from a
+        daemon thread. Returns the server, whose server_address
+        gives the actual port if port 0 was requested.
+        """
+        self.server = serve(self.prometheus, port, host)
+        return self.server
+
+    def close(self):
+        """
+        Stops the HTTP endpoint, if any.
+        """
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def prometheus(metrics_list):
+    """
+    Returns the Prometheus text for any number of Metrics instances,
+    for example one per hosted service, with each metric family
+    typed once and its samples grouped together.
+    """
+    merged = {}
+    for metrics in metrics_list:
+        for (name, (kind, lines)) in metrics.families().items():
+            merged.setdefault(name, (kind, []))[1].extend(lines)
+
+    text = []
+    for name in sorted(merged):
+        (kind, lines) = merged[name]
+        text.append("# TYPE " + name + " " + kind)
+        text.extend(lines)
+    return "\n".join(text) + "\n"
+
+
+def serve(text_fun, port, host="127.0.0.1"):
+    """
+    Serves the text returned by text_fun() on every GET to the local
+    HTTP port, from a daemon thread. Returns the server.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        """
+        Answers every GET with the current metrics.
+        """
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """
+            Writes the Prometheus text.
+            """
+            body = text_fun().encode("utf-8")
+            self.send_response(200)
+            self.send_header(
+                "Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_args):
+            """
+            Suppresses the default request logging on stderr.
+            """
+
+    server = HTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def escape_label(value):
+    """
+    Escapes a Prometheus label value.
+    """
+    return value.replace("\\", "\\\\").replace(
+        "\"", "\\\"").replace("\n", "\\n")
+
+
+def percentile(values, percent):
+    """
+    Returns the exact nearest-rank percentile of the sorted list of
+    values, or 0.0 if the list is empty.
+    """
+    if not values:
+        return 0.0
+
+    return values[rank_index(len(values), percent)]
+
+
+def rank_index(count, percent):
+    """
+    Returns the index in count sorted values of the nearest-rank
+    percentile.
+    """
+    rank = int(math.ceil(count * percent / 100.0))
+    return max(rank, 1) - 1
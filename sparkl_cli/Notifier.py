@@ -0,0 +1,152 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Buffered sender for high-rate Service.notify producers.
+
+Notify terms are collected for a few milliseconds after the first
+arrives, then encoded in one pass and written as consecutive websocket
+frames with a single sendall call, instead of one send per notify.
+
+Each notify is still its own websocket frame, so the node sees exactly
+the same notifies in the same order. Batches are sent one at a time,
+whether by the notifier thread or by a flush on another thread.
+
+Solicits and replies are not buffered, so a batched notify can reach
+the node after a solicit or reply sent later by the same service.
+"""
+from __future__ import print_function
+
+import sys
+import threading
+
+import websocket
+
+from websocket import (
+    ABNF)
+
+from sparkl_cli import (
+    codec)
+
+# Default seconds to collect notifies before sending.
+LINGER_SECS = 0.005
+
+# Buffered notifies beyond which the batch is sent at once.
+MAX_BATCH = 1000
+
+
+class Notifier(threading.Thread):
+    """
+    Daemon thread sending batches of notify terms on the websocket.
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, ws, linger_secs=LINGER_SECS, max_batch=MAX_BATCH):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.ws = ws
+        self.linger_secs = linger_secs
+        self.max_batch = max_batch
+        self.condition = threading.Condition()
+        self.sending = threading.Lock()
+        self.buffer = []
+        self.closed = False
+        self.batches = 0
+        self.frames = 0
+
+    def notify(self, term):
+        """
+        Buffers the notify term for sending within the linger time.
+        """
+        with self.condition:
+            self.buffer.append(term)
+            if len(self.buffer) == 1 or \
+                    len(self.buffer) >= self.max_batch:
+                self.condition.notify()
+
+    def run(self):
+        """
+        Waits for the first buffered notify, lingers, then sends
+        everything buffered so far.
+        """
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.buffer or self.closed)
+                if self.closed:
+                    return
+                self.condition.wait_for(
+                    lambda: len(self.buffer) >= self.max_batch or
+                    self.closed, self.linger_secs)
+
+            try:
+                self.flush()
+            except (websocket.WebSocketException, IOError) as exception:
+                print("Notify send failed: {Error}".format(
+                    Error=exception), file=sys.stderr)
+
+    def flush(self):
+        """
+        Sends all buffered notifies now, returning the number sent.
+        The send lock is held from taking the batch until it is sent,
+        so batches cannot overtake each other.
+        """
+        with self.sending:
+            with self.condition:
+                (terms, self.buffer) = (self.buffer, [])
+
+            if terms:
+                send_texts(
+                    self.ws, [codec.dumps(term) for term in terms])
+                self.batches += 1
+                self.frames += len(terms)
+            return len(terms)
+
+    def close(self):
+        """
+        Stops the thread after sending any buffered notifies.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+        try:
+            self.flush()
+        except (websocket.WebSocketException, IOError):
+            pass
+
+
+def send_texts(websock, texts):
+    """
+    Sends each text as a websocket text frame. A connected websocket
+    client gets all frames in one write. Other sockets, such as
+    a recording socket, get one send per text.
+    """
+    if hasattr(websock, "send_texts"):
+        websock.send_texts(texts)
+        return
+
+    if not isinstance(websock, websocket.WebSocket):
+        for text in texts:
+            websock.send(text)
+        return
+
+    data = b"".join(
+        ABNF.create_frame(text, ABNF.OPCODE_TEXT).format()
+        for text in texts)
+    with websock.lock:
+        if not websock.connected:
+            raise websocket.WebSocketConnectionClosedException(
+                "socket is already closed.")
+        websock.sock.sendall(data)
@@ -0,0 +1,119 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Writes command results to stdout in the format chosen by the global
+--format option:
+
+    text
+        the line-based display of show_struct, the default.
+
+    json
+        each result as indented JSON.
+
+    ndjson
+        each result as one compact JSON line, which read_terms and so
+        `sparkl elastic` read directly.
+
+The json and ndjson formats are written through a large buffer,
+flushed when full and otherwise at least every FLUSH_SECS, so that
+a fast stream such as `sparkl listen` makes few large writes while
+a slow one still appears promptly.
+"""
+from __future__ import print_function
+
+import json
+import sys
+import threading
+
+from sparkl_cli import (
+    codec)
+
+from sparkl_cli.common import (
+    show_struct)
+
+FORMATS = ("text", "json", "ndjson")
+
+BUFFER_BYTES = 65536
+
+FLUSH_SECS = 0.2
+
+
+class Output(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Buffered writer of result terms.
+    """
+
+    def __init__(self, fmt="text", stream=None, flush_secs=FLUSH_SECS):
+        self.format = fmt
+        self.stream = stream or sys.stdout
+        self.flush_secs = flush_secs
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.size = 0
+        self.closed = threading.Event()
+        self.flusher = None
+
+    def write(self, term):
+        """
+        Writes the term, or nothing if it is None.
+        """
+        if term is None:
+            return
+
+        if self.format == "text":
+            show_struct(term)
+            return
+
+        if self.format == "ndjson":
+            text = codec.dumps(term) + "\n"
+        else:
+            text = json.dumps(term, indent=4) + "\n"
+
+        with self.lock:
+            self.buffer.append(text)
+            self.size += len(text)
+            full = self.size >= BUFFER_BYTES
+
+        if full:
+            self.flush()
+        elif not self.flusher:
+            self.flusher = threading.Thread(target=self.__flush_loop)
+            self.flusher.daemon = True
+            self.flusher.start()
+
+    def flush(self):
+        """
+        Writes out the buffer in one call.
+        """
+        with self.lock:
+            if self.buffer:
+                self.stream.write("".join(self.buffer))
+                self.buffer = []
+                self.size = 0
+            self.stream.flush()
+
+    def __flush_loop(self):
+        """
+        Flushes periodically until closed.
+        """
+        while not self.closed.wait(self.flush_secs):
+            self.flush()
+
+    def close(self):
+        """
+        Flushes and stops the periodic flush.
+        """
+        self.closed.set()
+        self.flush()
@@ -0,0 +1,344 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Resolves the subject and field ids of listen events to names, used by
+listen --resolve.
+
+Objects are held in one in-memory cache, seeded from the connection
+cache kept by common.get_object. Ids not yet cached are fetched on a
+small thread pool, one task per id and each id once however many
+events carry it, while later events keep arriving. Events are output in
+arrival order once all their ids are resolved, with:
+
+    attr.subject_name and attr.subject_tag
+        the name and tag of the subject object.
+
+    attr.name and attr.type of each datum
+        the name and type of its field, as call does.
+
+Ids not found are cached as unknown and left as they are. Ids whose
+fetch failed with an error are left as they are, and fetched again
+when next seen.
+
+The get_objects function uses the same pool to get a set of objects
+at once, such as the fields of an operation, so that a cold cache
+costs about one request time rather than one per object.
+"""
+from __future__ import print_function
+
+import queue
+import threading
+from collections import (
+    deque)
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    wait)
+
+from sparkl_cli import (
+    codec)
+
+from sparkl_cli.common import (
+    END,
+    get_connection,
+    new_session,
+    put_connection,
+    read_ahead,
+    sync_request)
+
+WORKERS = 4
+
+# Ids per fetch task. The node has no batch endpoint, so each id is a
+# GET of its own, and a task per id lets the GETs run in parallel and
+# fail independently.
+BATCH_IDS = 1
+
+# Most events held waiting for their ids.
+LOOKAHEAD = 10000
+
+# Seconds between checks for resolved ids while events are waiting.
+POLL_SECS = 0.005
+
+# Longest blocking wait, so that a keyboard interrupt delivered to
+# another thread is still seen promptly.
+WAKE_SECS = 0.5
+
+UNKNOWN = object()
+
+
+class Resolver(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Cache of objects by id, with background fetching.
+    """
+
+    def __init__(self, fetch, cache=None, workers=WORKERS,
+                 batch_ids=BATCH_IDS):
+        """
+        The fetch function of a list of ids returns the dict of the
+        objects found by id.
+        """
+        self.fetch = fetch
+        self.cache = dict(cache or {})
+        self.batch_ids = batch_ids
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.fetched = 0
+        self.pool = ThreadPoolExecutor(workers)
+
+    def prefetch(self, ids):
+        """
+        Starts fetching the ids not cached or already being fetched,
+        each once however often it is given. Returns the set of
+        futures the ids wait on.
+        """
+        futures = set()
+        missing = []
+        with self.lock:
+            for object_id in dict.fromkeys(ids):
+                if object_id in self.cache:
+                    continue
+                future = self.inflight.get(object_id)
+                if future is None:
+                    missing.append(object_id)
+                else:
+                    futures.add(future)
+
+            for start in range(0, len(missing), self.batch_ids):
+                batch = missing[start:start + self.batch_ids]
+                future = self.pool.submit(self.__fetch, batch)
+                for object_id in batch:
+                    self.inflight[object_id] = future
+                futures.add(future)
+
+        return futures
+
+    def __fetch(self, batch):
+        """
+        Fetches the batch into the cache, caching as unknown any not
+        found. If the fetch fails, nothing is cached, so that the ids
+        are fetched again when next prefetched.
+        """
+        try:
+            found = self.fetch(batch)
+        except Exception:  # pylint: disable=broad-except
+            found = None
+
+        with self.lock:
+            for object_id in batch:
+                if found is not None:
+                    self.cache[object_id] = found.get(object_id, UNKNOWN)
+                self.inflight.pop(object_id, None)
+            self.fetched += len(found or {})
+
+    def lookup(self, object_id):
+        """
+        Returns the cached object, or None.
+        """
+        sparkl_object = self.cache.get(object_id)
+        return None if sparkl_object is UNKNOWN else sparkl_object
+
+    def fetched_objects(self):
+        """
+        Returns the dict of the objects found, by id.
+        """
+        with self.lock:
+            return dict(
+                (object_id, sparkl_object)
+                for (object_id, sparkl_object) in self.cache.items()
+                if sparkl_object is not UNKNOWN)
+
+    def close(self):
+        """
+        Stops the pool without waiting for outstanding fetches.
+        """
+        self.pool.shutdown(wait=False)
+
+
+def event_ids(term):
+    """
+    Returns the list of subject and field ids in the event.
+    """
+    ids = []
+    if not isinstance(term, dict):
+        return ids
+
+    subject = (term.get("attr") or {}).get("subject")
+    if isinstance(subject, str):
+        ids.append(subject)
+
+    for datum in term.get("content") or []:
+        if isinstance(datum, dict):
+            field = (datum.get("attr") or {}).get("field")
+            if isinstance(field, str):
+                ids.append(field)
+
+    return ids
+
+
+def annotate(term, resolver):
+    """
+    Adds the resolved names to the event in place, and returns it.
+    """
+    if not isinstance(term, dict):
+        return term
+
+    attr = term.get("attr") or {}
+    subject = resolver.lookup(attr.get("subject"))
+    if subject:
+        attr["subject_name"] = subject.get("attr", {}).get("name")
+        attr["subject_tag"] = subject.get("tag")
+
+    for datum in term.get("content") or []:
+        if not isinstance(datum, dict):
+            continue
+        datum_attr = datum.get("attr") or {}
+        field = resolver.lookup(datum_attr.get("field"))
+        if field:
+            datum_attr["name"] = field.get("attr", {}).get("name")
+            datum_attr["type"] = field.get("attr", {}).get("type")
+
+    return term
+
+
+def resolving(source, resolver, lookahead=LOOKAHEAD, interrupt=None):
+    """
+    Generator that yields the events of the source generator in order,
+    each annotated once its ids are resolved.
+
+    The source is read ahead on its own thread, and the ids of each
+    event are prefetched as it arrives, so that fetches overlap and
+    an event with all ids cached costs only the lookups.
+
+    On keyboard interrupt, the interrupt function is called to make
+    the source end on its own thread, and the events still to come are
+    yielded with the names already resolved, without waiting for more.
+    Without an interrupt function, the generator ends at once.
+    """
+    (terms, stop) = read_ahead(source, lookahead)
+    waiting = deque()
+    ended = False
+    try:
+        try:
+            while True:
+                while waiting and all(
+                        future.done() for future in waiting[0][1]):
+                    yield annotate(waiting.popleft()[0], resolver)
+
+                if ended and not waiting:
+                    return
+
+                if ended or len(waiting) >= lookahead:
+                    wait(waiting[0][1], WAKE_SECS)
+                    continue
+
+                try:
+                    term = terms.get(
+                        timeout=POLL_SECS if waiting else WAKE_SECS)
+                except queue.Empty:
+                    continue
+
+                if term is END:
+                    ended = True
+                    continue
+                if isinstance(term, Exception):
+                    raise term
+
+                waiting.append((term, resolver.prefetch(event_ids(term))))
+
+        except KeyboardInterrupt:
+            if interrupt is None:
+                return
+
+        interrupt()
+        while waiting:
+            yield annotate(waiting.popleft()[0], resolver)
+
+        while not ended:
+            try:
+                term = terms.get(timeout=WAKE_SECS)
+            except queue.Empty:
+                continue
+            ended = term is END or isinstance(term, Exception)
+            if not ended:
+                yield annotate(term, resolver)
+
+    finally:
+        stop.set()
+        resolver.close()
+
+
+def fetcher(args):
+    """
+    Returns a fetch function for the Resolver, which gets each object
+    by id on the connection, with one session per pool thread.
+    """
+    local = threading.local()
+
+    def fetch(ids):
+        """
+        Returns the dict of the objects found, by id.
+        """
+        if not hasattr(local, "session"):
+            local.session = new_session(args)
+
+        found = {}
+        for object_id in ids:
+            response = sync_request(
+                args, "GET", "sse_cfg/object/" + object_id,
+                session=local.session)
+            if response:
+                found[object_id] = codec.loads(response.content)
+        return found
+
+    return fetch
+
+
+def get_objects(args, ids, workers=WORKERS):
+    """
+    Returns the dict of the objects found by id, getting those not in
+    the connection cache concurrently, each once, on a pool of at most
+    workers threads. Objects fetched are saved to the connection cache
+    in one state write.
+    """
+    if not ids:
+        return {}
+
+    resolver = Resolver(
+        fetcher(args), get_connection(args).get("cache"),
+        workers=workers)
+    try:
+        wait(resolver.prefetch(ids))
+    finally:
+        resolver.close()
+
+    save_cache(args, resolver)
+    return dict(
+        (object_id, resolver.lookup(object_id))
+        for object_id in ids if resolver.lookup(object_id))
+
+
+def save_cache(args, resolver):
+    """
+    Merges the objects fetched into the connection cache, in one
+    state write.
+    """
+    objects = resolver.fetched_objects()
+    connection = get_connection(args)
+    cache = connection.get("cache", {})
+    if all(object_id in cache for object_id in objects):
+        return
+
+    cache.update(objects)
+    connection["cache"] = cache
+    put_connection(args, connection)
@@ -0,0 +1,141 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Event sampling and rate limiting, used by listen.
+
+Sampling keeps the given fraction of transactions. Whether an event is
+kept depends only on a hash of its transaction id, so every event of a
+transaction is kept or dropped together, and separate listen processes
+keep the same transactions. Events with no transaction id are sampled
+by their own id, and kept if they have neither.
+
+Rate limiting is a token bucket holding up to one second of events at
+the maximum rate, or at least one event, so short bursts pass while
+the average rate is bounded. It applies after sampling.
+
+While events are being dropped, a marker term is output at most every
+REPORT_SECS, and at the end, with the counts so far:
+
+    {
+        "tag": "listen_dropped",
+        "attr": {
+            "kept": 1200,
+            "sampled": 10800,
+            "limited": 350
+        }
+    }
+
+where sampled counts events dropped by sampling and limited those
+dropped by the rate limit.
+"""
+from __future__ import print_function
+
+import zlib
+from timeit import default_timer
+
+from sparkl_cli import (
+    event)
+
+DROP_TAG = "listen_dropped"
+
+REPORT_SECS = 1.0
+
+HASH_RANGE = float(2 ** 32)
+
+
+class Sampler(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Decides which events to keep and counts those dropped.
+    """
+
+    def __init__(self, rate=None, max_rate=None):
+        """
+        The rate is the fraction of transactions to keep, and the
+        max_rate the most events per second, each unlimited if None.
+        """
+        self.threshold = rate * HASH_RANGE if rate is not None else None
+        self.max_rate = max_rate
+        self.capacity = max(1.0, max_rate or 0.0)
+        self.tokens = self.capacity
+        self.refilled = default_timer()
+        self.kept = 0
+        self.sampled = 0
+        self.limited = 0
+        self.reported = (0, 0)
+        self.report_at = 0.0
+
+    def admit(self, term):
+        """
+        Returns True if the event is kept.
+        """
+        if self.threshold is not None and not self.__sample(term):
+            self.sampled += 1
+            return False
+
+        if self.max_rate is not None and not self.__take():
+            self.limited += 1
+            return False
+
+        self.kept += 1
+        return True
+
+    def __sample(self, term):
+        """
+        Returns True if the event transaction is in the sample.
+        """
+        key = event.txn(term) or event.event_id(term)
+        if key is None:
+            return True
+        return zlib.crc32(str(key).encode("utf-8")) < self.threshold
+
+    def __take(self):
+        """
+        Returns True if a token was available, refilling the bucket
+        for the time since the last call.
+        """
+        now = default_timer()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.refilled) * self.max_rate)
+        self.refilled = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def report(self, force=False):
+        """
+        Returns the drop marker term if events were dropped since the
+        last report, and REPORT_SECS have passed or force is True.
+        Otherwise returns None.
+        """
+        dropped = (self.sampled, self.limited)
+        if dropped == self.reported:
+            return None
+
+        now = default_timer()
+        if not force and now < self.report_at:
+            return None
+
+        self.reported = dropped
+        self.report_at = now + REPORT_SECS
+        return {
+            "tag": DROP_TAG,
+            "attr": {
+                "kept": self.kept,
+                "sampled": self.sampled,
+                "limited": self.limited
+            }
+        }
@@ -0,0 +1,248 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Incremental JSON scanner for data events, used by call --output-dir.
+
+The event text is fed in chunks as it arrives. Each datum value
+string, at content[i].content[j], may be passed to a sink instead of
+being held, in which case only the sink's result is kept in its place.
+
+The sink_for function of the field id gives the sink for a value, or
+None to keep the value as usual. The field id is known only if the
+datum attr comes before its content, as it does from SPARKL nodes.
+Values are not buffered to wait for the field id, so a value coming
+first is kept whole, and a warning is printed to stderr once.
+
+A sink has write(data), called with the unescaped value bytes piece by
+piece, and close(), which returns the value to use in its place.
+
+Memory is bounded by the largest value kept, not by the values sunk.
+Strings are scanned a run at a time, not a byte at a time.
+"""
+from __future__ import print_function
+
+import re
+import sys
+
+from sparkl_cli import (
+    codec)
+
+from sparkl_cli.CliException import (
+    CliException)
+
+# The next character that ends a run outside and inside a string.
+STRUCTURE = re.compile(b'[][{}:,"]')
+STRING_END = re.compile(b'["\\\\]')
+
+ESCAPES = {
+    b'"': b'"',
+    b"\\": b"\\",
+    b"/": b"/",
+    b"b": b"\b",
+    b"f": b"\f",
+    b"n": b"\n",
+    b"r": b"\r",
+    b"t": b"\t"
+}
+
+
+class Frame(object):  # pylint: disable=too-few-public-methods
+    """
+    An object or array being scanned. The key is the current object
+    key or array index.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.key = 0 if kind == b"[" else None
+        self.expect_key = kind == b"{"
+        self.field = None
+
+
+class Scanner(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Scans one JSON term fed in chunks, see the module notes.
+    """
+
+    def __init__(self, sink_for=None):
+        self.sink_for = sink_for
+        self.skeleton = bytearray()
+        self.stack = []
+        self.pending = b""
+        self.in_string = False
+        self.string = bytearray()
+        self.sink = None
+        self.sunk = []
+        self.warned = False
+
+    def feed(self, chunk):
+        """
+        Scans the next chunk of bytes.
+        """
+        data = self.pending + chunk
+        self.pending = b""
+        position = 0
+        while position < len(data):
+            if self.in_string:
+                position = self.__scan_string(data, position)
+            else:
+                position = self.__scan_structure(data, position)
+
+    def close(self):
+        """
+        Returns the term scanned, with the result of each sink in
+        place of its value.
+        """
+        if self.in_string or self.stack or self.pending:
+            raise CliException("Incomplete JSON response")
+
+        term = codec.loads(bytes(self.skeleton))
+        for (path, value) in self.sunk:
+            container = term
+            for key in path[:-1]:
+                container = container[key]
+            container[path[-1]] = value
+        return term
+
+    def __scan_structure(self, data, position):
+        """
+        Scans up to and including the next structural character.
+        """
+        match = STRUCTURE.search(data, position)
+        if not match:
+            self.skeleton += data[position:]
+            return len(data)
+
+        self.skeleton += data[position:match.start()]
+        char = match.group()
+        if char == b'"':
+            self.__start_string()
+            return match.end()
+
+        self.skeleton += char
+        if char in (b"{", b"["):
+            self.stack.append(Frame(char))
+        elif char in (b"}", b"]"):
+            self.stack.pop()
+        elif char == b":":
+            self.stack[-1].expect_key = False
+        elif char == b",":
+            frame = self.stack[-1]
+            if frame.kind == b"[":
+                frame.key += 1
+            else:
+                frame.expect_key = True
+        return match.end()
+
+    def __start_string(self):
+        """
+        Starts a string, finding a sink for a datum value.
+        """
+        self.in_string = True
+        del self.string[:]
+        if self.sink_for and self.__in_datum_value():
+            field = self.stack[2].field
+            if field:
+                self.sink = self.sink_for(field)
+            elif not self.warned:
+                self.warned = True
+                print(
+                    "Datum value before its field id, kept in memory",
+                    file=sys.stderr)
+
+    def __scan_string(self, data, position):
+        """
+        Scans a run of the string, up to and including the next quote
+        or escape.
+        """
+        match = STRING_END.search(data, position)
+        end = match.start() if match else len(data)
+        self.__string_bytes(data[position:end], data[position:end])
+        if not match:
+            return len(data)
+
+        if match.group() == b'"':
+            self.__end_string()
+            return match.end()
+
+        # An escape, kept pending until complete.
+        length = 6 if data[end + 1:end + 2] == b"u" else 2
+        if len(data) < end + length:
+            self.pending = data[end:]
+            return len(data)
+
+        escape = data[end:end + length]
+        if length == 6:
+            decoded = chr(int(escape[2:], 16)).encode(
+                "utf-8", "surrogatepass")
+        else:
+            decoded = ESCAPES.get(escape[1:])
+            if decoded is None:
+                raise CliException("Bad JSON escape in response")
+        self.__string_bytes(escape, decoded)
+        return end + length
+
+    def __string_bytes(self, raw, decoded):
+        """
+        Adds the raw bytes to the kept string, or the decoded bytes to
+        the sink.
+        """
+        if self.sink:
+            if decoded:
+                self.sink.write(decoded)
+        else:
+            self.string += raw
+
+    def __end_string(self):
+        """
+        Ends the string, noting keys and datum field ids.
+        """
+        self.in_string = False
+        if self.sink:
+            path = [frame.key for frame in self.stack]
+            self.sunk.append((path, self.sink.close()))
+            self.sink = None
+            self.skeleton += b"null"
+            return
+
+        text = b'"' + bytes(self.string) + b'"'
+        self.skeleton += text
+        if not self.stack:
+            return
+
+        frame = self.stack[-1]
+        if frame.kind == b"{" and frame.expect_key:
+            frame.key = codec.loads(text)
+        elif self.__in_datum_field():
+            self.stack[2].field = codec.loads(text)
+
+    def __in_datum_value(self):
+        """
+        Returns True if scanning a value at content[i].content[j].
+        """
+        stack = self.stack
+        return len(stack) == 4 and \
+            stack[0].key == "content" and stack[1].kind == b"[" and \
+            stack[2].key == "content" and stack[3].kind == b"["
+
+    def __in_datum_field(self):
+        """
+        Returns True if scanning the value at content[i].attr.field.
+        """
+        stack = self.stack
+        return len(stack) == 4 and \
+            stack[0].key == "content" and stack[1].kind == b"[" and \
+            stack[2].key == "attr" and stack[3].key == "field" and \
+            not stack[3].expect_key
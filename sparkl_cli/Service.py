@@ -21,13 +21,77 @@ to the implementation module.
 
 The notify and solicit methods enable the implementation module
 to perform client operations.
+
+Each operation is counted and timed in the metrics property, see
+the Metrics class. Use the snapshot method to read them. Websocket
+payload bytes, on the wire and uncompressed, are counted under the
+path websocket, see the Deflate module.
+
+The websocket traffic can be recorded to a capture file and later
+replayed without a network, see the Capture module.
+
+Notifies can be buffered for a few milliseconds and sent in batches,
+see the Notifier class.
+
+The implementation module can be reloaded while connected, either by
+calling the reload method or automatically when its file changes.
+
+If created with a ServiceHost, the service has no thread of its own.
+The host reads the websocket and dispatches to the service.
+
+A handler which has not replied by the deadline for its operation
+path gets the timeout reply sent on its behalf, and its own reply is
+dropped. The deadline property is the default, and the deadlines dict
+property, usually set by the module.onopen callback, gives deadlines
+in seconds for specific operation paths. Handlers slower than the
+slow property are logged to stderr. Both are counted in the metrics.
+
+A handler waiting in sync_solicit waits no longer than its deadline.
+It then gets a response named as the timeout reply, with no data.
+
+Requests and consumes are handled one at a time unless there is a
+worker pool, given by the host or by the workers argument. Then they
+are handled concurrently, except that those sharing a dispatch key
+such as the transaction id are handled in arrival order.
 """
 from __future__ import print_function
 
-import json
+import copy
+import importlib.util
 import random
 import string
+import sys
 import threading
+from timeit import default_timer
+
+from websocket import (
+    WebSocketException)
+
+from sparkl_cli import (
+    codec)
+
+from sparkl_cli.CliException import (
+    CliException)
+
+from sparkl_cli.Capture import (
+    Recorder,
+    RecordingSocket,
+    ReplaySocket)
+
+from sparkl_cli.Deadlines import (
+    Deadlines)
+
+from sparkl_cli.KeyedExecutor import (
+    KeyedExecutor)
+
+from sparkl_cli.Metrics import (
+    Metrics)
+
+from sparkl_cli.Notifier import (
+    Notifier)
+
+from sparkl_cli.Watcher import (
+    Watcher)
 
 from sparkl_cli.common import (
     get_current_folder,
@@ -36,6 +100,14 @@ from sparkl_cli.common import (
 
 PATH_PREFIX = "svc_rest/websocket/"
 
+# Response given to solicits still pending when the service reconnects.
+RECONNECT_RESPONSE = {
+    "response": "Error",
+    "data": {
+        "reason": "reconnected before the response arrived"
+    }
+}
+
 
 class Service(threading.Thread):
     """
@@ -43,11 +115,15 @@ class Service(threading.Thread):
     which can provide optional main/1, onopen/1 and onclose/1
     callback functions.
     """
+    # pylint: disable=too-many-instance-attributes
 
-    def __init__(self, args, module):
+    def __init__(self, args, module, host=None):
         """
         Initialises the object ready for open. The implementation
         property is empty, usually set by the module.onopen callback.
+
+        If a host is given, the host serves the metrics and reads
+        the websocket.
         """
         threading.Thread.__init__(self)
         self.daemon = True
@@ -56,8 +132,35 @@ class Service(threading.Thread):
         self.pending = {}
         self.closed = True
         self.module = module
+        self.host = host
+        self.ws_path = None
+        self.executor = None
+        if host:
+            self.executor = host.executor
+        elif args.workers:
+            self.executor = KeyedExecutor(args.workers)
+        self.deadline = args.deadline
+        self.deadlines = {}
+        self.timeout_reply = args.timeout_reply
+        self.slow = args.slow
+        if host:
+            self.timer = host.timer
+        else:
+            self.timer = Deadlines()
+            self.timer.start()
+        self.metrics = Metrics(self.service)
+        if args.metrics is not None and not host:
+            self.metrics.serve(args.metrics)
+        self.watcher = None
+        self.notifier = None
+        self.reload_lock = threading.Lock()
+        self.local = threading.local()
         self.__open(args)
 
+        if args.watch:
+            self.watcher = Watcher(module_source(module), self.reload)
+            self.watcher.start()
+
     def __open(self, args):
         """
         Opens the websocket connection and calls back the module onopen
@@ -68,50 +171,216 @@ class Service(threading.Thread):
 
         If no implementation functions are installed, no thread is
         started.
+
+        If a replay capture is given, no connection is made and the
+        captured frames are read in place of the websocket.
+
+        If hosted, the websocket is opened using the host connection
+        options and handed to the host instead of starting the thread.
         """
-        path = resolve(
-            get_current_folder(args), args.service)
-        ws_path = PATH_PREFIX + path
-        self.ws = get_websocket(args, ws_path)
-        self.start()
+        if args.replay:
+            self.ws = ReplaySocket(args.replay, args.max_speed)
+            self.ws.deliver = self.dispatch
+        else:
+            path = resolve(
+                get_current_folder(args), args.service)
+            self.ws_path = PATH_PREFIX + path
+            if self.host:
+                self.ws = self.host.connect(self.ws_path)
+            else:
+                self.ws = get_websocket(args, self.ws_path)
+            self.ws.counter = self.count_bytes
+            if args.record and not self.host:
+                self.ws = RecordingSocket(
+                    self.ws, Recorder(args.record, path))
+
+        if args.batch_notify:
+            self.notifier = Notifier(self.ws, args.batch_notify / 1000.0)
+            self.notifier.start()
+
+        if self.host:
+            self.host.add(self)
+        else:
+            self.start()
+
+    def reopen(self):
+        """
+        Reconnects a hosted service after disconnect. The module
+        onopen callback is invoked again before reading resumes.
 
-    def close(self):
+        Solicits still pending get the RECONNECT_RESPONSE, since their
+        responses can no longer arrive, so that no caller waits for
+        ever in sync_solicit.
+        """
+        self.ws = self.host.connect(self.ws_path)
+        self.ws.counter = self.count_bytes
+        if self.notifier:
+            self.notifier.ws = self.ws
+
+        # Taken before onopen can solicit again, and woken once
+        # reconnected so that their handlers can reply.
+        pending = [self.pending.pop(event_id)
+                   for event_id in list(self.pending)]
+        self.host.add(self)
+        for callback in pending:
+            callback(copy.deepcopy(RECONNECT_RESPONSE))
+
+    def count_bytes(self, metric, increment):
+        """
+        Counts websocket payload bytes, see the Deflate module.
+        """
+        self.metrics.count(metric, "websocket", increment)
+
+    def disconnect(self):
         """
         Closes the websocket connection if still connected, and calls the
         implementation module onclose callback.
         """
-        self.ws.close()
-
         # Close callback must occur only once.
-        if not self.closed:
-            self.closed = True
+        closed = self.closed
+        self.closed = True
 
+        self.ws.close()
+
+        if not closed:
             if hasattr(self.module, "onclose"):
                 self.module.onclose(self)
 
+    def close(self):
+        """
+        Sends any buffered notifies and disconnects, then stops the
+        metrics endpoint and module watcher. A hosted service is removed
+        from its host.
+        """
+        if self.host:
+            self.host.remove(self)
+
+        if self.notifier:
+            self.notifier.close()
+        self.disconnect()
+        self.metrics.close()
+        if self.watcher:
+            self.watcher.stop()
+        if not self.host:
+            self.timer.close()
+            if self.executor:
+                self.executor.shutdown(wait=False)
+
+    def opened(self):
+        """
+        Marks the service open and calls back the module onopen
+        function.
+        """
+        self.closed = False
+
+        if hasattr(self.module, "onopen"):
+            self.module.onopen(self)
+
     def run(self):
         """
         Thread that dispatches incoming response, request and consume
         messages.
         """
         try:
-            self.closed = False
-
-            if hasattr(self.module, "onopen"):
-                self.module.onopen(self)
+            self.opened()
 
             for message in self.ws:
                 if message:
-                    term = json.loads(message)
-                    if "consume" in term:
-                        self.__consume(term)
-                    elif "request" in term:
-                        self.__request(term)
-                    elif "response" in term:
-                        self.__response(term)
+                    self.dispatch(message)
+
+        # Reading fails once the websocket is closed by close().
+        except (WebSocketException, IOError):
+            if not self.closed:
+                raise
+
         finally:
             self.close()
 
+    def dispatch(self, message):
+        """
+        Decodes and dispatches one incoming message.
+
+        Responses are always dispatched immediately. If there is an
+        executor, requests and consumes are queued to it under their
+        dispatch key, see dispatch_key. Otherwise they are handled
+        immediately, one at a time.
+        """
+        received = default_timer()
+        term = codec.loads(message)
+        if "response" in term:
+            self.__response(term)
+            return
+
+        if "consume" in term:
+            handler = self.__consume
+        elif "request" in term:
+            handler = self.__request
+        else:
+            return
+
+        if self.executor:
+            self.executor.submit(
+                (self, self.dispatch_key(term)), handler, term, received)
+        else:
+            handler(term, received)
+
+    def dispatch_key(self, term):
+        """
+        Returns the key of a request or consume term. Terms with the
+        same key are handled in arrival order, while terms with
+        different keys are handled concurrently.
+
+        The key is the result of the module key(term) callback if any,
+        otherwise the transaction id if the term has one, otherwise
+        the event id. A consume with neither gets a key of its own.
+        """
+        if hasattr(self.module, "key"):
+            return self.module.key(term)
+
+        key = term.get("txn")
+        if key is None:
+            key = term.get("id")
+        if key is None:
+            key = object()
+        return key
+
+    def reload(self):
+        """
+        Re-imports the implementation module from its file and calls
+        the new module onopen callback, which installs the new
+        implementation. The websocket and pending solicits are kept,
+        and events already dispatched complete with the old functions.
+
+        If the import or the onopen callback fails, the error is printed
+        and the previous module and implementation stay installed.
+
+        Returns True if the new module is installed.
+        """
+        with self.reload_lock:
+            name = self.module.__name__
+            impl = self.impl
+            try:
+                spec = importlib.util.spec_from_file_location(
+                    name, module_source(self.module))
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+
+                if hasattr(module, "onopen"):
+                    module.onopen(self)
+
+            except Exception as exception:  # pylint: disable=broad-except
+                self.impl = impl
+                self.metrics.count("reload_error", name)
+                print("Reload of {Name} failed: {Error}".format(
+                    Name=name,
+                    Error=repr(exception)), file=sys.stderr)
+                return False
+
+            self.module = module
+            sys.modules[name] = module
+            self.metrics.count("reload", name)
+            return True
+
     def notify(self, notify):
         """
         Sends the notify term on the websocket, in the form:
@@ -123,10 +392,16 @@ class Service(threading.Thread):
           }
         }
 
-        Returns immediately.
+        Returns immediately. If notifies are batched, the notify is
+        sent within the batch linger time.
         """
+        self.metrics.count("notify", notify["notify"])
+        if self.notifier:
+            self.notifier.notify(notify)
+            return
+
         self.ws.send(
-            json.dumps(notify))
+            codec.dumps(notify))
 
     def solicit(self, solicit, callback=None):
         """
@@ -156,10 +431,10 @@ class Service(threading.Thread):
 
         event_id = random_id()
         solicit["id"] = event_id
-        self.pending[event_id] = callback
+        self.pending[event_id] = self.__timed(solicit, callback)
 
         self.ws.send(
-            json.dumps(solicit))
+            codec.dumps(solicit))
         return None
 
     def sync_solicit(self, solicit):
@@ -168,30 +443,57 @@ class Service(threading.Thread):
         returns it.
 
         This is done by using a condition variable. The calling thread
-        waits until the response is placed into the pending dict in place
-        of the callback function closure.
+        waits until the callback function closure has the response,
+        which may be before the send returns, as in replay.
         """
         event_id = random_id()
         solicit["id"] = event_id
         cv = threading.Condition()
+        responses = []
 
         def callback(response):
-            cv.acquire()
-            self.pending[event_id] = response
-            cv.notify()
-            cv.release()
+            with cv:
+                responses.append(response)
+                cv.notify()
 
-        self.pending[event_id] = callback
+        self.pending[event_id] = self.__timed(solicit, callback)
 
-        cv.acquire()
-        self.ws.send(
-            json.dumps(solicit))
-        cv.wait()
-        cv.release()
-        response = self.pending.pop(event_id)
-        return response
+        # The handler deadline, if any, bounds the wait.
+        expires = getattr(self.local, "expires", None)
+        timeout = None
+        with cv:
+            self.ws.send(
+                codec.dumps(solicit))
+            if expires is not None:
+                timeout = max(expires - default_timer(), 0)
+            if cv.wait_for(lambda: responses, timeout):
+                return responses[0]
+
+        self.pending.pop(event_id, None)
+        self.metrics.count("solicit_timeout", solicit["solicit"])
+        return {
+            "response": self.timeout_reply}
+
+    def __timed(self, solicit, callback):
+        """
+        Counts the solicit and returns a closure around the callback
+        which records the end-to-end solicit round trip.
+        """
+        solicit_path = solicit["solicit"]
+        self.metrics.count("solicit", solicit_path)
+        start = default_timer()
 
-    def __consume(self, consume):
+        def timed(response):
+            """
+            Closure observes the round trip before the callback.
+            """
+            self.metrics.observe(
+                "solicit", solicit_path, default_timer() - start)
+            callback(response)
+
+        return timed
+
+    def __consume(self, consume, received):
         """
         Handles a consume event, dispatching to the implementation
         function.
@@ -201,52 +503,116 @@ class Service(threading.Thread):
         """
         consume_path = consume["consume"]
         impl = self.impl[consume_path]
+        self.metrics.count("consume", consume_path)
+        start = default_timer()
+        self.metrics.observe("queue", consume_path, start - received)
 
         if "id" not in consume:
-            impl(consume)
+            self.__invoke(consume_path, impl, consume)
+            self.__handled(consume_path, start)
             return
 
-        event_id = consume["id"]
-
-        def callback(reply):
-            """
-            Closure reinstates full reply path if not already present.
-            """
-            reply["id"] = event_id
-
-            reply_path = reply["reply"]
-            if not reply_path.startswith(consume_path):
-                reply["reply"] = consume_path + "/" + reply_path
-
-            self.ws.send(
-                json.dumps(reply))
-
-        impl(consume, callback)
+        callback = self.__replier(consume_path, consume["id"], start)
+        self.__invoke(consume_path, impl, consume, callback)
 
-    def __request(self, request):
+    def __request(self, request, received):
         """
         Handles a request event, dispatching to the implementation
         function. The callback closure sends the reply event on
         the websocket.
         """
         request_path = request["request"]
-        event_id = request["id"]
         impl = self.impl[request_path]
+        self.metrics.count("request", request_path)
+        start = default_timer()
+        self.metrics.observe("queue", request_path, start - received)
 
-        def callback(reply):
+        callback = self.__replier(request_path, request["id"], start)
+        self.__invoke(request_path, impl, request, callback)
+
+    def __replier(self, path, event_id, start):
+        """
+        Returns the callback closure which sends the handler reply.
+
+        If the operation has a deadline, the timeout reply is sent
+        instead when the handler overruns, and its late reply is
+        dropped. Only the first reply is ever sent.
+        """
+        once = threading.Lock()
+        deadline = None
+
+        def send(reply):
             """
-            Closure reinstates full reply path if not already present.
+            Reinstates full reply path if not already present.
             """
             reply["id"] = event_id
 
             reply_path = reply["reply"]
-            if not reply_path.startswith(request_path):
-                reply["reply"] = request_path + "/" + reply_path
+            if not reply_path.startswith(path):
+                reply["reply"] = path + "/" + reply_path
 
             self.ws.send(
-                json.dumps(reply))
+                codec.dumps(reply))
 
-        impl(request, callback)
+        def callback(reply):
+            """
+            Sends the reply unless the deadline has passed.
+            """
+            if not once.acquire(False):  # pylint: disable=consider-using-with
+                self.metrics.count("late", path)
+                return
+
+            if deadline:
+                self.timer.cancel(deadline)
+            self.metrics.count("reply", path)
+            self.__handled(path, start)
+            send(reply)
+
+        def expired():
+            """
+            Sends the timeout reply unless already replied.
+            """
+            if not once.acquire(False):  # pylint: disable=consider-using-with
+                return
+
+            self.metrics.count("timeout", path)
+            print("Handler {Path} timed out after {Secs}s".format(
+                Path=path,
+                Secs=round(default_timer() - start, 3)), file=sys.stderr)
+            send({
+                "reply": self.timeout_reply})
+
+        secs = self.deadlines.get(path, self.deadline)
+        if secs:
+            deadline = self.timer.add(secs, expired)
+            self.local.expires = start + secs
+        return callback
+
+    def __handled(self, path, start):
+        """
+        Observes the handler time, logging it if slow.
+        """
+        secs = default_timer() - start
+        self.metrics.observe("handler", path, secs)
+        if self.slow is not None and secs > self.slow:
+            self.metrics.count("slow", path)
+            print("Handler {Path} was slow: {Secs}s".format(
+                Path=path,
+                Secs=round(secs, 3)), file=sys.stderr)
+
+    def __invoke(self, path, impl, *impl_args):
+        """
+        Invokes the implementation function, counting any exception
+        it raises against the operation path before re-raising it.
+        The handler deadline set by __replier ends with the call.
+        """
+        try:
+            impl(*impl_args)
+        except Exception:
+            self.metrics.count("error", path)
+            raise
+        finally:
+            self.local.expires = None
 
     def __response(self, response):
         """
@@ -255,13 +621,35 @@ class Service(threading.Thread):
         response_path = response["response"]
         response["response"] = response_path.split("/")[-1]
         event_id = response["id"]
+        self.metrics.count("response", response_path)
         callback = self.pending.pop(event_id)
         callback(response)
 
+    def snapshot(self):
+        """
+        Returns the current metrics struct, see Metrics.snapshot.
+        """
+        return self.metrics.snapshot()
+
     def __str__(self):
         return "Service <" + self.service + ">"
 
 
+def module_source(module):
+    """
+    Returns the source file path of the module.
+    """
+    path = getattr(module, "__file__", None)
+    if not path:
+        raise CliException(
+            "Module {Name} has no source file".format(
+                Name=module.__name__))
+
+    if path.endswith(".pyc"):
+        path = path[:-1]
+    return path
+
+
 def random_id():
     """
     Utility function returns a random string of length 10.
@@ -0,0 +1,247 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+An instance of this class hosts any number of Service instances in
+one process.
+
+A single thread waits on all the service websockets using a selector,
+in place of one reader thread per service. The connection state and
+cookies are read once and shared by every websocket.
+
+Responses to solicits are dispatched directly on the host thread, so
+that handlers blocked in sync_solicit are never waiting behind each
+other. Requests and consumes run on a shared worker pool, in arrival
+order for each service and dispatch key, see Service.dispatch_key.
+
+Hosted services share one timer thread for handler deadlines.
+
+Each service keeps its own metrics. The host serves them all from a
+single Prometheus endpoint if a metrics port is given.
+
+If the node closes a service websocket, only that service is closed
+and, if a reconnect delay is given, reopened after the delay.
+"""
+from __future__ import print_function
+
+import selectors
+import sys
+import threading
+
+from websocket import (
+    WebSocketException)
+
+from sparkl_cli.Deadlines import (
+    Deadlines)
+
+from sparkl_cli.KeyedExecutor import (
+    KeyedExecutor)
+
+from sparkl_cli.Metrics import (
+    prometheus,
+    serve)
+
+from sparkl_cli.common import (
+    open_websocket,
+    read_messages,
+    websocket_options)
+
+# Default size of the shared worker pool.
+WORKERS = 8
+
+# Seconds between checks of the closed flag while no socket is ready.
+SELECT_SECS = 1.0
+
+
+class ServiceHost(threading.Thread):
+    """
+    Reads the websockets of many services from one thread.
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, args):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.options = websocket_options(args)
+        self.executor = KeyedExecutor(args.workers or WORKERS)
+        self.timer = Deadlines()
+        self.timer.start()
+        self.reconnect = args.reconnect
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.services = []
+        self.reconnecting = set()
+        self.closed = False
+        self.server = None
+        if args.metrics is not None:
+            self.server = serve(self.prometheus, args.metrics)
+
+    def connect(self, ws_path):
+        """
+        Returns a websocket connected to the path, using the shared
+        connection options.
+        """
+        return open_websocket(self.options, ws_path)
+
+    def add(self, service):
+        """
+        Calls the service onopen callback, then starts reading the
+        service websocket.
+        """
+        service.opened()
+        with self.lock:
+            if service not in self.services:
+                self.services.append(service)
+            self.reconnecting.discard(service)
+            self.selector.register(
+                service.ws.sock, selectors.EVENT_READ, service)
+
+    def remove(self, service):
+        """
+        Stops reading the service websocket and cancels any pending
+        reconnect. Called by Service.close before the websocket closes.
+        """
+        with self.lock:
+            self.reconnecting.discard(service)
+            if service in self.services:
+                self.services.remove(service)
+            self.__unregister(service)
+
+    def run(self):
+        """
+        Waits for readable websockets and dispatches their messages
+        until the host is closed.
+        """
+        while not self.closed:
+            for (key, _) in self.selector.select(SELECT_SECS):
+                self.__read(key.data)
+
+    def __read(self, service):
+        """
+        Reads and dispatches every frame already received on the
+        service websocket. A close frame or read error closes the
+        service, which is reopened if a reconnect delay is set.
+        """
+        try:
+            for message in read_messages(service.ws):
+                service.dispatch(message)
+
+        except (WebSocketException, IOError) as exception:
+            if service.closed:
+                return
+
+            self.__drop(service, exception)
+
+    def __drop(self, service, exception):
+        """
+        Closes the service after the node has closed its websocket,
+        and schedules its reopen.
+        """
+        with self.lock:
+            self.__unregister(service)
+
+        print("Service {Service} disconnected: {Error}".format(
+            Service=service.service,
+            Error=exception), file=sys.stderr)
+        service.disconnect()
+
+        if self.reconnect is not None and not self.closed:
+            with self.lock:
+                self.reconnecting.add(service)
+            self.__schedule(service)
+
+    def __schedule(self, service):
+        """
+        Reopens the service after the reconnect delay.
+        """
+        timer = threading.Timer(
+            self.reconnect, self.__reopen, (service,))
+        timer.daemon = True
+        timer.start()
+
+    def __reopen(self, service):
+        """
+        Reopens the service unless it was closed in the meantime,
+        retrying after the delay if the connection fails.
+        """
+        with self.lock:
+            if self.closed or service not in self.reconnecting:
+                return
+
+        try:
+            service.reopen()
+        except Exception as exception:  # pylint: disable=broad-except
+            print("Service {Service} reconnect failed: {Error}".format(
+                Service=service.service,
+                Error=exception), file=sys.stderr)
+            self.__schedule(service)
+
+    def __unregister(self, service):
+        """
+        Removes the service socket from the selector if registered.
+        Must be called with the lock held.
+        """
+        try:
+            self.selector.unregister(service.ws.sock)
+        except (KeyError, ValueError):
+            pass
+
+    def prometheus(self):
+        """
+        Returns the Prometheus text for all hosted services.
+        """
+        with self.lock:
+            services = list(self.services)
+        return prometheus(
+            [service.metrics for service in services])
+
+    def snapshot(self):
+        """
+        Returns the metrics snapshot of every hosted service.
+        """
+        with self.lock:
+            services = list(self.services)
+
+        return {
+            "tag": "host",
+            "attr": {
+                "services": len(services),
+                "reconnecting": len(self.reconnecting)
+            },
+            "content": [
+                service.snapshot() for service in services]
+        }
+
+    def close(self):
+        """
+        Closes every hosted service, then the worker pool and the
+        metrics endpoint.
+        """
+        self.closed = True
+        with self.lock:
+            services = list(self.services)
+            self.reconnecting.clear()
+
+        for service in services:
+            service.close()
+
+        self.executor.shutdown(wait=False)
+        self.timer.close()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __str__(self):
+        return "ServiceHost <" + str(len(self.services)) + " services>"
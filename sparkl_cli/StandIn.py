@@ -0,0 +1,466 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Local stand-in for a SPARKL node, speaking just enough of the
+svc_rest websocket protocol to drive a Service without a network.
+
+It answers:
+
+    GET /sse/ping
+        with a ping term, so that `sparkl connect` accepts it.
+
+    GET /svc_rest/websocket/<service path>
+        by upgrading to a websocket session for the service path.
+
+    GET /sse_listen/websocket/<subject path>
+        by upgrading to a listen session for the subject path, on
+        which the publish method sends events.
+
+If created with deflate set, the stand-in accepts the permessage-deflate
+extension when offered, and then compresses every message it sends.
+
+On a session, the stand-in sends request and consume events with the
+request and consume methods, invoking the given callback with the
+reply. Solicits from the service are answered immediately using the
+responses dict, and notifies are counted.
+"""
+from __future__ import print_function
+
+import base64
+import hashlib
+import json
+import socketserver
+import struct
+import threading
+import zlib
+
+from sparkl_cli import (
+    codec)
+
+from sparkl_cli.Service import (
+    random_id)
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WS_PREFIX = "/svc_rest/websocket/"
+LISTEN_PREFIX = "/sse_listen/websocket/"
+PING_PATH = "/sse/ping"
+
+OPCODE_TEXT = 0x1
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+DEFAULT_RESPONSE = ("Ok", {})
+
+DEFLATE_TAIL = b"\x00\x00\xff\xff"
+
+
+class StandIn(socketserver.ThreadingTCPServer):
+    """
+    Threaded server on a local port, one thread per connection.
+    """
+    # pylint: disable=too-many-instance-attributes
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, responses=None, deflate=False):
+        """
+        Binds to the local port, 0 meaning any free port.
+
+        The responses dict maps a solicit path to a 2-tuple of
+        (response name, data dict), or to None for a solicit which is
+        never answered. Solicits not in the dict get the Ok response
+        with no data.
+        """
+        socketserver.ThreadingTCPServer.__init__(
+            self, ("127.0.0.1", port), Handler)
+        self.responses = responses or {}
+        self.deflate = deflate
+        self.sessions = {}
+        self.pending = {}
+        self.notifies = {}
+        self.solicits = {}
+        self.condition = threading.Condition()
+        self.thread = None
+
+    @property
+    def url(self):
+        """
+        The http url to use with `sparkl connect`.
+        """
+        (host, port) = self.server_address
+        return "http://{Host}:{Port}".format(Host=host, Port=port)
+
+    def start(self):
+        """
+        Serves from a daemon thread and returns self.
+        """
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def close(self):
+        """
+        Closes all sessions and stops serving.
+        """
+        with self.condition:
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            session.close()
+        self.shutdown()
+        self.server_close()
+
+    def wait_session(self, service, timeout=5):
+        """
+        Waits for a service to connect to the given path and returns
+        its session, or None on timeout.
+        """
+        service = service.strip("/")
+        with self.condition:
+            self.condition.wait_for(
+                lambda: service in self.sessions, timeout)
+            return self.sessions.get(service)
+
+    def wait_listen(self, subject, timeout=5):
+        """
+        Waits for a listen session on the subject path and returns
+        it, or None on timeout.
+        """
+        return self.wait_session(listen_key(subject), timeout)
+
+    def publish(self, subject, term):
+        """
+        Sends the event term to the listen session on the subject.
+        """
+        self.sessions[listen_key(subject)].send(term)
+
+    def request(self, service, request, data, callback):
+        """
+        Sends a request event to the service. The callback is invoked
+        with the reply term.
+        """
+        return self.__send_event(
+            service, {"request": request, "data": data}, callback)
+
+    def consume(self, service, consume, data, callback=None, txn=None):
+        """
+        Sends a consume event to the service, in the transaction if
+        given. If a callback is given, the consume carries an id and
+        the callback is invoked with the reply term.
+        """
+        term = {"consume": consume, "data": data}
+        if txn is not None:
+            term["txn"] = txn
+        return self.__send_event(service, term, callback)
+
+    def __send_event(self, service, term, callback):
+        """
+        Sends the event, registering the callback against a new id.
+        Returns the id, or None if no reply is expected.
+        """
+        event_id = None
+        if callback:
+            event_id = random_id()
+            term["id"] = event_id
+            self.pending[event_id] = callback
+
+        session = self.sessions[service.strip("/")]
+        session.send(term)
+        return event_id
+
+    def dispatch(self, session, term):
+        """
+        Handles a term received from a service.
+        """
+        if "reply" in term:
+            callback = self.pending.pop(term.get("id"), None)
+            if callback:
+                callback(term)
+
+        elif "solicit" in term:
+            path = term["solicit"]
+            with self.condition:
+                count(self.solicits, path)
+            response = self.responses.get(path, DEFAULT_RESPONSE)
+            if response is None:
+                return
+            (name, data) = response
+            session.send({
+                "response": path + "/" + name,
+                "id": term["id"],
+                "data": data})
+
+        elif "notify" in term:
+            with self.condition:
+                count(self.notifies, term["notify"])
+
+    def register(self, session):
+        """
+        Adds the newly connected session.
+        """
+        with self.condition:
+            self.sessions[session.service] = session
+            self.condition.notify_all()
+
+    def unregister(self, session):
+        """
+        Removes the session once closed.
+        """
+        with self.condition:
+            if self.sessions.get(session.service) is session:
+                del self.sessions[session.service]
+            self.condition.notify_all()
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """
+    Reads the HTTP request and either answers the ping or upgrades
+    to a websocket session.
+    """
+
+    def handle(self):
+        """
+        Dispatches on the request path.
+        """
+        request_line = self.rfile.readline().decode("latin-1")
+        headers = {}
+        while True:
+            line = self.rfile.readline().decode("latin-1").strip()
+            if not line:
+                break
+            (name, _, value) = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        parts = request_line.split()
+        path = parts[1] if len(parts) > 1 else ""
+
+        if path == PING_PATH:
+            self.__ping()
+
+        elif path.startswith((WS_PREFIX, LISTEN_PREFIX)) and \
+                headers.get("upgrade", "").lower() == "websocket":
+            deflate = self.server.deflate and "permessage-deflate" in \
+                headers.get("sec-websocket-extensions", "")
+            self.__upgrade(headers["sec-websocket-key"], deflate)
+            if path.startswith(WS_PREFIX):
+                key = path[len(WS_PREFIX):].strip("/")
+            else:
+                key = listen_key(path[len(LISTEN_PREFIX):])
+            session = Session(
+                self.server, key, self.rfile, self.wfile, deflate)
+            session.run()
+
+        else:
+            self.wfile.write(
+                b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+
+    def __ping(self):
+        """
+        Writes the ping response.
+        """
+        body = json.dumps({
+            "tag": "ping",
+            "attr": {
+                "node": "standin@localhost"
+            }
+        }).encode("utf-8")
+        self.wfile.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/json\r\n"
+            b"Connection: close\r\n"
+            b"Content-Length: " + str(len(body)).encode("ascii") +
+            b"\r\n\r\n" + body)
+
+    def __upgrade(self, key, deflate):
+        """
+        Writes the websocket handshake response, accepting
+        permessage-deflate if deflate is set.
+        """
+        accept = base64.b64encode(
+            hashlib.sha1((key + WS_GUID).encode("ascii")).digest())
+        extension = b""
+        if deflate:
+            extension = b"Sec-WebSocket-Extensions: permessage-deflate\r\n"
+        self.wfile.write(
+            b"HTTP/1.1 101 Switching Protocols\r\n"
+            b"Upgrade: websocket\r\n"
+            b"Connection: Upgrade\r\n" + extension +
+            b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+        self.wfile.flush()
+
+
+class Session(object):  # pylint: disable=too-many-instance-attributes
+    """
+    A websocket session with one connected service.
+    """
+
+    def __init__(self, server, service, rfile, wfile, deflate=False):
+        self.server = server
+        self.service = service
+        self.rfile = rfile
+        self.wfile = wfile
+        self.lock = threading.Lock()
+        self.closed = False
+        self.deflater = None
+        self.inflater = None
+        if deflate:
+            self.deflater = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+            self.inflater = zlib.decompressobj(-15)
+
+    def run(self):
+        """
+        Reads frames until the service closes the websocket.
+        """
+        self.server.register(self)
+        try:
+            while True:
+                (opcode, payload, compressed) = read_message(self.rfile)
+                if opcode is None or opcode == OPCODE_CLOSE:
+                    break
+                if compressed:
+                    payload = self.inflater.decompress(payload + DEFLATE_TAIL)
+                if opcode == OPCODE_PING:
+                    self.write(OPCODE_PONG, payload)
+                elif opcode == OPCODE_TEXT and payload:
+                    self.server.dispatch(
+                        self, codec.loads(payload))
+        except (IOError, ValueError):
+            pass
+        finally:
+            self.server.unregister(self)
+            self.close()
+
+    def send(self, term):
+        """
+        Sends the term as a text frame, compressed if negotiated.
+        """
+        payload = codec.dumps(term).encode("utf-8")
+        with self.lock:
+            if self.deflater:
+                payload = self.deflater.compress(payload) + \
+                    self.deflater.flush(zlib.Z_SYNC_FLUSH)
+                payload = payload[:-len(DEFLATE_TAIL)]
+            self.wfile.write(encode_frame(
+                OPCODE_TEXT, payload, bool(self.deflater)))
+            self.wfile.flush()
+
+    def write(self, opcode, payload):
+        """
+        Writes one unmasked frame.
+        """
+        with self.lock:
+            self.wfile.write(encode_frame(opcode, payload))
+            self.wfile.flush()
+
+    def close(self):
+        """
+        Sends a close frame, if not already closed.
+        """
+        if not self.closed:
+            self.closed = True
+            try:
+                self.write(OPCODE_CLOSE, struct.pack("!H", 1000))
+            except (IOError, ValueError):
+                pass
+
+
+def listen_key(subject):
+    """
+    Returns the sessions dict key of a listen session, distinct from
+    any service path.
+    """
+    return "listen:" + subject.strip("/")
+
+
+def encode_frame(opcode, payload, compressed=False):
+    """
+    Returns the bytes of a single final unmasked frame, with the RSV1
+    bit set if compressed.
+    """
+    first = 0x80 | opcode
+    if compressed:
+        first |= 0x40
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", first, length)
+    elif length < 0x10000:
+        header = struct.pack("!BBH", first, 126, length)
+    else:
+        header = struct.pack("!BBQ", first, 127, length)
+    return header + payload
+
+
+def read_frame(rfile):
+    """
+    Reads one frame, returning (fin, opcode, payload, rsv1) or
+    (None, None, None, None) at end of stream.
+    """
+    header = rfile.read(2)
+    if len(header) < 2:
+        return (None, None, None, None)
+
+    (first, second) = struct.unpack("!BB", header)
+    length = second & 0x7F
+    if length == 126:
+        (length,) = struct.unpack("!H", rfile.read(2))
+    elif length == 127:
+        (length,) = struct.unpack("!Q", rfile.read(8))
+
+    mask = rfile.read(4) if second & 0x80 else None
+    payload = rfile.read(length)
+    if mask:
+        payload = unmask(mask, payload)
+
+    return (bool(first & 0x80), first & 0x0F, payload, bool(first & 0x40))
+
+
+def read_message(rfile):
+    """
+    Reads frames until a complete message, returning (opcode, payload,
+    compressed) or (None, None, None) at end of stream.
+    """
+    (fin, opcode, payload, compressed) = read_frame(rfile)
+    if opcode is None:
+        return (None, None, None)
+
+    while not fin:
+        (fin, _continuation, more, _rsv1) = read_frame(rfile)
+        if more is None:
+            return (None, None, None)
+        payload += more
+
+    return (opcode, payload, compressed)
+
+
+def unmask(mask, payload):
+    """
+    Applies the 4-byte mask to the payload, using a single integer
+    xor over the whole payload rather than a loop over bytes.
+    """
+    length = len(payload)
+    if not length:
+        return payload
+    key = (mask * (length // 4 + 1))[:length]
+    value = int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")
+    return value.to_bytes(length, "big")
+
+
+def count(counters, path):
+    """
+    Increments the counter for the path.
+    """
+    counters[path] = counters.get(path, 0) + 1
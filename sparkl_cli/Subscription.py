@@ -0,0 +1,408 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+An instance of this class is one sse_listen websocket subscription.
+
+The open_all function opens a subscription to each path, closing
+those already opened if any fails.
+
+Any number of open subscriptions are read from one thread using a
+selector, see the multiplex function. Each subscription can be closed
+and reopened without affecting the others. Another thread can end the
+multiplex cleanly through a Waker.
+
+When the node closes a subscription, it is reopened with exponential
+backoff. Each reopen attempt connects on a thread of its own, so that
+the other subscriptions are read meanwhile. Once reopened, a gap marker
+term gives the outage window so that consumers know events may be
+missing:
+
+    {
+        "tag": "listen_gap",
+        "attr": {
+            "listen": "/Scratch/Primes",
+            "from": 1530000000123,
+            "to": 1530000004567,
+            "seconds": 4.444,
+            "reconnects": 1,
+            "received": 1234
+        }
+    }
+
+where from and to are epoch milliseconds, and reconnects and received
+count the reconnects and events of the subscription so far.
+
+The byte_counts function gives the payload bytes received on the
+wire and once inflated, over all the subscriptions, as the term:
+
+    {
+        "tag": "listen_bytes",
+        "attr": {
+            "wire": 1234567,
+            "raw": 9876543,
+            "ratio": 0.125
+        }
+    }
+"""
+from __future__ import print_function
+
+import random
+import selectors
+import socket
+import sys
+import threading
+import time
+from timeit import default_timer
+
+from websocket import (
+    WebSocketException)
+
+from sparkl_cli import (
+    codec)
+
+from sparkl_cli.common import (
+    open_websocket,
+    read_messages)
+
+PATH_PREFIX = "sse_listen/websocket/"
+
+GAP_TAG = "listen_gap"
+
+BYTES_TAG = "listen_bytes"
+
+# Seconds before the first reopen attempt, doubled on each failure.
+BACKOFF_SECS = 0.5
+
+# Longest wait between reopen attempts.
+MAX_BACKOFF_SECS = 30.0
+
+
+class Subscription(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Websocket listening to one configuration subject path.
+    """
+
+    def __init__(self, options, path,
+                 backoff_secs=BACKOFF_SECS, max_backoff_secs=MAX_BACKOFF_SECS):
+        """
+        The options are as returned by common.websocket_options.
+        """
+        self.options = options
+        self.path = path
+        self.backoff_secs = backoff_secs
+        self.max_backoff_secs = max_backoff_secs
+        self.ws = None
+        self.restart_at = None
+        self.down_since = None
+        self.attempts = 0
+        self.reconnects = 0
+        self.received = 0
+        self.closed_counts = {}
+        self.reopened = None
+
+    def open(self):
+        """
+        Opens the websocket.
+        """
+        self.ws = open_websocket(
+            self.options, PATH_PREFIX + self.path)
+        self.restart_at = None
+
+    def close(self):
+        """
+        Closes the websocket.
+        """
+        if self.ws:
+            self.ws.close()
+            for (metric, value) in getattr(self.ws, "counts", {}).items():
+                self.closed_counts[metric] = \
+                    self.closed_counts.get(metric, 0) + value
+            self.ws = None
+
+    def drop(self):
+        """
+        Closes the websocket after a failure, and schedules the next
+        reopen attempt with exponential backoff and jitter.
+        """
+        self.close()
+        if self.down_since is None:
+            self.down_since = time.time()
+
+        delay = min(
+            self.backoff_secs * 2 ** self.attempts, self.max_backoff_secs)
+        self.attempts += 1
+        self.restart_at = default_timer() + \
+            delay * random.uniform(0.8, 1.2)
+
+    def reopen(self):
+        """
+        Attempts to reopen the websocket after drop, returning the gap
+        marker term if successful, otherwise None.
+        """
+        try:
+            self.open()
+        except (WebSocketException, IOError) as exception:
+            print("Listen {Path} reconnect failed: {Error}".format(
+                Path=self.path,
+                Error=exception), file=sys.stderr)
+            self.drop()
+            return None
+
+        now = time.time()
+        self.reconnects += 1
+        self.attempts = 0
+        gap = {
+            "tag": GAP_TAG,
+            "attr": {
+                "listen": self.path,
+                "from": int(self.down_since * 1000),
+                "to": int(now * 1000),
+                "seconds": round(now - self.down_since, 3),
+                "reconnects": self.reconnects,
+                "received": self.received
+            }
+        }
+        self.down_since = None
+        return gap
+
+    def reopen_async(self, waker):
+        """
+        Attempts the reopen on a new thread, which keeps the gap
+        marker in the reopened property if successful, then wakes
+        the waker. If the waker is closed by then, the websocket is
+        closed again.
+        """
+        self.restart_at = None
+
+        def attempt():
+            """
+            Closure reopens, then wakes the multiplex.
+            """
+            self.reopened = self.reopen()
+            try:
+                waker.wake()
+            except (IOError, OSError):
+                self.close()
+
+        thread = threading.Thread(target=attempt)
+        thread.daemon = True
+        thread.start()
+
+    def read(self, prefilter=None):
+        """
+        Returns the list of terms already received. If given, the
+        prefilter function of the raw message drops those for which
+        it returns False before they are decoded.
+
+        A message which is not valid JSON is reported and skipped.
+        """
+        messages = read_messages(self.ws)
+        self.received += len(messages)
+        terms = []
+        for message in messages:
+            if prefilter and not prefilter(message):
+                continue
+            try:
+                terms.append(codec.loads(message))
+            except ValueError as exception:
+                print("Listen {Path} skipped bad message: {Error}".format(
+                    Path=self.path,
+                    Error=exception), file=sys.stderr)
+        return terms
+
+    def byte_counts(self):
+        """
+        Returns the dict of websocket byte counters over all the
+        websockets opened, see the Deflate module.
+        """
+        counts = dict(self.closed_counts)
+        for (metric, value) in getattr(self.ws, "counts", {}).items():
+            counts[metric] = counts.get(metric, 0) + value
+        return counts
+
+    def fileno(self):
+        """
+        Returns the websocket file descriptor, for the selector.
+        """
+        return self.ws.sock.fileno()
+
+    def __str__(self):
+        return "Subscription <" + self.path + ">"
+
+
+def open_all(options, paths,
+             backoff_secs=BACKOFF_SECS, max_backoff_secs=MAX_BACKOFF_SECS):
+    """
+    Returns the list of subscriptions to the paths, all opened. If
+    any fails to open, those already opened are closed before the
+    error is raised.
+    """
+    subscriptions = []
+    try:
+        for path in paths:
+            subscription = Subscription(
+                options, path, backoff_secs, max_backoff_secs)
+            subscription.open()
+            subscriptions.append(subscription)
+    except BaseException:
+        for subscription in subscriptions:
+            subscription.close()
+        raise
+    return subscriptions
+
+
+class Waker(object):
+    """
+    Lets another thread wake a multiplex waiting on its selector.
+    """
+
+    def __init__(self):
+        (self.reader, self.writer) = socket.socketpair()
+
+    def wake(self):
+        """
+        Makes the waker readable.
+        """
+        self.writer.send(b"\0")
+
+    def clear(self):
+        """
+        Reads the wakes so far, once the waker is readable.
+        """
+        self.reader.recv(4096)
+
+    def fileno(self):
+        """
+        Returns the file descriptor for the selector.
+        """
+        return self.reader.fileno()
+
+    def close(self):
+        """
+        Closes both ends.
+        """
+        self.reader.close()
+        self.writer.close()
+
+
+def multiplex(subscriptions, reconnect=True, prefilter=None, waker=None):
+    """
+    Generator that yields the pair (subscription, term) for each term
+    received on any of the open subscriptions, in arrival order.
+    See Subscription.read for the prefilter.
+
+    If a waker is given, the generator ends once it is woken.
+
+    If reconnect is False, the generator ends as soon as any
+    subscription closes. Otherwise a closed subscription is reopened
+    with backoff while the others carry on, and its gap marker term
+    is yielded once reopened. Reopen attempts wake the selector
+    through a waker of their own when done, see reopen_async.
+    """
+    selector = selectors.DefaultSelector()
+    reopener = Waker()
+    try:
+        for subscription in subscriptions:
+            selector.register(
+                subscription, selectors.EVENT_READ)
+        if waker:
+            selector.register(waker, selectors.EVENT_READ)
+        selector.register(reopener, selectors.EVENT_READ)
+
+        while True:
+            for (key, _) in selector.select(
+                    select_timeout(subscriptions)):
+                subscription = key.fileobj
+                if subscription is waker:
+                    return
+                if subscription is reopener:
+                    reopener.clear()
+                    for (reopened, gap) in reopened_gaps(subscriptions):
+                        selector.register(
+                            reopened, selectors.EVENT_READ)
+                        yield (reopened, gap)
+                    continue
+                try:
+                    terms = subscription.read(prefilter)
+                except (WebSocketException, IOError):
+                    if not reconnect:
+                        return
+                    selector.unregister(subscription)
+                    subscription.drop()
+                    continue
+
+                for term in terms:
+                    yield (subscription, term)
+
+            for subscription in subscriptions:
+                if subscription.restart_at is not None and \
+                        subscription.restart_at <= default_timer():
+                    subscription.reopen_async(reopener)
+
+    finally:
+        reopener.close()
+        for subscription in subscriptions:
+            subscription.close()
+        selector.close()
+
+
+def reopened_gaps(subscriptions):
+    """
+    Returns the list of (subscription, gap marker) for the
+    subscriptions reopened since last called.
+    """
+    gaps = []
+    for subscription in subscriptions:
+        gap = subscription.reopened
+        if gap:
+            subscription.reopened = None
+            gaps.append((subscription, gap))
+    return gaps
+
+
+def byte_counts(subscriptions):
+    """
+    Returns the term giving the payload bytes received by all the
+    subscriptions, or None if nothing was received.
+    """
+    wire = raw = 0
+    for subscription in subscriptions:
+        counts = subscription.byte_counts()
+        wire += counts.get("bytes_in_wire", 0)
+        raw += counts.get("bytes_in_raw", 0)
+
+    if not raw:
+        return None
+
+    return {
+        "tag": BYTES_TAG,
+        "attr": {
+            "wire": wire,
+            "raw": raw,
+            "ratio": round(wire / float(raw), 3)
+        }
+    }
+
+
+def select_timeout(subscriptions):
+    """
+    Returns the seconds until the next subscription is due for
+    reopen, or None if none is.
+    """
+    due = [subscription.restart_at for subscription in subscriptions
+           if subscription.restart_at is not None]
+    if not due:
+        return None
+    return max(min(due) - default_timer(), 0)
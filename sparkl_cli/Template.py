@@ -0,0 +1,226 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Compiled operation templates, used by call.
+
+A template holds all that call needs from the configuration to build
+an operation event and to name the event received, so that repeated
+calls of an operation make no object requests:
+
+    id, tag and path
+        of the operation, the path being the one it was resolved from.
+
+    fields
+        [field id, name, type] of each operation field with a value.
+
+    objects
+        {id: [tag, name, type]} of each subject and field seen in the
+        events received, learned when first seen.
+
+Templates are kept in the connection state alongside the object cache,
+keyed by operation id. A template found by path may be stale if the
+configuration has changed since, which call checks on an error event
+by compiling it again.
+"""
+from __future__ import print_function
+
+import threading
+
+from sparkl_cli.CliException import (
+    CliException)
+
+from sparkl_cli.Resolver import (
+    get_objects)
+
+from sparkl_cli.common import (
+    get_connection,
+    put_connection)
+
+# Coercion of string values by field type. Other types are strings.
+COERCE = {
+    "integer": int,
+    "boolean": bool,
+    "float": float
+}
+
+
+class Template(object):
+    """
+    Compiled operation template, see the module notes.
+    """
+
+    def __init__(self, struct):
+        self.struct = struct
+        self.operation_id = struct["id"]
+        self.tag = struct["tag"]
+        self.fields = struct["fields"]
+        self.objects = struct.setdefault("objects", {})
+        self.lock = threading.Lock()
+        self.learned = False
+
+    def data(self, values, default=None):
+        """
+        Returns the list of datum for the dict of values by field name.
+        String values are coerced by field type.
+
+        The datum for a field missing from the values is that returned
+        by the default function of (field_id, field_name, field_type),
+        if given. Raises CliException if there is none.
+        """
+        if not isinstance(values, dict):
+            raise CliException("Input is not a JSON object")
+
+        data = []
+        for (field_id, field_name, field_type) in self.fields:
+            if field_name in values:
+                value = values[field_name]
+                if isinstance(value, str) and field_type in COERCE:
+                    value = COERCE[field_type](value)
+                data.append({
+                    "tag": "datum",
+                    "attr": {
+                        "field": field_id
+                    },
+                    "content": [value]})
+                continue
+
+            datum = default and default(field_id, field_name, field_type)
+            if not datum:
+                raise CliException(
+                    "Missing {Type} value: {Name}".format(
+                        Type=field_type,
+                        Name=field_name))
+            data.append(datum)
+
+        return data
+
+    def unknown(self, ids):
+        """
+        Returns the list of the ids not yet learned.
+        """
+        with self.lock:
+            return [
+                object_id for object_id in ids
+                if object_id not in self.objects]
+
+    def lookup(self, object_id, get):
+        """
+        Returns [tag, name, type] of the object, learning it using the
+        get function of an id if not yet known.
+        """
+        with self.lock:
+            known = self.objects.get(object_id)
+        if known is not None:
+            return known
+
+        sparkl_object = get(object_id)
+        if not sparkl_object:
+            return [None, None, None]
+
+        attr = sparkl_object.get("attr", {})
+        known = [sparkl_object.get("tag"), attr.get("name"), attr.get("type")]
+        with self.lock:
+            self.objects[object_id] = known
+            self.learned = True
+        return known
+
+    def simplify(self, data_event, get):
+        """
+        Returns a struct corresponding to the data event with ids
+        resolved to names, using the get function of an id for any
+        not yet learned.
+        """
+        subject_id = data_event["attr"]["subject"]
+        (tag, name, _type) = self.lookup(subject_id, get)
+        result = {
+            "tag": tag,
+            "attr": {
+                "id": subject_id,
+                "name": name
+            },
+            "content": []
+        }
+
+        for datum in data_event.get("content", []):
+            (_tag, name, field_type) = self.lookup(
+                datum["attr"]["field"], get)
+            datum["attr"]["type"] = field_type
+            datum["attr"]["name"] = name
+            result["content"].append(datum)
+
+        return result
+
+
+def compile_template(args, operation, path):
+    """
+    Returns the template of the operation object resolved from the
+    path, getting all of its fields at once.
+    """
+    field_ids = operation["attr"]["fields"].split()
+    objects = get_objects(args, field_ids)
+
+    fields = []
+    for field_id in field_ids:
+        field = objects.get(field_id)
+        if not field:
+            raise CliException(
+                "No field {Field}".format(
+                    Field=field_id))
+        field_type = field["attr"]["type"]
+        if field_type:
+            fields.append([field_id, field["attr"]["name"], field_type])
+
+    return Template({
+        "id": operation["attr"]["id"],
+        "tag": operation["tag"],
+        "path": path,
+        "fields": fields,
+        "objects": {}
+    })
+
+
+def load_template(args, path):
+    """
+    Returns the template resolved from the path, or None if there
+    is none in the connection state.
+    """
+    templates = get_connection(args).get("templates", {})
+    for struct in templates.values():
+        if struct.get("path") == path:
+            return Template(struct)
+    return None
+
+
+def save_template(args, template):
+    """
+    Puts the template in the connection state.
+    """
+    connection = get_connection(args)
+    templates = connection.get("templates", {})
+    templates[template.operation_id] = template.struct
+    connection["templates"] = templates
+    put_connection(args, connection)
+    template.learned = False
+
+
+def drop_template(args, template):
+    """
+    Removes the template from the connection state.
+    """
+    connection = get_connection(args)
+    templates = connection.get("templates", {})
+    if templates.pop(template.operation_id, None) is not None:
+        connection["templates"] = templates
+        put_connection(args, connection)
@@ -0,0 +1,175 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+An instance of this class watches a single file and calls back when
+it changes.
+
+On Linux, inotify is used on the containing directory, so that editors
+and deploy tools which replace the file by renaming are also seen.
+Elsewhere, or if inotify is unavailable, the file is polled.
+"""
+from __future__ import print_function
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+
+EVENT_HEADER = struct.Struct("iIII")
+
+POLL_SECS = 1.0
+
+# Changes arriving within this time are treated as one.
+SETTLE_SECS = 0.1
+
+
+class Watcher(threading.Thread):
+    """
+    Daemon thread invoking callback() each time the file changes.
+    """
+
+    def __init__(self, path, callback, poll_secs=POLL_SECS):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.path = os.path.abspath(path)
+        self.callback = callback
+        self.poll_secs = poll_secs
+        self.stopped = threading.Event()
+        self.inotify_fd = inotify_watch(os.path.dirname(self.path))
+
+    def run(self):
+        """
+        Watches using inotify if available, otherwise polls.
+        """
+        if self.inotify_fd is None:
+            self.__poll()
+        else:
+            try:
+                self.__inotify()
+            finally:
+                os.close(self.inotify_fd)
+
+    def stop(self):
+        """
+        Stops watching within the poll interval.
+        """
+        self.stopped.set()
+
+    def __changed(self):
+        """
+        Waits for the change to settle, then calls back.
+        """
+        time.sleep(SETTLE_SECS)
+        if not self.stopped.is_set():
+            self.callback()
+
+    def __inotify(self):
+        """
+        Reads directory events, calling back for those naming the file.
+        """
+        name = os.path.basename(self.path).encode("utf-8")
+        while not self.stopped.is_set():
+            (readable, _, _) = select.select(
+                [self.inotify_fd], [], [], self.poll_secs)
+            if not readable:
+                continue
+
+            names = read_names(self.inotify_fd)
+            if name in names:
+                self.__changed()
+                # Drop events caused by the same change.
+                read_names(self.inotify_fd)
+
+    def __poll(self):
+        """
+        Compares the file stat on each interval.
+        """
+        previous = file_stamp(self.path)
+        while not self.stopped.wait(self.poll_secs):
+            current = file_stamp(self.path)
+            if current != previous:
+                previous = current
+                if current is not None:
+                    self.__changed()
+                    previous = file_stamp(self.path)
+
+
+def inotify_watch(directory):
+    """
+    Returns a non-blocking inotify file descriptor watching the
+    directory, or None if inotify is unavailable.
+    """
+    library = ctypes.util.find_library("c")
+    if not library:
+        return None
+
+    libc = ctypes.CDLL(library, use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        return None
+
+    inotify_fd = libc.inotify_init1(os.O_NONBLOCK)
+    if inotify_fd < 0:
+        return None
+
+    if libc.inotify_add_watch(
+            inotify_fd, directory.encode("utf-8"), IN_MASK) < 0:
+        os.close(inotify_fd)
+        return None
+
+    return inotify_fd
+
+
+def read_names(inotify_fd):
+    """
+    Reads all pending inotify events, returning the set of file names.
+    """
+    names = set()
+    while True:
+        try:
+            buf = os.read(inotify_fd, 4096)
+        except (IOError, OSError):
+            break
+        if not buf:
+            break
+
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(buf):
+            (_wd, _mask, _cookie, length) = EVENT_HEADER.unpack_from(
+                buf, offset)
+            offset += EVENT_HEADER.size
+            names.add(buf[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+    return names
+
+
+def file_stamp(path):
+    """
+    Returns the (mtime, size, inode) of the file, or None if missing.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size, stat.st_ino)
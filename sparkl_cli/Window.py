@@ -0,0 +1,128 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Rolling window of event counts and latencies over the last SECS
+seconds, used by the top command.
+
+The window is a ring of one-second slots held in flat arrays, one
+element per slot for the counts and one row of histogram buckets per
+slot for latencies, so that recording an event is a few array
+increments and memory does not grow with the event rate.
+"""
+from __future__ import print_function
+
+import bisect
+from array import (
+    array)
+
+from sparkl_cli.Metrics import (
+    BUCKETS,
+    Histogram)
+
+SECS = 10
+
+
+class Window(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Counts, errors and latency histogram over a rolling window.
+    """
+
+    def __init__(self, secs=SECS, bounds=BUCKETS):
+        self.secs = secs
+        self.bounds = bounds
+        self.width = len(bounds) + 1
+        self.counts = array("L", [0] * secs)
+        self.errors = array("L", [0] * secs)
+        self.buckets = array("L", [0] * (secs * self.width))
+        self.sums = array("d", [0.0] * secs)
+        self.maxes = array("d", [0.0] * secs)
+        self.second = None
+
+    def __slot(self, now):
+        """
+        Returns the slot index for time now, clearing any slots
+        skipped since the last call.
+        """
+        second = int(now)
+        if self.second is None:
+            self.second = second
+        elif second > self.second:
+            for skipped in range(
+                    self.second + 1,
+                    min(second, self.second + self.secs) + 1):
+                self.__clear(skipped % self.secs)
+            self.second = second
+        return second % self.secs
+
+    def __clear(self, slot):
+        """
+        Zeroes the slot.
+        """
+        self.counts[slot] = 0
+        self.errors[slot] = 0
+        self.sums[slot] = 0.0
+        self.maxes[slot] = 0.0
+        start = slot * self.width
+        for index in range(start, start + self.width):
+            self.buckets[index] = 0
+
+    def count(self, now, error=False):
+        """
+        Counts an event at time now, and an error if error is True.
+        """
+        slot = self.__slot(now)
+        self.counts[slot] += 1
+        if error:
+            self.errors[slot] += 1
+
+    def observe(self, now, value):
+        """
+        Records a latency in seconds at time now.
+        """
+        slot = self.__slot(now)
+        self.buckets[
+            slot * self.width + bisect.bisect_left(self.bounds, value)] += 1
+        self.sums[slot] += value
+        self.maxes[slot] = max(self.maxes[slot], value)
+
+    def rate(self, now):
+        """
+        Returns the events per second over the window.
+        """
+        self.__slot(now)
+        return sum(self.counts) / float(self.secs)
+
+    def error_rate(self, now):
+        """
+        Returns the fraction of events in the window that are errors.
+        """
+        self.__slot(now)
+        total = sum(self.counts)
+        return sum(self.errors) / float(total) if total else 0.0
+
+    def histogram(self, now):
+        """
+        Returns the latencies in the window merged into a Histogram.
+        """
+        self.__slot(now)
+        histogram = Histogram(self.bounds)
+        for slot in range(self.secs):
+            start = slot * self.width
+            for index in range(self.width):
+                histogram.buckets[index] += self.buckets[start + index]
+        histogram.count = sum(histogram.buckets)
+        histogram.sum = sum(self.sums)
+        histogram.max = max(self.maxes)
+        return histogram
@@ -17,6 +17,9 @@ List active services command implementation.
 """
 from __future__ import print_function
 
+from sparkl_cli import (
+    codec)
+
 from sparkl_cli.common import (
     get_object,
     sync_request)
@@ -49,7 +52,7 @@ def list_services(args):
     response = sync_request(
         args, "GET", "sse_svc/status/" + args.folder)
 
-    term = response.json()
+    term = codec.loads(response.content)
     if not term.get("tag") == "active":
         return term
 
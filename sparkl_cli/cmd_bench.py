@@ -0,0 +1,256 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Micro-benchmark command implementation.
+
+Each suite runs locally, without a SPARKL node:
+
+  codec
+    per-frame encode and decode cost of each installed JSON codec,
+    using typical svc_rest and listen frames.
+
+  notify
+    notify frames per second sent one at a time, as by Service.notify,
+    and batched, as with --batch-notify, over a local socket pair.
+"""
+from __future__ import print_function
+
+import socket
+import threading
+from timeit import default_timer
+
+import websocket
+
+from sparkl_cli.CliException import (
+    CliException)
+
+from sparkl_cli import (
+    codec)
+
+from sparkl_cli.Notifier import (
+    Notifier)
+
+# Typical frames: a svc_rest request, its reply, and a listen event.
+FRAMES = (
+    ("request", {
+        "request": "Mix/Test",
+        "id": "A4D9K2L0QZ",
+        "data": {
+            "n": 1000003,
+            "div": 17
+        }
+    }),
+    ("reply", {
+        "reply": "Mix/Test/Iterate",
+        "id": "A4D9K2L0QZ"
+    }),
+    ("event", {
+        "tag": "data_event",
+        "id": "C-E2-4V0Q-AAA",
+        "timestamp": 1530000000123,
+        "attr": {
+            "subject": "B-A2-9VX-6BC",
+            "name": "Test",
+            "txn": "C-E2-4V0Q-000",
+            "cause": ["C-E2-4V0Q-AA9"]
+        },
+        "content": [
+            {
+                "tag": "datum",
+                "attr": {
+                    "field": "B-A2-9VX-6BD",
+                    "name": "n"
+                },
+                "content": [1000003]
+            },
+            {
+                "tag": "datum",
+                "attr": {
+                    "field": "B-A2-9VX-6BE",
+                    "name": "div"
+                },
+                "content": [17]
+            }
+        ]
+    }))
+
+# Typical telemetry notify.
+NOTIFY = {
+    "notify": "Mix/Telemetry",
+    "data": {
+        "sensor": "B-A2-9VX-6BC",
+        "value": 21.5,
+        "unit": "C"
+    }
+}
+
+
+def parse_args(subparser):
+    """
+    Adds module-specific subcommand arguments.
+    """
+    subparser.add_argument(
+        "suite",
+        choices=sorted(SUITES),
+        help="benchmark suite to run")
+
+    subparser.add_argument(
+        "-n", "--count",
+        type=int,
+        default=20000,
+        help="iterations per measurement, default 20000")
+
+
+def per_call_us(fun, arg, count):
+    """
+    Returns the mean microseconds per call of fun(arg).
+    """
+    start = default_timer()
+    for _ in range(count):
+        fun(arg)
+    return round((default_timer() - start) * 1e6 / count, 3)
+
+
+def bench_codec(args):
+    """
+    Measures dumps and loads per frame for each installed codec.
+    """
+    content = []
+    for each in codec.available():
+        for (kind, frame) in FRAMES:
+            text = each.dumps(frame)
+            if each.loads(text) != frame:
+                raise CliException(
+                    "{Codec} round trip failed".format(Codec=each.name))
+
+            content.append({
+                "tag": "codec",
+                "attr": {
+                    "name": each.name,
+                    "frame": kind,
+                    "bytes": len(text),
+                    "dumps_us": per_call_us(each.dumps, frame, args.count),
+                    "loads_us": per_call_us(each.loads, text, args.count)
+                }
+            })
+
+    return {
+        "tag": "bench",
+        "attr": {
+            "suite": "codec",
+            "selected": codec.CODEC.name,
+            "count": args.count
+        },
+        "content": content
+    }
+
+
+def drained_websocket():
+    """
+    Returns a websocket client over one end of a local socket pair,
+    and the thread which reads and discards everything sent on it.
+    The thread result is the number of bytes read.
+    """
+    (client, server) = socket.socketpair()
+    ws = websocket.WebSocket()
+    ws.sock = client
+    ws.connected = True
+
+    def drain():
+        """
+        Reads until the client end closes.
+        """
+        while True:
+            data = server.recv(65536)
+            if not data:
+                break
+            drain.received += len(data)
+        server.close()
+
+    drain.received = 0
+    thread = threading.Thread(target=drain)
+    thread.daemon = True
+    thread.start()
+    return (ws, thread, drain)
+
+
+def bench_notify(args):
+    """
+    Measures notify frames per second, unbatched and batched.
+    """
+    def unbatched(websock):
+        """
+        One encode and one send per notify.
+        """
+        for _ in range(args.count):
+            websock.send(codec.dumps(NOTIFY))
+        return args.count
+
+    def batched(websock):
+        """
+        Notifies buffered and sent by the Notifier thread.
+        """
+        notifier = Notifier(websock)
+        notifier.start()
+        for _ in range(args.count):
+            notifier.notify(NOTIFY)
+        notifier.close()
+        notifier.join()
+        return notifier.batches
+
+    content = []
+    for (mode, fun) in (("unbatched", unbatched), ("batched", batched)):
+        (ws, thread, drain) = drained_websocket()
+        start = default_timer()
+        sends = fun(ws)
+        ws.sock.shutdown(socket.SHUT_WR)
+        thread.join()
+        elapsed = default_timer() - start
+        ws.sock.close()
+
+        content.append({
+            "tag": "notify",
+            "attr": {
+                "mode": mode,
+                "frames": args.count,
+                "sends": sends,
+                "bytes": drain.received,
+                "seconds": round(elapsed, 6),
+                "rate": round(args.count / elapsed, 1)
+            }
+        })
+
+    return {
+        "tag": "bench",
+        "attr": {
+            "suite": "notify",
+            "selected": codec.CODEC.name,
+            "count": args.count
+        },
+        "content": content
+    }
+
+
+SUITES = {
+    "codec": bench_codec,
+    "notify": bench_notify
+}
+
+
+def command(args):
+    """
+    Runs the benchmark suite and returns the measurements.
+    """
+    return SUITES[args.suite](args)
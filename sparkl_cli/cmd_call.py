@@ -20,26 +20,96 @@ we construct the event and data client-side.
 
 It would be very much easier to change sse_svc_dispatcher to
 support params!
+
+Use --output-dir to decode the binary values of the event received
+into files as it arrives, one per field named by field, instead of
+holding them. Each value is replaced by a file struct, see the upload
+module.
+
+The operation is compiled into a template on first call, kept in the
+connection state, so that later calls make only the one request. See
+the Template module. If a call with a cached template gets an error
+event, the template is compiled again, and the call made again only
+if the operation has changed.
+
+With --input, the operation is called once per line of a file or
+stdin, each line a JSON object of field values by name, such as:
+
+  {"n": 13, "div": 3}
+
+Fields missing from a line take their var values. The template is
+loaded or compiled once, and calls are made concurrently, each
+pool thread with its own session. One result is output per line, in
+input order unless --unordered is given, with attr.input giving the
+line number. Since a cached template is not checked for changes with
+--input, make a single call first after changing the operation. A call
+which cannot be made or fails gives:
+
+    {
+        "tag": "error",
+        "attr": {
+            "input": 12,
+            "reason": "Missing integer value: n"
+        }
+    }
 """
 from __future__ import print_function
 
 import os
 import sys
-import json
-import base64
+import threading
+from collections import (
+    deque)
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    wait)
+
+from sparkl_cli import (
+    codec,
+    upload)
 
 from sparkl_cli.CliException import (
     CliException)
 
+from sparkl_cli.Resolver import (
+    Resolver,
+    event_ids,
+    fetcher,
+    get_objects,
+    save_cache)
+
+from sparkl_cli.Scanner import (
+    Scanner)
+
+from sparkl_cli.Template import (
+    COERCE,
+    compile_template,
+    drop_template,
+    load_template,
+    save_template)
+
 from sparkl_cli.common import (
+    get_connection,
     get_current_folder,
     get_object,
+    new_session,
+    read_lines,
     resolve,
     sync_request)
 
 from sparkl_cli.cmd_vars import (
     get_vars)
 
+from sparkl_cli.upload import (
+    Base64File,
+    BinaryFile)
+
+CONCURRENCY = 8
+
+# Response bytes scanned at a time with --output-dir.
+RESPONSE_CHUNK_BYTES = 256 * 1024
+
 
 def parse_args(subparser):
     """
@@ -50,6 +120,33 @@ def parse_args(subparser):
         action="store_true",
         help="save result values as vars")
 
+    subparser.add_argument(
+        "-i", "--input",
+        type=str,
+        metavar="FILE",
+        help="call once per line of FILE, or stdin if -, each line "
+        "a JSON object of field values by name")
+
+    subparser.add_argument(
+        "-j", "--concurrency",
+        type=int,
+        default=CONCURRENCY,
+        help="most calls in progress with --input, default {Max}".format(
+            Max=CONCURRENCY))
+
+    subparser.add_argument(
+        "--unordered",
+        action="store_true",
+        help="output --input results as they complete instead of "
+        "in input order")
+
+    subparser.add_argument(
+        "-o", "--output-dir",
+        type=str,
+        metavar="DIR",
+        help="decode binary values received into files in DIR, "
+        "one per field named by field")
+
     subparser.add_argument(
         "operation",
         help="operation path or id")
@@ -62,16 +159,12 @@ def sparkl_type(field_type, string_value):
     left as string.
     """
     value = string_value
-    if field_type == "integer":
-        value = int(string_value)
-    elif field_type == "boolean":
-        value = bool(string_value)
-    elif field_type == "float":
-        value = float(string_value)
+    if field_type in COERCE:
+        value = COERCE[field_type](string_value)
     return value
 
 
-def vars_to_data(args, operation):
+def vars_to_data(args, template):
     """
     Builds the list of datum required by the operation event,
     built using the current var values.
@@ -83,18 +176,14 @@ def vars_to_data(args, operation):
     data = []
     can_dispatch = True
 
-    for field_id in operation["attr"]["fields"].split():
-        field = get_object(args, field_id)
-        field_type = field["attr"]["type"]
-        if field_type:
-            field_name = field["attr"]["name"]
-            field_value = vars_dict.get(field_name)
-            datum = var_to_datum(
-                field_id, field_name, field_type, field_value)
-            if datum:
-                data.append(datum)
-            else:
-                can_dispatch = False
+    for (field_id, field_name, field_type) in template.fields:
+        field_value = vars_dict.get(field_name)
+        datum = var_to_datum(
+            field_id, field_name, field_type, field_value)
+        if datum:
+            data.append(datum)
+        else:
+            can_dispatch = False
 
     return (can_dispatch, data)
 
@@ -130,12 +219,8 @@ def var_to_datum(field_id, field_name, field_type, field_value):
 
     if method == "read":
         if os.path.isfile(string_value) and field_type == "binary":
-            with open(string_value, "rb") as value_file:
-                string_value = base64.b64encode(
-                    value_file.read())
-
-                if sys.version_info[0] == 3:
-                    string_value = string_value.decode('utf-8')
+            # Base64 encoded as the request is sent, see upload module.
+            string_value = BinaryFile(string_value)
 
         elif os.path.isfile(string_value):
             with open(string_value, "r") as value_file:
@@ -157,30 +242,241 @@ def var_to_datum(field_id, field_name, field_type, field_value):
     return datum
 
 
-def simplify(args, data_event):
+def get_template(args, path):
     """
-    Returns a struct corresponding to the data event with ids
-    resolved to names.
+    Returns the pair (template, cached) for the operation path, where
+    cached is True if the template was already in the connection state.
+    Otherwise the template is compiled and saved.
     """
-    result = {
-        "tag": None,
-        "attr": {},
-        "content": []
-    }
+    template = load_template(args, path)
+    if template:
+        return (template, True)
+
+    operation = get_object(args, path)
+    if not operation:
+        raise CliException(
+            "No operation {Operation}".format(
+                Operation=path))
+
+    template = compile_template(args, operation, path)
+    save_template(args, template)
+    return (template, False)
+
+
+def dispatch(args, template, data, session=None, output_dir=None):
+    """
+    Sends the data event for the operation, returning the event
+    received. With an output_dir, binary values received are decoded
+    into files there.
+    """
+    outbound_event = upload.body({
+        "tag": "data_event",
+        "attr": {
+            "subject": template.operation_id
+        },
+        "content": data})
+
+    response = sync_request(
+        args, "POST", "sse_svc_dispatcher/" + template.tag,
+        headers={
+            "Content-Type": "application/json"},
+        data=outbound_event,
+        timeout=0,
+        session=session,
+        stream=bool(output_dir))
+
+    if not output_dir:
+        return codec.loads(response.content)
+
+    return scan(args, template, response, output_dir)
+
+
+def scan(args, template, response, output_dir):
+    """
+    Returns the event received, scanned as it arrives, with each
+    binary value decoded into a file in the output directory.
+    """
+    used = set()
+
+    def sink_for(field_id):
+        """
+        Returns the file sink for a binary field value, or None.
+        """
+        (_tag, name, field_type) = template.lookup(
+            field_id,
+            lambda object_id: get_objects(args, [object_id]).get(object_id))
+        if field_type != "binary" or not name:
+            return None
+
+        filename = os.path.basename(name)
+        count = 1
+        while filename in used:
+            count += 1
+            filename = "{Name}-{Count}".format(
+                Name=os.path.basename(name),
+                Count=count)
+        used.add(filename)
+        return Base64File(os.path.join(output_dir, filename))
+
+    scanner = Scanner(sink_for)
+    for chunk in response.iter_content(RESPONSE_CHUNK_BYTES):
+        scanner.feed(chunk)
+    return scanner.close()
+
+
+def run_calls(inputs, call, concurrency=CONCURRENCY, ordered=True):
+    """
+    Generator that applies the call function to each (index, values)
+    of inputs on a pool of threads, yielding each result in input
+    order, or in completion order if ordered is False.
+
+    At most twice concurrency inputs are read ahead of the results.
+    """
+    pool = ThreadPoolExecutor(concurrency)
+    limit = 2 * concurrency
+    pending = deque() if ordered else set()
+    try:
+        for item in inputs:
+            future = pool.submit(call, *item)
+            if ordered:
+                pending.append(future)
+                while len(pending) >= limit:
+                    yield pending.popleft().result()
+            else:
+                pending.add(future)
+                while len(pending) >= limit:
+                    (done, pending) = wait(
+                        pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+
+        while pending:
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                (done, pending) = wait(
+                    pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    # Calls not yet started are cancelled if the generator is closed.
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+
+def read_inputs(path):
+    """
+    Generates (line number, values) for each non-blank line of the
+    file, or stdin if path is -. Values are None on a line which is
+    not JSON.
+    """
+    for (index, line) in enumerate(read_lines(path), 1):
+        if line.isspace():
+            continue
+        try:
+            yield (index, codec.loads(line))
+        except ValueError:
+            yield (index, None)
+
+
+def bulk(args, template):
+    """
+    Generator that calls the operation once per line of args.input,
+    yielding the results, see the module notes.
+    """
+    vars_dict = get_vars(args)
+    local = threading.local()
+    resolver = Resolver(
+        fetcher(args), get_connection(args).get("cache"))
+
+    def default(field_id, field_name, field_type):
+        """
+        Returns the datum from the var value, if any.
+        """
+        field_value = vars_dict.get(field_name)
+        if field_value:
+            return var_to_datum(field_id, field_name, field_type, field_value)
+        return None
+
+    def call(index, values):
+        """
+        Makes one call, returning its result or error.
+        """
+        try:
+            data = template.data(values, default)
+            if not hasattr(local, "session"):
+                local.session = new_session(args)
+            result = dispatch(args, template, data, local.session)
+            if result.get("tag") == "data_event":
+                wait(resolver.prefetch(
+                    template.unknown(event_ids(result))))
+                result = template.simplify(result, resolver.lookup)
+
+        except Exception as exc:  # pylint: disable=broad-except
+            result = {
+                "tag": "error",
+                "attr": {
+                    "reason": str(exc)
+                }
+            }
+
+        if isinstance(result, dict):
+            result.setdefault("attr", {})["input"] = index
+        return result
+
+    try:
+        for result in run_calls(
+                read_inputs(args.input), call,
+                args.concurrency, not args.unordered):
+            yield result
+
+    # Keyboard interrupt stops the generator.
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        resolver.close()
+        save_cache(args, resolver)
+        if template.learned:
+            save_template(args, template)
+
+
+def recompile(args, template):
+    """
+    Compiles the template again from its path. Returns the new
+    template if the operation or its fields have changed, otherwise
+    None.
+    """
+    operation = get_object(args, template.struct["path"])
+    if not operation:
+        drop_template(args, template)
+        return None
+
+    fresh = compile_template(args, operation, template.struct["path"])
+    if (fresh.operation_id, fresh.fields) == \
+            (template.operation_id, template.fields):
+        return None
+
+    drop_template(args, template)
+    save_template(args, fresh)
+    return fresh
 
-    subject = get_object(
-        args, data_event["attr"]["subject"])
-    result["tag"] = subject["tag"]
-    result["attr"]["id"] = data_event["attr"]["subject"]
-    result["attr"]["name"] = subject["attr"]["name"]
 
-    for datum in data_event.get("content", []):
-        field = get_object(args, datum["attr"]["field"])
-        datum["attr"]["type"] = field["attr"]["type"]
-        datum["attr"]["name"] = field["attr"]["name"]
-        result["content"].append(datum)
+def call_vars(args, template):
+    """
+    Calls the operation with the var values, returning the event
+    received.
+    """
+    (can_dispatch, data) = vars_to_data(args, template)
+
+    if not can_dispatch:
+        raise CliException(
+            "Cannot dispatch {Operation}".format(
+                Operation=args.operation))
 
-    return result
+    return dispatch(args, template, data, output_dir=args.output_dir)
 
 
 def command(args):
@@ -191,44 +487,42 @@ def command(args):
     be executed.
     In the case of a request or consume, the individual operation
     is executed.
+
+    With --input, returns a generator of the result of each call,
+    see the module notes.
     """
     pathname = resolve(
         get_current_folder(args), args.operation)
 
-    operation = get_object(args, pathname)
-    if not operation:
-        raise CliException(
-            "No operation {Operation}".format(
-                Operation=args.operation))
-
-    tag = operation["tag"]
-    subject = operation["attr"]["id"]
+    (template, cached) = get_template(args, pathname)
 
-    (can_dispatch, data) = vars_to_data(args, operation)
+    if args.output_dir:
+        if args.input:
+            raise CliException("Cannot use --output-dir with --input")
+        if not os.path.isdir(args.output_dir):
+            os.makedirs(args.output_dir)
 
-    if not can_dispatch:
-        raise CliException(
-            "Cannot dispatch {Operation}".format(
-                Operation=args.operation))
-
-    outbound_event = json.dumps({
-        "tag": "data_event",
-        "attr": {
-            "subject": subject
-        },
-        "content": data})
+    if args.input:
+        if args.concurrency < 1:
+            raise CliException("Concurrency must be at least 1")
+        return bulk(args, template)
 
-    response = sync_request(
-        args, "POST", "sse_svc_dispatcher/" + tag,
-        headers={
-            "Content-Type": "application/json"},
-        data=outbound_event,
-        timeout=0)
+    return_event = call_vars(args, template)
 
-    return_event = response.json()
+    # The operation may have changed since the template was cached,
+    # in which case the call never reached it and is made again.
+    if cached and return_event.get("tag") == "error":
+        fresh = recompile(args, template)
+        if fresh:
+            template = fresh
+            return_event = call_vars(args, template)
 
     if return_event.get("tag") == "data_event":
-        result = simplify(args, return_event)
+        objects = get_objects(
+            args, template.unknown(event_ids(return_event)))
+        result = template.simplify(return_event, objects.get)
+        if template.learned:
+            save_template(args, template)
         return result
 
     return return_event
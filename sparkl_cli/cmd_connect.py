@@ -19,6 +19,9 @@ from __future__ import print_function
 
 import os
 
+from sparkl_cli import (
+    codec)
+
 from sparkl_cli.CliException import (
     CliException)
 
@@ -173,10 +176,10 @@ def new_connection(args):
         args, "GET", "sse/ping")
 
     if response:
-        node = response.json()["attr"]["node"]
+        node = codec.loads(response.content)["attr"]["node"]
         connection["node"] = node
         set_state(args, state)
-        return response.json()
+        return codec.loads(response.content)
 
     connections.pop(args.alias, None)
     set_state(args, state)
@@ -14,17 +14,69 @@ See the License for the specific language governing permissions and
 limitations under the License.
 
 Listen command implementation.
+
+Events can be filtered and projected before output, see the Filter
+module. For example, to show only the n field of Test operation
+events where n is over 100:
+
+    sparkl listen Scratch/Primes --name Test \\
+        --where "field.n>100" --select field.n
+
+If the node closes the websocket, for example on restart, listen
+reconnects with backoff and outputs a listen_gap event giving the
+outage window. Use --no-reconnect to stop instead.
+
+Use --sample to keep a fraction of transactions, whole, and
+--max-rate to bound the events per second. While events are dropped
+a listen_dropped event gives the counts, see the Sampler module.
+
+Websockets are compressed with permessage-deflate where the node
+supports it, unless the global --no-compress option is given. Use
+--bytes to output a listen_bytes event when listen stops, giving the
+bytes received on the wire and once inflated.
+
+Use --resolve to add the names of the subject and fields to each
+event, see the Resolver module.
+
+Use --journal DIR to append events to a compressed, indexed journal
+instead of the output, see the Journal module and `sparkl replay`.
+Gap events are both journalled and output.
 """
 from __future__ import print_function
 
-import json
+
+from sparkl_cli.Filter import (
+    Filter)
+
+from sparkl_cli.Journal import (
+    Journal)
+
+from sparkl_cli.Resolver import (
+    Resolver,
+    fetcher,
+    resolving,
+    save_cache)
+
+from sparkl_cli.Sampler import (
+    Sampler)
+
+from sparkl_cli.Subscription import (
+    BACKOFF_SECS,
+    GAP_TAG,
+    MAX_BACKOFF_SECS,
+    Waker,
+    byte_counts,
+    multiplex,
+    open_all)
+
+from sparkl_cli.CliException import (
+    CliException)
 
 from sparkl_cli.common import (
+    get_connection,
     get_current_folder,
-    get_websocket,
-    resolve)
-
-PATH_PREFIX = "sse_listen/websocket/"
+    resolve,
+    websocket_options)
 
 
 def parse_args(subparser):
@@ -34,36 +86,264 @@ def parse_args(subparser):
     subparser.add_argument(
         "subject",
         type=str,
-        nargs='?',
-        default='.',
-        help="path or id of configuration object. By default: /")
+        nargs="*",
+        default=["."],
+        help="paths or ids of configuration objects. By default: /")
+
+    subparser.add_argument(
+        "--tag",
+        type=str,
+        action="append",
+        help="only events with this tag, e.g. error (repeatable)")
 
+    subparser.add_argument(
+        "--name",
+        type=str,
+        action="append",
+        help="only events with this attr name, e.g. operation name "
+        "(repeatable)")
+
+    subparser.add_argument(
+        "--subject-id",
+        type=str,
+        action="append",
+        help="only events with this attr subject id (repeatable)")
+
+    subparser.add_argument(
+        "--where",
+        type=str,
+        action="append",
+        metavar="EXPR",
+        help="only events matching PATH OP VALUE, where OP is one of "
+        "= != < <= > >= ~ (repeatable)")
+
+    subparser.add_argument(
+        "--select",
+        type=str,
+        action="append",
+        metavar="PATH",
+        help="output only these paths of each event (repeatable)")
+
+    subparser.add_argument(
+        "--sample",
+        type=float,
+        metavar="RATE",
+        help="keep this fraction of transactions, 0 to 1, choosing "
+        "by transaction id so each is kept or dropped whole")
+
+    subparser.add_argument(
+        "--max-rate",
+        type=rate_per_sec,
+        metavar="N/s",
+        help="output at most this many events per second, dropping "
+        "the excess")
+
+    subparser.add_argument(
+        "--bytes",
+        action="store_true",
+        help="when stopped, output the bytes received on the wire "
+        "and once inflated")
+
+    subparser.add_argument(
+        "--resolve",
+        action="store_true",
+        help="add subject and field names to the output events, "
+        "fetching unknown ids in the background")
+
+    subparser.add_argument(
+        "-j", "--journal",
+        type=str,
+        metavar="DIR",
+        help="append events to the journal in this directory "
+        "instead of output")
+
+    subparser.add_argument(
+        "--retain-days",
+        type=float,
+        default=7,
+        help="delete journal segments older than this, default 7")
 
-def listener(connected_ws):
+    subparser.add_argument(
+        "--no-reconnect",
+        action="store_true",
+        help="stop when the node closes a subscription, instead of "
+        "reconnecting and reporting the gap")
+
+    subparser.add_argument(
+        "--backoff",
+        type=float,
+        default=BACKOFF_SECS,
+        metavar="SECS",
+        help="first reconnect delay, doubled on each failed attempt, "
+        "default {Secs}".format(Secs=BACKOFF_SECS))
+
+    subparser.add_argument(
+        "--max-backoff",
+        type=float,
+        default=MAX_BACKOFF_SECS,
+        metavar="SECS",
+        help="longest reconnect delay, default {Secs}".format(
+            Secs=MAX_BACKOFF_SECS))
+
+
+def rate_per_sec(text):
+    """
+    Returns the events per second given as N or N/s.
+    """
+    if text.endswith("/s"):
+        text = text[:-len("/s")]
+    return float(text)
+
+
+def listener(  # pylint: disable=too-many-positional-arguments
+        subscriptions, event_filter=None, reconnect=True,
+        journal=None, sampler=None, waker=None, count_bytes=False):
     """
     Generator that yields the structured data received on the opened
-    websocket.
+    subscriptions.
+
+    If an event filter is given, only matching events are yielded,
+    projected by the filter.
+
+    With more than one subscription, each event is tagged with the
+    subject path in its listen attribute.
+
+    If reconnect is True, a subscription which closes is reopened
+    with backoff without stopping the others, and the gap marker is
+    yielded once it reopens, see the Subscription module. Otherwise
+    the generator ends when any subscription closes.
+
+    If a sampler is given, only the events it admits are kept, and
+    its drop markers are yielded as they fall due and at the end.
+
+    If count_bytes is True, the bytes received on the wire and once
+    inflated are yielded at the end, see Subscription.byte_counts.
+
+    If a journal is given, events are appended to it instead of
+    being yielded. Gap and drop markers are both journalled and
+    yielded. The journal is closed when the generator ends.
+
+    If a waker is given, waking it ends the generator as a keyboard
+    interrupt does, for when it runs on another thread.
     """
+    multiple = len(subscriptions) > 1
+    prefilter = event_filter.prefilter if event_filter else None
+    dropped = None
     try:
-        for message in connected_ws:
-            term = json.loads(message)
-            yield term
+        for (subscription, term) in multiplex(
+                subscriptions, reconnect, prefilter, waker):
+            if isinstance(term, dict) and term.get("tag") == GAP_TAG:
+                if journal:
+                    journal.append(term)
+                yield term
+                continue
+
+            if event_filter and not event_filter.match(term):
+                continue
 
-    # Socket close or keyboard interrupt stop the generator.
-    except BaseException:
+            if sampler:
+                dropped = sampler.report()
+                if dropped:
+                    if journal:
+                        journal.append(dropped)
+                    yield dropped
+                if not sampler.admit(term):
+                    continue
+
+            if event_filter:
+                term = event_filter.project(term)
+
+            if multiple and isinstance(term, dict):
+                term.setdefault("attr", {})["listen"] = subscription.path
+
+            if journal:
+                journal.append(term)
+            else:
+                yield term
+
+    # Keyboard interrupt stops the generator.
+    except KeyboardInterrupt:
         pass
 
+    finally:
+        if sampler:
+            dropped = sampler.report(force=True)
+        if journal:
+            if dropped:
+                journal.append(dropped)
+            journal.close()
+
+    if dropped:
+        yield dropped
+
+    received = byte_counts(subscriptions) if count_bytes else None
+    if received:
+        yield received
+
+
+def resolved(args, source, waker):
+    """
+    Generator that yields the events of the listener source with ids
+    resolved, saving the objects fetched to the connection cache at
+    the end.
+
+    The source runs on its own thread, so on keyboard interrupt it is
+    ended through the waker, and its final markers still yielded.
+    """
+    resolver = Resolver(
+        fetcher(args), get_connection(args).get("cache"))
+    try:
+        for term in resolving(source, resolver, interrupt=waker.wake):
+            yield term
+    finally:
+        save_cache(args, resolver)
+        waker.close()
+
 
 def command(args):
     """
-    Opens a websocket listening to the configuration subject, and
+    Opens a websocket listening to each configuration subject, and
     returns a generator that yields the structured data received
-    on the websocket.
+    on the websockets, merged in arrival order.
     """
-    path = resolve(
-        get_current_folder(args), args.subject)
+    subjects = args.subject
+    if isinstance(subjects, str):
+        subjects = [subjects]
+
+    folder = get_current_folder(args)
+    options = websocket_options(args)
+
+    event_filter = Filter(
+        tags=args.tag,
+        names=args.name,
+        subject_ids=args.subject_id,
+        wheres=args.where,
+        selects=args.select)
+
+    sampler = None
+    if args.sample is not None or args.max_rate is not None:
+        if args.sample is not None and not 0.0 <= args.sample <= 1.0:
+            raise CliException(
+                "The sample rate must be from 0 to 1")
+        if args.max_rate is not None and args.max_rate <= 0:
+            raise CliException(
+                "The max rate must be more than 0")
+        sampler = Sampler(args.sample, args.max_rate)
+
+    journal = None
+    if args.journal:
+        journal = Journal(args.journal, args.retain_days)
+
+    # Options are checked before any subscription is opened.
+    subscriptions = open_all(
+        options, [resolve(folder, subject) for subject in subjects],
+        args.backoff, args.max_backoff)
+
+    waker = Waker() if args.resolve else None
+    events = listener(
+        subscriptions, event_filter or None, not args.no_reconnect,
+        journal, sampler, waker, args.bytes)
 
-    ws_path = PATH_PREFIX + path
-    ws = get_websocket(args, ws_path)
-    generator = listener(ws)
-    return generator
+    if args.resolve:
+        return resolved(args, events, waker)
+    return events
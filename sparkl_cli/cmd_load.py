@@ -0,0 +1,228 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Load generator command implementation.
+
+Starts a local stand-in svc_rest server, connects the implementation
+module to it as a Service and drives one of its operations at the
+given concurrency and rate, with no SPARKL node or network needed:
+
+  sparkl load test_rest Mix/FirstDivisor -d '{"n": 13}' -n 10000 -c 16
+
+If no reply frees a slot within the --wait seconds, the run stops
+early and the report has stalled set, with the number actually sent.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import threading
+import time
+from timeit import default_timer
+
+from sparkl_cli.CliException import (
+    CliException)
+
+from sparkl_cli.Metrics import (
+    percentile)
+
+from sparkl_cli.StandIn import (
+    StandIn)
+
+from sparkl_cli import (
+    cmd_close,
+    cmd_connect,
+    cmd_service)
+
+LOAD_ALIAS = "load_standin_"
+
+
+def parse_args(subparser):
+    """
+    Adds module-specific subcommand arguments.
+    """
+    subparser.add_argument(
+        "module",
+        type=str,
+        help="python module, or name of module (see --path)")
+
+    subparser.add_argument(
+        "operation",
+        type=str,
+        help="request or consume operation path, e.g. Mix/Test")
+
+    subparser.add_argument(
+        "-p", "--path",
+        type=str,
+        default=".",
+        help="path to python module directory, default is '.'")
+
+    subparser.add_argument(
+        "-k", "--kind",
+        choices=("request", "consume"),
+        default="request",
+        help="kind of event sent, default is request")
+
+    subparser.add_argument(
+        "-d", "--data",
+        type=str,
+        default="{}",
+        help="JSON object of event field values, default is {}")
+
+    subparser.add_argument(
+        "-n", "--count",
+        type=int,
+        default=1000,
+        help="number of events to send, default is 1000")
+
+    subparser.add_argument(
+        "-c", "--concurrency",
+        type=int,
+        default=1,
+        help="maximum events awaiting reply, default is 1")
+
+    subparser.add_argument(
+        "-r", "--rate",
+        type=float,
+        default=0,
+        help="events per second, default 0 means as fast as possible")
+
+    subparser.add_argument(
+        "-w", "--wait",
+        type=float,
+        default=10,
+        help="seconds to wait for outstanding replies, and for a free "
+        "slot before stopping as stalled, default is 10")
+
+
+def drive(standin, service, args, data):
+    """
+    Sends args.count events, keeping at most args.concurrency awaiting
+    reply and pacing them at args.rate if set.
+
+    If no slot frees within args.wait seconds, the service is taken
+    to have stalled and no more events are sent.
+
+    Returns the 3-tuple of elapsed seconds, the number of events sent
+    and the sorted list of latencies in seconds, one per reply
+    received.
+    """
+    send = standin.request if args.kind == "request" else standin.consume
+    slots = threading.BoundedSemaphore(args.concurrency)
+    latencies = []
+    done = threading.Event()
+    interval = 1.0 / args.rate if args.rate else 0
+
+    def replied(sent):
+        """
+        Returns the reply callback for an event sent at the given time.
+        """
+        def callback(_reply):
+            """
+            Closure records the latency and frees the slot.
+            """
+            latencies.append(default_timer() - sent)
+            slots.release()
+            if len(latencies) == args.count:
+                done.set()
+        return callback
+
+    start = default_timer()
+    sent = 0
+    for index in range(args.count):
+        if not slots.acquire(timeout=args.wait):
+            break
+        if interval:
+            delay = start + index * interval - default_timer()
+            if delay > 0:
+                time.sleep(delay)
+
+        send(service, args.operation, data,
+             replied(default_timer()))
+        sent += 1
+
+    if sent == args.count:
+        done.wait(args.wait)
+    elapsed = default_timer() - start
+    return (elapsed, sent, sorted(latencies))
+
+
+def sub_args(args, submodule, argv, alias):
+    """
+    Returns the args namespace for another command module, parsed from
+    argv with that module's defaults and using the given alias.
+    """
+    parser = argparse.ArgumentParser()
+    submodule.parse_args(parser)
+    sub = parser.parse_args(argv)
+    sub.session = args.session
+    sub.timeout = args.timeout
+    sub.alias = alias
+    return sub
+
+
+def command(args):
+    """
+    Drives the operation of the implementation module through a local
+    stand-in svc_rest server, and returns the throughput and latency
+    report including the service metrics.
+    """
+    try:
+        data = json.loads(args.data)
+    except ValueError:
+        raise CliException("--data must be a JSON object")
+
+    standin = StandIn().start()
+    alias = LOAD_ALIAS + str(standin.server_address[1])
+    service_path = "standin/" + args.module
+    close_args = sub_args(args, cmd_close, [], alias)
+
+    cmd_connect.command(
+        sub_args(args, cmd_connect, [standin.url], alias))
+    service = None
+    try:
+        service = cmd_service.command(
+            sub_args(args, cmd_service,
+                     [service_path, args.module, "--path", args.path],
+                     alias))
+        if not standin.wait_session(service_path):
+            raise CliException("Service did not connect to stand-in")
+
+        (elapsed, sent, latencies) = drive(
+            standin, service_path, args, data)
+
+    finally:
+        if service:
+            service.close()
+        cmd_close.command(close_args)
+        standin.close()
+
+    replied = len(latencies)
+    return {
+        "tag": "load",
+        "attr": {
+            "operation": args.operation,
+            "sent": sent,
+            "replied": replied,
+            "stalled": sent < args.count,
+            "concurrency": args.concurrency,
+            "seconds": round(elapsed, 6),
+            "rate": round(replied / elapsed, 1) if elapsed else 0.0,
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else 0.0
+        },
+        "content": service.snapshot()["content"]
+    }
@@ -19,6 +19,9 @@ from __future__ import print_function
 
 import getpass
 
+from sparkl_cli import (
+    codec)
+
 from sparkl_cli.CliException import (
     CliException)
 
@@ -77,7 +80,7 @@ def login(args):
         data=data)
 
     if response:
-        return response.json()
+        return codec.loads(response.content)
 
     raise CliException(
         "Failed to login {User}".format(
@@ -108,7 +111,7 @@ def register(args):
         data=data)
 
     if response:
-        return response.json()
+        return codec.loads(response.content)
 
     raise CliException(
         "Failed to register {User}".format(
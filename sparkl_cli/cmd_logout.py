@@ -17,6 +17,9 @@ Logout command implementation.
 """
 from __future__ import print_function
 
+from sparkl_cli import (
+    codec)
+
 from sparkl_cli.common import (
     del_current_folder,
     sync_request)
@@ -38,4 +41,4 @@ def command(args):
     response = sync_request(
         args, "POST", "sse_cfg/signout")
 
-    return response.json()
+    return codec.loads(response.content)
@@ -17,6 +17,9 @@ List command implementation.
 """
 from __future__ import print_function
 
+from sparkl_cli import (
+    codec)
+
 from sparkl_cli.CliException import (
     CliException)
 
@@ -69,7 +72,7 @@ def command(args):
     response = sync_request(
         args, "GET", "sse_cfg/content/" + path)
 
-    content = response.json().get("content", [])
+    content = codec.loads(response.content).get("content", [])
     result["attr"]["count"] = len(content)
 
     for item in content:
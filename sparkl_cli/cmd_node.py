@@ -17,6 +17,9 @@ Node information implementation.
 """
 from __future__ import print_function
 
+from sparkl_cli import (
+    codec)
+
 from sparkl_cli.common import (
     get_connection,
     sync_request)
@@ -53,4 +56,4 @@ def command(args):
         args, "GET", "sse/info",
         params={"node": node})
 
-    return response.json()
+    return codec.loads(response.content)
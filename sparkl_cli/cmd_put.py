@@ -22,6 +22,9 @@ import re
 import requests
 
 
+from sparkl_cli import (
+    codec)
+
 from sparkl_cli.common import (
     get_current_folder,
     mktemp_pathname,
@@ -89,7 +92,7 @@ def command(args):
                     "Content-Type": "application/xml"},
                 data=upload_content)
 
-            return response.json()
+            return codec.loads(response.content)
 
     finally:
         if to_delete:
@@ -0,0 +1,148 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Replay command implementation, reads events from a journal written
+by `sparkl listen --journal DIR`.
+
+Only the journal blocks that can hold matching events are read, using
+the journal index. See the Journal module.
+"""
+from __future__ import print_function
+
+import datetime
+import os
+import re
+
+from sparkl_cli.CliException import (
+    CliException)
+
+from sparkl_cli.Journal import (
+    replay)
+
+from sparkl_cli import (
+    cmd_elastic)
+
+# ISO 8601 forms accepted for --from and --to, without a zone meaning
+# local time.
+TIME_FORMATS = (
+    "%Y-%m-%dT%H:%M:%S.%f%z",
+    "%Y-%m-%dT%H:%M:%S%z",
+    "%Y-%m-%dT%H:%M%z",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M",
+    "%Y-%m-%d")
+
+ZONE = re.compile(r"Z$|([+-]\d\d):(\d\d)$")
+
+
+def parse_args(subparser):
+    """
+    Adds module-specific subcommand arguments.
+    """
+    subparser.add_argument(
+        "journal",
+        type=str,
+        help="journal directory")
+
+    subparser.add_argument(
+        "--from",
+        type=str,
+        dest="from_time",
+        metavar="TIME",
+        help="earliest event time, as epoch milliseconds or ISO 8601 "
+        "such as 2018-06-26T10:00:00 (local time unless an offset is given)")
+
+    subparser.add_argument(
+        "--to",
+        type=str,
+        dest="to_time",
+        metavar="TIME",
+        help="latest event time, as for --from")
+
+    subparser.add_argument(
+        "--txn",
+        type=str,
+        help="only events with this transaction, event or cause id")
+
+    subparser.add_argument(
+        "-e", "--elastic",
+        type=str,
+        metavar="URL",
+        help="push events to this Elasticsearch url instead of output")
+
+    subparser.add_argument(
+        "-i", "--index",
+        type=str,
+        default="sparkl",
+        help="elasticsearch index, default 'sparkl'")
+
+    subparser.add_argument(
+        "-b", "--bulk",
+        type=int,
+        help="use elasticsearch bulk API, specify documents per chunk")
+
+
+def epoch_ms(text):
+    """
+    Returns the epoch milliseconds given by the text, or None.
+    """
+    if text is None:
+        return None
+
+    if text.isdigit():
+        return int(text)
+
+    # Offsets as +HHMM for strptime %z, which before Python 3.7 takes
+    # neither Z nor a colon.
+    iso = ZONE.sub(
+        lambda match: "+0000" if match.group() == "Z" else
+        match.group(1) + match.group(2),
+        text.strip().replace(" ", "T", 1))
+    for form in TIME_FORMATS:
+        try:
+            when = datetime.datetime.strptime(iso, form)
+            break
+        except ValueError:
+            pass
+    else:
+        raise CliException(
+            "Bad time {Time}, use epoch ms or ISO 8601".format(
+                Time=text))
+    return int(when.timestamp() * 1000)
+
+
+def command(args):
+    """
+    Returns a generator of the journalled events in the time range and
+    transaction. With --elastic, pushes them to Elasticsearch instead
+    and returns the elastic result.
+    """
+    if not os.path.isdir(args.journal):
+        raise CliException(
+            "No journal directory {Dir}".format(
+                Dir=args.journal))
+
+    events = replay(
+        args.journal,
+        from_ms=epoch_ms(args.from_time),
+        to_ms=epoch_ms(args.to_time),
+        txn=args.txn)
+
+    if args.elastic:
+        args.url = args.elastic
+        return cmd_elastic.push(args, events)
+
+    return events
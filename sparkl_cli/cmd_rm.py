@@ -22,6 +22,9 @@ from __future__ import print_function
 
 import posixpath
 
+from sparkl_cli import (
+    codec)
+
 from sparkl_cli.common import (
     get_current_folder,
     resolve,
@@ -62,4 +65,4 @@ def command(args):
             "Content-Type": "application/xml"},
         data=change)
 
-    return response.json()
+    return codec.loads(response.content)
@@ -31,15 +31,58 @@ all optional:
     onclose(service)
         This is called back when the service object closes,
         from the worker thread.
+
+    key(event)
+        This returns the dispatch key of a request or consume event.
+        With --workers, events sharing a key are handled in arrival
+        order and other events concurrently. The default key is the
+        transaction id, or the event id if there is none.
+
+Use --record to capture the websocket traffic to a file, and
+--replay to feed a capture into the module without a network.
+Solicits made in replay are answered with the captured responses, see
+the Capture module.
+
+Use --deadline to send a timeout reply for handlers which do not reply
+in time. The module can set service.deadlines in onopen to give
+deadlines for specific operations, for example:
+
+    service.deadlines = {
+        "Mix/Slow": 30.0}
+
+Use --slow to log handlers taking longer than the given seconds.
+
+Use --batch-notify to buffer high-rate notifies for a few milliseconds
+and send them in batches, see Notifier. Buffered notifies are sent
+when the service closes. Solicits and replies are sent at once, so
+they can reach the node before notifies sent earlier.
+
+Use --watch to reload the module whenever its file changes. The new
+module onopen callback is invoked without reconnecting.
+
+Use --manifest to host many services in one process. Each line of the
+manifest gives a service path and module name separated by spaces,
+for example:
+
+    # Service path              Module
+    Scratch/Mix/Stock/REST      stock_impl
+    Scratch/Mix/Order/REST      order_impl
+
+Blank lines and lines starting with # are ignored. The services share
+one reader thread and a pool of --workers threads, default 8, see
+ServiceHost.
+The main callback of a hosted module is not invoked.
 """
 from __future__ import print_function
 
+import copy
 import sys
 import importlib
 import types
 
 from sparkl_cli.CliException import CliException
 from sparkl_cli.Service import Service
+from sparkl_cli.ServiceHost import ServiceHost
 
 
 def parse_args(subparser):
@@ -49,19 +92,92 @@ def parse_args(subparser):
     subparser.add_argument(
         "service",
         type=str,
+        nargs="?",
         help="path or id of rest service")
 
     subparser.add_argument(
         "module",
         type=str,
+        nargs="?",
         help="python module, or name of module (see --path)")
 
+    subparser.add_argument(
+        "--manifest",
+        type=str,
+        metavar="FILE",
+        help="host every service and module listed in this file")
+
+    subparser.add_argument(
+        "--workers",
+        type=int,
+        help="handle events concurrently on this many threads, "
+        "in order for each dispatch key")
+
+    subparser.add_argument(
+        "--reconnect",
+        type=float,
+        metavar="SECS",
+        help="reopen a --manifest service this long after it closes")
+
     subparser.add_argument(
         "-p", "--path",
         type=str,
         default=".",
         help="path to python module directory, default is '.'")
 
+    subparser.add_argument(
+        "-m", "--metrics",
+        type=int,
+        metavar="PORT",
+        help="serve Prometheus metrics on this local HTTP port")
+
+    subparser.add_argument(
+        "-w", "--watch",
+        action="store_true",
+        help="reload the module when its file changes")
+
+    subparser.add_argument(
+        "-d", "--deadline",
+        type=float,
+        metavar="SECS",
+        help="send the timeout reply if a handler has not replied in time")
+
+    subparser.add_argument(
+        "--timeout-reply",
+        type=str,
+        default="Timeout",
+        metavar="NAME",
+        help="reply name sent when a deadline passes, default 'Timeout'")
+
+    subparser.add_argument(
+        "--slow",
+        type=float,
+        metavar="SECS",
+        help="log handlers taking longer than this to stderr")
+
+    subparser.add_argument(
+        "--batch-notify",
+        type=float,
+        metavar="MS",
+        help="buffer notifies for this many milliseconds, send in batches")
+
+    subparser.add_argument(
+        "-r", "--record",
+        type=str,
+        metavar="CAPTURE",
+        help="record all websocket frames to this capture file")
+
+    subparser.add_argument(
+        "--replay",
+        type=str,
+        metavar="CAPTURE",
+        help="replay captured requests and consumes without a network")
+
+    subparser.add_argument(
+        "--max-speed",
+        action="store_true",
+        help="replay as fast as possible instead of at original pace")
+
 
 def command(args):
     """
@@ -69,18 +185,118 @@ def command(args):
     specified implementation module. This can provide any of the
     callback functions main/1, onopen/1 and onclose/1 where the argument
     in all cases is the service instance.
+
+    With --replay, waits for the replay to finish and returns the
+    handler throughput and latency report.
+
+    With --manifest, returns the ServiceHost running every listed
+    service instead.
     """
-    if isinstance(args.module, str):
-        sys.path.append(args.path)
-        module = importlib.import_module(args.module)
-    elif isinstance(args.module, types.ModuleType):
-        module = args.module
-    else:
-        raise CliException("module must be module object or module name")
+    if args.manifest:
+        return host_manifest(args)
 
+    if not args.service or not args.module:
+        raise CliException(
+            "service and module are required without --manifest")
+
+    module = load_module(args, args.module)
     service = Service(args, module)
 
     if hasattr(module, "main"):
         module.main(service)
 
+    if args.replay:
+        service.join()
+        return replay_report(args, service)
+
     return service
+
+
+def load_module(args, module):
+    """
+    Returns the module, importing it from the --path directory if
+    given by name.
+    """
+    if isinstance(module, str):
+        if args.path not in sys.path:
+            sys.path.append(args.path)
+        return importlib.import_module(module)
+
+    if isinstance(module, types.ModuleType):
+        return module
+
+    raise CliException("module must be module object or module name")
+
+
+def read_manifest(path):
+    """
+    Returns the list of (service, module name) pairs in the manifest.
+    """
+    entries = []
+    with open(path) as manifest:
+        for (number, line) in enumerate(manifest, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            fields = line.split()
+            if len(fields) != 2:
+                raise CliException(
+                    "{Path}:{Line}: expected service and module".format(
+                        Path=path,
+                        Line=number))
+            entries.append(tuple(fields))
+
+    return entries
+
+
+def host_manifest(args):
+    """
+    Starts a host and opens every service in the manifest on it.
+    If any service fails to open, those already open are closed.
+    """
+    if args.record or args.replay:
+        raise CliException(
+            "--record and --replay are not supported with --manifest")
+
+    entries = read_manifest(args.manifest)
+    if not entries:
+        raise CliException(
+            "No services in {Path}".format(
+                Path=args.manifest))
+
+    host = ServiceHost(args)
+    host.start()
+    try:
+        for (service, module) in entries:
+            service_args = copy.copy(args)
+            service_args.service = service
+            Service(service_args, load_module(args, module), host)
+    except BaseException:
+        host.close()
+        raise
+
+    return host
+
+
+def replay_report(args, service):
+    """
+    Returns the replay event counts and throughput, with the per
+    operation metrics as content.
+    """
+    replay = service.ws
+    rate = replay.received / replay.elapsed if replay.elapsed else 0.0
+
+    return {
+        "tag": "replay",
+        "attr": {
+            "capture": args.replay,
+            "events": replay.received,
+            "replies": replay.sent,
+            "solicits": replay.solicits,
+            "defaulted": replay.defaulted,
+            "seconds": round(replay.elapsed, 6),
+            "rate": round(rate, 1)
+        },
+        "content": service.snapshot()["content"]
+    }
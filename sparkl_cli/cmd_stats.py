@@ -0,0 +1,154 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Stats command implementation.
+
+Reads listen events as JSON terms, one per line, from a file or stdin,
+such as the output of:
+
+  sparkl --format ndjson listen Scratch/Primes > events.ndjson
+
+and outputs request to reply and solicit to response latency
+percentiles by operation and by service. Start and end events are
+paired by cause id, see the Correlator module. Pairing is an id lookup
+done as the lines stream past, rather than a join over columns, so
+only the durations are held, in one array per group.
+
+Lines which cannot hold a start or end event tag are skipped without
+being decoded.
+"""
+from __future__ import print_function
+
+from sparkl_cli import (
+    codec,
+    event)
+
+from sparkl_cli.Correlator import (
+    MAX_PENDING,
+    PAIRS,
+    Correlator)
+
+from sparkl_cli.LatencyTable import (
+    LatencyTable)
+
+from sparkl_cli.common import (
+    read_lines)
+
+# Quoted tags, one of which any start or end line must contain.
+NEEDLES = tuple(
+    ('"' + tag + '"').encode("utf-8")
+    for tag in sorted(set(PAIRS) | set(PAIRS.values())))
+
+
+def parse_args(subparser):
+    """
+    Adds module-specific subcommand arguments.
+    """
+    subparser.add_argument(
+        "file",
+        type=str,
+        nargs="?",
+        default="-",
+        help="file of JSON events, one per line. By default: stdin")
+
+    subparser.add_argument(
+        "--stream",
+        action="store_true",
+        help="estimate percentiles from histograms in constant memory "
+        "instead of keeping every duration")
+
+    subparser.add_argument(
+        "--max-pending",
+        type=int,
+        default=MAX_PENDING,
+        help="most start events awaiting their end, default {Max}".format(
+            Max=MAX_PENDING))
+
+
+def is_candidate(line):
+    """
+    Returns True if the raw line can hold a start or end event.
+    """
+    for needle in NEEDLES:
+        if needle in line:
+            return True
+    return False
+
+
+def collect(lines, correlator, operations, services):
+    """
+    Pairs the events on the lines, adding each duration to the
+    operations and services tables. Returns the number of events read.
+    """
+    count = 0
+    for line in lines:
+        if not is_candidate(line):
+            continue
+
+        try:
+            term = codec.loads(line)
+        except ValueError:
+            continue
+
+        count += 1
+        paired = correlator.feed(term)
+        if not paired:
+            continue
+
+        (kind, start, secs) = paired
+        if secs is None:
+            continue
+
+        operations.add(kind, str(event.name(start)), secs)
+        service = event.service(start)
+        if service is not None:
+            services.add(kind, str(service), secs)
+
+    return count
+
+
+def command(args):
+    """
+    Reads JSON listen events and returns the latency percentiles, in
+    milliseconds, of request to reply and solicit to response by
+    operation and by service.
+    """
+    correlator = Correlator(args.max_pending)
+    operations = LatencyTable(args.stream)
+    services = LatencyTable(args.stream)
+
+    try:
+        count = collect(
+            read_lines(args.file), correlator, operations, services)
+    except KeyboardInterrupt:
+        count = None
+
+    return {
+        "tag": "stats",
+        "attr": {
+            "events": count,
+            "unmatched": correlator.unmatched + len(correlator.pending)
+        },
+        "content": [
+            {
+                "tag": "operations",
+                "content": operations.rows()
+            },
+            {
+                "tag": "services",
+                "content": services.rows()
+            }
+        ]
+    }
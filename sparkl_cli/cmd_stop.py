@@ -17,6 +17,9 @@ Service stop command implementation.
 """
 from __future__ import print_function
 
+from sparkl_cli import (
+    codec)
+
 from sparkl_cli.common import (
     get_current_folder,
     resolve,
@@ -44,4 +47,4 @@ def command(args):
     response = sync_request(
         args, "POST", "sse_svc/stop/" + path)
 
-    return response.json()
+    return codec.loads(response.content)
@@ -0,0 +1,156 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Top command implementation.
+
+Listens to the subjects and displays a live table of per-operation
+event rate, error rate and request to reply latency over a rolling
+window, see the Dashboard module. Press q to quit.
+"""
+from __future__ import print_function
+
+import sys
+import threading
+from timeit import default_timer
+
+from sparkl_cli.CliException import (
+    CliException)
+
+from sparkl_cli.Dashboard import (
+    Dashboard,
+    render)
+
+from sparkl_cli.Subscription import (
+    open_all)
+
+from sparkl_cli.Window import (
+    SECS)
+
+from sparkl_cli.cmd_listen import (
+    listener)
+
+from sparkl_cli.common import (
+    get_current_folder,
+    resolve,
+    websocket_options)
+
+try:
+    import curses
+except ImportError:
+    curses = None
+
+
+def parse_args(subparser):
+    """
+    Adds module-specific subcommand arguments.
+    """
+    subparser.add_argument(
+        "subject",
+        type=str,
+        nargs="*",
+        default=["."],
+        help="paths or ids of configuration objects. By default: /")
+
+    subparser.add_argument(
+        "-n", "--interval",
+        type=float,
+        default=1.0,
+        metavar="SECS",
+        help="redraw interval, default 1")
+
+    subparser.add_argument(
+        "-w", "--window",
+        type=int,
+        default=SECS,
+        metavar="SECS",
+        help="rolling window length, default {Secs}".format(
+            Secs=SECS))
+
+
+def feed(source, dashboard, stop):
+    """
+    Feeds the events of the listen generator into the dashboard until
+    stopped.
+    """
+    for term in source:
+        dashboard.feed(term, default_timer())
+        if stop.is_set():
+            break
+    source.close()
+
+
+def display(screen, dashboard, interval):
+    """
+    Redraws the dashboard every interval until q is pressed.
+    """
+    curses.curs_set(0)
+    screen.timeout(0)
+    due = default_timer()
+    while True:
+        lines = render(dashboard.snapshot(default_timer()))
+        (height, width) = screen.getmaxyx()
+        screen.erase()
+        for (row, line) in enumerate(lines[:height - 1]):
+            screen.addnstr(row, 0, line, width - 1)
+        screen.addnstr(height - 1, 0, "q to quit", width - 1)
+        screen.refresh()
+
+        due += interval
+        screen.timeout(max(0, int((due - default_timer()) * 1000)))
+        if screen.getch() in (ord("q"), ord("Q")):
+            return
+
+
+def command(args):
+    """
+    Listens to each configuration subject and displays live
+    per-operation throughput, error rate and latency, redrawn at a
+    fixed interval. Returns the last snapshot on quit.
+    """
+    if args.window <= 0:
+        raise CliException(
+            "The window must be more than 0 seconds")
+    if curses is None:
+        raise CliException(
+            "The top command needs the curses module")
+    if not sys.stdout.isatty():
+        raise CliException(
+            "The top command needs a terminal, use listen instead")
+
+    subjects = args.subject
+    if isinstance(subjects, str):
+        subjects = [subjects]
+
+    folder = get_current_folder(args)
+    options = websocket_options(args)
+    subscriptions = open_all(
+        options, [resolve(folder, subject) for subject in subjects])
+
+    dashboard = Dashboard(args.window)
+    stop = threading.Event()
+    feeder = threading.Thread(
+        target=feed,
+        args=(listener(subscriptions), dashboard, stop))
+    feeder.daemon = True
+    feeder.start()
+
+    try:
+        curses.wrapper(display, dashboard, args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+
+    return dashboard.snapshot(default_timer())
@@ -0,0 +1,215 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Transaction assembly command implementation.
+
+This reads listen events, either live from the given subjects or as
+JSON terms from stdin, such as:
+
+  sparkl --format ndjson replay journal | sparkl txn --event-time
+
+and outputs each transaction as a tree of events once it completes,
+goes idle or times out. See the Assembler module.
+"""
+from __future__ import print_function
+
+import queue
+from timeit import default_timer
+
+from sparkl_cli import (
+    event)
+
+from sparkl_cli.Assembler import (
+    Assembler)
+
+from sparkl_cli.Filter import (
+    Filter)
+
+from sparkl_cli.Subscription import (
+    GAP_TAG,
+    open_all)
+
+from sparkl_cli.cmd_listen import (
+    listener)
+
+from sparkl_cli.common import (
+    END,
+    get_current_folder,
+    read_ahead,
+    read_terms,
+    resolve,
+    websocket_options)
+
+# Events read ahead of assembly.
+QUEUE_EVENTS = 10000
+
+
+def parse_args(subparser):
+    """
+    Adds module-specific subcommand arguments.
+    """
+    subparser.add_argument(
+        "subject",
+        type=str,
+        nargs="*",
+        help="paths or ids of configuration objects to listen to. "
+        "By default, events are read from stdin")
+
+    subparser.add_argument(
+        "--end",
+        type=str,
+        action="append",
+        metavar="EXPR",
+        help="a transaction is complete on an event matching "
+        "PATH OP VALUE, as for listen --where (repeatable, all must "
+        "match)")
+
+    subparser.add_argument(
+        "--idle",
+        type=float,
+        default=5.0,
+        metavar="SECS",
+        help="emit a transaction after no events for this long, "
+        "default 5")
+
+    subparser.add_argument(
+        "--max-secs",
+        type=float,
+        default=60.0,
+        metavar="SECS",
+        help="emit a transaction open for this long, default 60")
+
+    subparser.add_argument(
+        "--max-txns",
+        type=int,
+        default=10000,
+        help="evict the least recently active transaction beyond "
+        "this many open, default 10000")
+
+    subparser.add_argument(
+        "--max-events",
+        type=int,
+        default=1000000,
+        help="evict the least recently active transaction beyond "
+        "this many events held, default 1000000")
+
+    subparser.add_argument(
+        "--event-time",
+        action="store_true",
+        help="measure idle and open time by event timestamps "
+        "instead of arrival, for replayed input")
+
+    subparser.add_argument(
+        "--stats",
+        action="store_true",
+        help="output the counts by status at the end of input")
+
+
+def assemble(source, assembler, event_time=False, stats=False):
+    """
+    Generator that yields each transaction assembled from the events
+    of the source generator, as it is emitted.
+
+    The source is read on its own thread, so that transactions are
+    expired on time while no events arrive. With event_time, time
+    moves only with the event timestamps instead.
+
+    On keyboard interrupt, the transactions still open are emitted
+    with status eof, as at the end of input.
+    """
+    (terms, stop) = read_ahead(source, QUEUE_EVENTS)
+
+    clock = 0.0
+    try:
+        try:
+            while True:
+                timeout = None
+                expiry = assembler.next_expiry()
+                if expiry is not None and not event_time:
+                    timeout = max(0.0, expiry - default_timer())
+
+                try:
+                    term = terms.get(timeout=timeout)
+                except queue.Empty:
+                    for txn in assembler.expire(default_timer()):
+                        yield txn
+                    continue
+
+                if term is END:
+                    break
+                if isinstance(term, Exception):
+                    raise term
+
+                if isinstance(term, dict) and term.get("tag") == GAP_TAG:
+                    yield term
+                    continue
+
+                if event_time:
+                    stamp = event.timestamp(term)
+                    if stamp is not None:
+                        clock = max(clock, stamp / 1000.0)
+                else:
+                    clock = default_timer()
+
+                for txn in assembler.add(term, clock):
+                    yield txn
+
+        # Keyboard interrupt ends the input, and the transactions
+        # still open are emitted as at its end.
+        except KeyboardInterrupt:
+            pass
+
+        for txn in assembler.drain():
+            yield txn
+
+        if stats:
+            yield assembler.stats()
+
+    finally:
+        stop.set()
+
+
+def command(args):
+    """
+    Assembles listen events into transactions, reading live from the
+    subjects if given, otherwise JSON terms from stdin. Returns a
+    generator that yields each transaction tree when it completes,
+    goes idle, times out or is evicted.
+    """
+    subjects = args.subject
+    if isinstance(subjects, str):
+        subjects = [subjects]
+
+    if subjects:
+        folder = get_current_folder(args)
+        options = websocket_options(args)
+        subscriptions = open_all(
+            options, [resolve(folder, subject) for subject in subjects])
+        source = listener(subscriptions)
+    else:
+        source = read_terms()
+
+    end = None
+    if args.end:
+        end = Filter(wheres=args.end).match
+
+    assembler = Assembler(
+        idle_secs=args.idle,
+        timeout_secs=args.max_secs,
+        max_txns=args.max_txns,
+        max_events=args.max_events,
+        end=end)
+
+    return assemble(source, assembler, args.event_time, args.stats)
@@ -20,6 +20,9 @@ the undo was successful.
 """
 from __future__ import print_function
 
+from sparkl_cli import (
+    codec)
+
 from sparkl_cli.common import (
     sync_request)
 
@@ -40,4 +43,4 @@ def command(args):
     response = sync_request(
         args, "DELETE", "sse_cfg/change")
 
-    return response.json()
+    return codec.loads(response.content)
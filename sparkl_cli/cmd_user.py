@@ -17,6 +17,9 @@ Show user command implementation.
 """
 from __future__ import print_function
 
+from sparkl_cli import (
+    codec)
+
 from sparkl_cli.common import (
     sync_request)
 
@@ -34,4 +37,4 @@ def command(args):
     response = sync_request(
         args, "GET", "sse_cfg/user")
 
-    return response.json()
+    return codec.loads(response.content)
@@ -0,0 +1,199 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+JSON codec used on the hot encode and decode paths: websocket
+frames, stdin terms and HTTP response bodies.
+
+The fastest installed implementation is chosen from, in order:
+
+    ujson, simdjson, json
+
+where json is the standard library fallback. Set the SPARKL_JSON
+env var to one of these names, or to orjson, to choose a specific
+implementation.
+
+orjson is never chosen by default, since it is lossy: it decodes
+integers too big for 64 bits as floats, and encodes NaN as null.
+SPARKL integers have arbitrary precision, so only choose orjson if
+your data is known to carry neither.
+
+Use the module-level dumps and loads functions, which are replaced
+by select(). The dumps function always returns a str, and loads
+accepts str or bytes.
+"""
+from __future__ import print_function
+
+import importlib
+import json
+import os
+
+from sparkl_cli.CliException import (
+    CliException)
+
+# Codecs chosen by default, in order of preference.
+CANDIDATES = ("ujson", "simdjson", "json")
+
+# Lossy codecs, used only if chosen by name.
+OPT_IN = ("orjson",)
+
+ENV_VAR = "SPARKL_JSON"
+
+
+class Codec(object):  # pylint: disable=too-few-public-methods
+    """
+    A named pair of dumps and loads functions.
+    """
+
+    def __init__(self, name, dumps_fun, loads_fun):
+        self.name = name
+        self.dumps = dumps_fun
+        self.loads = loads_fun
+
+    def __str__(self):
+        return "Codec <" + self.name + ">"
+
+
+def stdlib_codec():
+    """
+    Returns the standard library codec.
+    """
+    return Codec("json", json.dumps, json.loads)
+
+
+def orjson_codec(orjson):
+    """
+    Returns the orjson codec. Since orjson only handles str keys
+    and 64-bit integers, other terms fall back to the standard library.
+    """
+    orjson_dumps = orjson.dumps
+
+    def dumps_fun(term):
+        """
+        Encodes to str.
+        """
+        try:
+            return orjson_dumps(term).decode("utf-8")
+        except TypeError:
+            return json.dumps(term)
+
+    return Codec("orjson", dumps_fun, orjson.loads)
+
+
+def ujson_codec(ujson):
+    """
+    Returns the ujson codec.
+    """
+    def dumps_fun(term):
+        """
+        Encodes to str, falling back for terms ujson rejects.
+        """
+        try:
+            return ujson.dumps(term, ensure_ascii=False)
+        except (TypeError, OverflowError):
+            return json.dumps(term)
+
+    return Codec("ujson", dumps_fun, ujson.loads)
+
+
+def simdjson_codec(simdjson):
+    """
+    Returns the simdjson codec, which only accelerates decoding.
+    Integers too big for 64 bits fall back to the standard library.
+    Depending on the pysimdjson version, these raise RuntimeError or
+    ValueError, and malformed text raises ValueError again from json.
+    """
+    simdjson_loads = simdjson.loads
+
+    def loads_fun(text):
+        """
+        Decodes str or bytes.
+        """
+        try:
+            return simdjson_loads(text)
+        except (RuntimeError, ValueError):
+            return json.loads(text)
+
+    return Codec("simdjson", json.dumps, loads_fun)
+
+
+FACTORIES = {
+    "orjson": orjson_codec,
+    "ujson": ujson_codec,
+    "simdjson": simdjson_codec
+}
+
+
+def load_codec(name):
+    """
+    Returns the named codec, or None if its module is not installed.
+    """
+    if name == "json":
+        return stdlib_codec()
+
+    if name not in FACTORIES:
+        raise CliException(
+            "Unknown JSON codec {Name}, choose from {Names}".format(
+                Name=name,
+                Names=", ".join(CANDIDATES + OPT_IN)))
+
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        return None
+
+    return FACTORIES[name](module)
+
+
+def available():
+    """
+    Returns the list of installed codecs in order of preference,
+    followed by any installed opt-in codecs.
+    """
+    codecs = []
+    for name in CANDIDATES + OPT_IN:
+        codec = load_codec(name)
+        if codec:
+            codecs.append(codec)
+    return codecs
+
+
+def select(name=None):
+    """
+    Selects the named codec, or the first installed default if name
+    is None, as the module dumps and loads functions. Returns the codec.
+    """
+    # pylint: disable=global-statement
+    global CODEC, dumps, loads
+
+    if name:
+        codec = load_codec(name)
+        if not codec:
+            raise CliException(
+                "JSON codec {Name} is not installed".format(
+                    Name=name))
+    else:
+        codec = [
+            each for each in available() if each.name in CANDIDATES][0]
+
+    CODEC = codec
+    dumps = codec.dumps
+    loads = codec.loads
+    return codec
+
+
+CODEC = None
+dumps = json.dumps  # pylint: disable=invalid-name
+loads = json.loads  # pylint: disable=invalid-name
+select(os.environ.get(ENV_VAR))
@@ -24,8 +24,10 @@ import time
 import shutil
 import json
 import posixpath
+import queue
 import subprocess
 import tempfile
+import threading
 import ssl
 from http.cookiejar import LWPCookieJar
 import websocket
@@ -37,9 +39,15 @@ from requests.utils import dict_from_cookiejar
 
 import urllib3
 
+from sparkl_cli import (
+    codec)
+
 from sparkl_cli.CliException import (
     CliException)
 
+from sparkl_cli.Deflate import (
+    DeflateWebSocket)
+
 SESSION_COOKIE = "ipaas_session"
 STATE_FILE = "state.json"
 RETRY_BACK_OFF_SECS = 0.1
@@ -48,6 +56,12 @@ MAX_TRIES = 5
 ANSI_TAG = "\033[1m"
 ANSI_END = "\033[0m"
 
+# Tags are shown without ANSI escapes on Windows.
+WINDOWS = platform.system() == "Windows"
+
+# Marks the end of the terms on a read_ahead queue.
+END = object()
+
 
 def get_default_session():
     """
@@ -99,7 +113,7 @@ def get_object(args, object_id):
         args, "GET", "sse_cfg/object/" + object_id)
 
     if response:
-        sparkl_object = response.json()
+        sparkl_object = codec.loads(response.content)
         object_id = sparkl_object["attr"].get("id")
         if object_id:
             connection_cache[object_id] = sparkl_object
@@ -291,11 +305,21 @@ def sync_request(
         data=None,
         accept="json",
         headers=None,
-        timeout=0):
+        timeout=0,
+        session=None,
+        stream=False):
     """
     Makes a request on the specified connection, using
     the connection session state including session cookies.
 
+    If a session from new_session is given, it is used instead of
+    a new one, and the cookies are not saved. This suits many
+    requests from one command, made on one or more threads each
+    with its own session.
+
+    If stream is True, the response content is read only as it is
+    iterated, such as by response.iter_content.
+
     Method can be 'GET' or 'POST' upper or lower case.
     Href is relative to the base url, e.g. 'sse_cfg/user'.
     Params is a dict, or None.
@@ -320,8 +344,9 @@ def sync_request(
     if timeout == 0:
         timeout = None
 
-    session = requests.Session()
-    session.cookies = unpickle_cookies(args)
+    owned = session is None
+    if owned:
+        session = new_session(args)
 
     base = connection.get("url")
     secure = connection.get("secure")
@@ -351,7 +376,8 @@ def sync_request(
             params=params,
             timeout=timeout,
             verify=verify,
-            cert=client)
+            cert=client,
+            stream=stream)
 
     elif method.upper() == "POST":
         response = session.post(
@@ -361,7 +387,8 @@ def sync_request(
             data=data,
             timeout=timeout,
             verify=verify,
-            cert=client)
+            cert=client,
+            stream=stream)
 
     elif method.upper() == "DELETE":
         response = session.delete(
@@ -370,12 +397,23 @@ def sync_request(
             params=params,
             timeout=timeout,
             verify=verify,
-            cert=client)
+            cert=client,
+            stream=stream)
 
-    pickle_cookies(session.cookies)
+    if owned:
+        pickle_cookies(session.cookies)
     return response
 
 
+def new_session(args):
+    """
+    Returns a requests session holding the connection cookies.
+    """
+    session = requests.Session()
+    session.cookies = unpickle_cookies(args)
+    return session
+
+
 def get_current_folder(args):
     """
     Convenience function returns the full path of the
@@ -443,6 +481,17 @@ def get_websocket(args, ws_path):
     path. The websocket functionality is annoyingly in
     a completely separate library from requests.
     """
+    return open_websocket(
+        websocket_options(args), ws_path)
+
+
+def websocket_options(args):
+    """
+    Returns the dict of scheme, netloc, cookie, sslopt and compress
+    needed to open websockets on the current connection. This reads
+    the state and cookies once, for use by any number of
+    open_websocket calls.
+    """
     connection = get_connection(args)
 
     http_url = connection.get("url")
@@ -456,7 +505,6 @@ def get_websocket(args, ws_path):
     if secure:
         ws_scheme = "wss"
 
-    ws_url = urlunparse((ws_scheme, netloc, ws_path, "", "", ""))
     cookies = unpickle_cookies(args)
     cookiedict = dict_from_cookiejar(cookies)
 
@@ -483,11 +531,57 @@ def get_websocket(args, ws_path):
         "ca_certs": ca_certs
     }
 
-    ws = websocket.WebSocket(sslopt=sslopt)
-    ws.connect(ws_url, cookie=cookie)
+    return {
+        "scheme": ws_scheme,
+        "netloc": netloc,
+        "cookie": cookie,
+        "sslopt": sslopt,
+        "compress": not getattr(args, "no_compress", False)
+    }
+
+
+def open_websocket(options, ws_path):
+    """
+    Returns a websocket client connected to the path using the
+    options from websocket_options. The websocket uses
+    permessage-deflate compression if the node accepts it, unless
+    compress is False, see the Deflate module.
+    """
+    ws_url = urlunparse(
+        (options["scheme"], options["netloc"], ws_path, "", "", ""))
+
+    ws = DeflateWebSocket(
+        compress=options.get("compress", True),
+        sslopt=options["sslopt"])
+    ws.connect(ws_url, cookie=options["cookie"])
     return ws
 
 
+def read_messages(websock):
+    """
+    Returns the list of data messages already received on a websocket
+    which a selector reports readable, answering pings on the way.
+
+    Raises WebSocketException when the websocket is closed by the
+    other end.
+    """
+    messages = []
+    while True:
+        (opcode, frame) = websock.recv_data_frame(True)
+        if opcode in (websocket.ABNF.OPCODE_TEXT,
+                      websocket.ABNF.OPCODE_BINARY):
+            messages.append(frame.data)
+        elif opcode == websocket.ABNF.OPCODE_CLOSE:
+            raise websocket.WebSocketConnectionClosedException(
+                "Closed by node")
+
+        # TLS sockets can hold decrypted frames that the
+        # selector does not see.
+        pending = getattr(websock.sock, "pending", None)
+        if not pending or not pending():
+            return messages
+
+
 def show_struct(json_object, indent=0):
     """
     Renders line-based display of json struct content
@@ -513,7 +607,7 @@ def show_struct(json_object, indent=0):
             print()
 
         tag = json_object["tag"]
-        if platform.system() == "Windows":
+        if WINDOWS:
             indent_print(tag)
         else:
             indent_print(ANSI_TAG + tag + ANSI_END)
@@ -548,25 +642,30 @@ def show_struct(json_object, indent=0):
 
 def read_terms():
     """
-    Generates successive terms, one per line on stdin.
+    Generates successive terms, one per line on stdin, such as
+    the output of `sparkl --format ndjson`.
     Non-JSON lines are printed but do not yield a result.
 
     The readline() function buffers line input better than
     the 'for line in sys.stdin:' pattern which seems to rely
-    on some input bufsize.
+    on some input bufsize. Lines are read as bytes where possible,
+    since the codec decodes bytes without a separate utf-8 pass.
     """
+    stdin = getattr(sys.stdin, "buffer", sys.stdin)
     line = None
     while True:
         try:
-            line = sys.stdin.readline()
+            line = stdin.readline()
             if not line:
                 break
 
             if not line.isspace():
-                term = json.loads(line)
+                term = codec.loads(line)
                 yield term
 
         except ValueError:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8", "replace")
             print(
                 "Cannot read JSON term:\n""~~~~\n"
                 "{Line}\n"
@@ -577,6 +676,64 @@ def read_terms():
             break
 
 
+def read_lines(path):
+    """
+    Generates the lines of the file, or stdin if path is -, as bytes.
+    """
+    if path == "-":
+        stdin = getattr(sys.stdin, "buffer", sys.stdin)
+        for line in stdin:
+            yield line
+        return
+
+    try:
+        with open(path, "rb") as lines:
+            for line in lines:
+                yield line
+    except IOError as exc:
+        raise CliException(
+            "Cannot read {Path}: {Error}".format(
+                Path=path,
+                Error=exc))
+
+
+def read_ahead(source, size):
+    """
+    Starts a thread reading the source generator into a queue of the
+    size, so that the consumer can wait on the queue with a timeout.
+    Returns the pair (queue, stop event). Once the stop event is set,
+    the source is closed after its next term.
+
+    The queue holds each term, then END or the exception raised by
+    the source.
+    """
+    terms = queue.Queue(size)
+    stop = threading.Event()
+    reader = threading.Thread(
+        target=feed_queue,
+        args=(source, terms, stop))
+    reader.daemon = True
+    reader.start()
+    return (terms, stop)
+
+
+def feed_queue(source, terms, stop):
+    """
+    Puts each term of the source generator on the queue, then END,
+    or the exception raised by the source.
+    """
+    try:
+        for term in source:
+            terms.put(term)
+            if stop.is_set():
+                source.close()
+                return
+        terms.put(END)
+
+    except Exception as exc:  # pylint: disable=broad-except
+        terms.put(exc)
+
+
 def get_source(args, src_path):
     """
     Gets the XML source from SPARKL and saves it in the
@@ -0,0 +1,107 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Accessors for the correlation properties of listen events, such as:
+
+    {
+        "tag": "data_event",
+        "id": "C-E2-4V0Q-AAA",
+        "timestamp": 1530000000123,
+        "attr": {
+            "subject": "B-A2-9VX-6BC",
+            "name": "Test",
+            "service": "Sequencer",
+            "txn": "C-E2-4V0Q-000",
+            "cause": ["C-E2-4V0Q-AA9"]
+        },
+        "content": [...]
+    }
+
+Each property is looked up at the top level first, then in attr, so
+both forms of event are handled.
+"""
+from __future__ import print_function
+
+
+def get(event, key, default=None):
+    """
+    Returns the event property at the top level or in attr.
+    """
+    if not isinstance(event, dict):
+        return default
+
+    value = event.get(key)
+    if value is None:
+        attr = event.get("attr")
+        if isinstance(attr, dict):
+            value = attr.get(key)
+
+    return default if value is None else value
+
+
+def event_id(event):
+    """
+    Returns the event id, or None.
+    """
+    return get(event, "id")
+
+
+def timestamp(event):
+    """
+    Returns the event timestamp in epoch milliseconds, or None.
+    """
+    value = get(event, "timestamp")
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def txn(event):
+    """
+    Returns the transaction id, or None.
+    """
+    return get(event, "txn")
+
+
+def causes(event):
+    """
+    Returns the list of ids of the events which caused this one.
+    """
+    value = get(event, "cause", [])
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def subject(event):
+    """
+    Returns the id of the configuration object that emitted the event.
+    """
+    return get(event, "subject")
+
+
+def name(event):
+    """
+    Returns the name of the operation or message, or None.
+    """
+    return get(event, "name")
+
+
+def service(event):
+    """
+    Returns the name of the service of the operation, or None.
+    """
+    return get(event, "service")
@@ -38,20 +38,25 @@ import pkg_resources
 
 from sparkl_cli.common import (
     get_default_session,
-    garbage_collect,
-    show_struct)
+    garbage_collect)
+
+from sparkl_cli.Output import (
+    FORMATS,
+    Output)
 
 from sparkl_cli.CliException import (
     CliException)
 
 from sparkl_cli import (
     cmd_active,
+    cmd_bench,
     cmd_call,
     cmd_cd,
     cmd_close,
     cmd_connect,
     cmd_elastic,
     cmd_listen,
+    cmd_load,
     cmd_login,
     cmd_logout,
     cmd_ls,
@@ -60,13 +65,17 @@ from sparkl_cli import (
     cmd_object,
     cmd_put,
     cmd_render,
+    cmd_replay,
     cmd_rm,
     cmd_service,
     cmd_session,
     cmd_source,
     cmd_start,
+    cmd_stats,
     cmd_stop,
+    cmd_top,
     cmd_tree,
+    cmd_txn,
     cmd_undo,
     cmd_user,
     cmd_vars)
@@ -76,6 +85,9 @@ MODULES = (
     ("active", cmd_active,
      "list active services"),
 
+    ("bench", cmd_bench,
+     "run local micro-benchmarks"),
+
     ("call", cmd_call,
      "invoke a transaction or individual operation"),
 
@@ -94,6 +106,9 @@ MODULES = (
     ("listen", cmd_listen,
      "listen for events on any configuration object"),
 
+    ("load", cmd_load,
+     "drive a service module through a local stand-in node"),
+
     ("login", cmd_login,
      "login or register user"),
 
@@ -118,6 +133,9 @@ MODULES = (
     ("render", cmd_render,
      "transform source configuration or local file into html"),
 
+    ("replay", cmd_replay,
+     "read events from a listen journal"),
+
     ("rm", cmd_rm,
      "remove object"),
 
@@ -133,12 +151,21 @@ MODULES = (
     ("start", cmd_start,
      "start a service"),
 
+    ("stats", cmd_stats,
+     "latency percentiles from a file of listen events"),
+
     ("stop", cmd_stop,
      "stop one or more services"),
 
+    ("top", cmd_top,
+     "live per-operation event rates and latency"),
+
     ("tree", cmd_tree,
      "show source in tree-like format"),
 
+    ("txn", cmd_txn,
+     "assemble listen events into transactions"),
+
     ("undo", cmd_undo,
      "undo last change"),
 
@@ -204,6 +231,18 @@ def build_parser():
         default=0,
         help="request timeout in seconds, default 0 means no timeout")
 
+    parser.add_argument(
+        "--no-compress",
+        action="store_true",
+        help="do not offer permessage-deflate compression on websockets")
+
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="text",
+        help="output format, default text. Use ndjson to pipe into "
+        "commands reading JSON terms, such as elastic")
+
     subparsers = parser.add_subparsers()
 
     for (cmd, submodule, help_text) in MODULES:
@@ -261,22 +300,23 @@ def main():
 
     garbage_collect()
 
+    output = Output(args.format)
     try:
         result = args.fun(args)
 
         if isinstance(result, types.GeneratorType):
             for chunk in result:
-                show_struct(chunk)
+                output.write(chunk)
 
         elif isinstance(result, threading.Thread):
             try:
-                while result.isAlive():
+                while result.is_alive():
                     result.join(5)
             except KeyboardInterrupt:
                 result.close()
 
         else:
-            show_struct(result)
+            output.write(result)
 
         sys.exit(0)
 
@@ -288,6 +328,9 @@ def main():
         print(exception, file=sys.stderr)
         sys.exit(1)
 
+    finally:
+        output.close()
+
 
 # Allow invocation using `python -m sparkl_cli.main`
 if __name__ == "__main__":
@@ -0,0 +1,71 @@
+"""
+Copyright (c) 2018 SPARKL Limited. All Rights Reserved.
+
+Implementation module for keyed dispatch and deadline tests. Each
+consume sleeps briefly, then records its transaction and sequence
+number. The hang request never replies by itself. The ask request
+solicits, then records the response it got.
+"""
+import threading
+import time
+
+consumed = []
+
+hung = []
+
+# The open service, for solicits, and the responses to ask.
+services = []
+
+asked = []
+
+lock = threading.Lock()
+
+
+def onopen(service):
+    """
+    Installs the implementation.
+    """
+    services[:] = [service]
+    service.impl = {
+        "Mix/Record": record,
+        "Mix/Hang": hang,
+        "Mix/Sleep": sleep,
+        "Mix/Ask": ask}
+
+
+def record(consume):
+    """
+    Records the (txn, seq) pair of the consume data.
+    """
+    time.sleep(0.05)
+    with lock:
+        consumed.append(
+            (consume["data"]["txn"], consume["data"]["seq"]))
+
+
+def hang(request, callback):
+    """
+    Keeps the callback without replying.
+    """
+    hung.append(callback)
+
+
+def sleep(request, callback):
+    """
+    Replies Ok after the given seconds.
+    """
+    time.sleep(request["data"]["secs"])
+    callback({
+        "reply": "Ok"})
+
+
+def ask(request, callback):
+    """
+    Solicits the path given in the request data, then records the
+    response and replies with its name.
+    """
+    response = services[0].solicit({
+        "solicit": request["data"]["solicit"]})
+    asked.append(response)
+    callback({
+        "reply": response["response"]})
@@ -8,17 +8,23 @@ optional onclose functions.
 """
 import math
 
+# The open service, for solicits.
+services = []
+
 
 def onopen(service):
     """
     This mandatory function installs the implementation
     dict in the service on open.
     """
+    services[:] = [service]
     service.impl = {
         "Mix/FirstDivisor": first_divisor,
         "Mix/Test":         test,
         "Mix/Iterate":      iterate,
-        "Mix/Consume":      consume}
+        "Mix/Consume":      consume,
+        "Mix/Ignore":       ignore,
+        "Mix/Check":        check}
 
     print("Open")
 
@@ -39,6 +45,23 @@ def first_divisor(request, callback):
     })
 
 
+def check(request, callback):
+    """
+    Solicits CheckPrime and replies with its response.
+    """
+    response = services[0].solicit({
+        "solicit": "Mix/CheckPrime",
+        "data": request["data"]})
+    callback({
+        "reply": response["response"]})
+
+
+def ignore(request, callback):
+    """
+    Never replies, for testing a stalled service.
+    """
+
+
 def test(request, callback):
     """
     Returns No or Iterate.
@@ -131,3 +131,20 @@ class Tests():
         # Erlang binary term arrives as pretty-printed string:
         # <<137,80,78,...66,96,130>>.
         assert value.endswith("66,96,130>>")
+
+    def test_call_input(self, tmpdir):
+        inputs = tmpdir.join("inputs.ndjson")
+        inputs.write("\n".join(
+            '{"field1": ' + str(value) + '}' for value in range(20)))
+
+        results = list(sparkl(
+            "call",
+            "Scratch/TestCall/Test1",
+            input=str(inputs),
+            concurrency=4,
+            alias="pytest"))
+
+        assert [result["attr"]["input"] for result in results] == \
+            list(range(1, 21))
+        assert [result["content"][0]["content"][0]
+                for result in results] == list(range(20))
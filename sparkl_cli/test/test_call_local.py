@@ -0,0 +1,116 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test the call --input pieces which need no SPARKL node.
+"""
+import threading
+import time
+
+from sparkl_cli import cmd_call
+from sparkl_cli.Template import Template
+from sparkl_cli.cmd_call import (
+    read_inputs,
+    recompile,
+    run_calls)
+
+
+def template(operation_id, fields):
+    return Template({
+        "id": operation_id,
+        "tag": "solicit",
+        "path": "/Scratch/Mix/Go",
+        "fields": fields
+    })
+
+
+class Tests():
+
+    def setup_method(self):
+        self.active = 0
+        self.most = 0
+        self.lock = threading.Lock()
+
+    def call(self, index, values):
+        with self.lock:
+            self.active += 1
+            self.most = max(self.most, self.active)
+        # Later inputs complete first.
+        time.sleep(0.01 * (10 - index))
+        with self.lock:
+            self.active -= 1
+        return (index, values)
+
+    def test_ordered(self):
+        inputs = [(index, {"n": index}) for index in range(10)]
+        results = list(run_calls(iter(inputs), self.call, 3))
+        assert results == inputs
+        assert self.most <= 3
+
+    def test_unordered(self):
+        inputs = [(index, {"n": index}) for index in range(10)]
+        results = list(run_calls(iter(inputs), self.call, 10, False))
+        assert sorted(results) == inputs
+        assert results != inputs
+
+    def test_close_cancels(self):
+        started = []
+
+        def call(index, values):
+            started.append(index)
+            time.sleep(0.2 if index else 0)
+            return (index, values)
+
+        inputs = [(index, {"n": index}) for index in range(10)]
+        results = run_calls(iter(inputs), call, 2)
+        assert next(results) == inputs[0]
+        results.close()
+
+        # The last queued call never starts once the generator is closed.
+        time.sleep(0.5)
+        assert 3 not in started
+
+    def test_read_inputs(self, tmpdir):
+        inputs = tmpdir.join("inputs.ndjson")
+        inputs.write('{"n": 1}\n\nnot json\n{"n": 2}\n')
+        assert list(read_inputs(str(inputs))) == [
+            (1, {"n": 1}), (3, None), (4, {"n": 2})]
+
+    def test_recompile(self, monkeypatch):
+        saved = []
+        monkeypatch.setattr(
+            cmd_call, "get_object", lambda _args, path: {"path": path})
+        monkeypatch.setattr(
+            cmd_call, "drop_template", lambda _args, _template: None)
+        monkeypatch.setattr(
+            cmd_call, "save_template",
+            lambda _args, fresh: saved.append(fresh))
+
+        # Unchanged, so the error stands and the call is not made again.
+        cached = template("O-1", [["F-1", "n", "integer"]])
+        monkeypatch.setattr(
+            cmd_call, "compile_template",
+            lambda _args, _operation, _path: template(
+                "O-1", [["F-1", "n", "integer"]]))
+        assert recompile(None, cached) is None
+        assert saved == []
+
+        # Changed, so the new template is saved and used.
+        monkeypatch.setattr(
+            cmd_call, "compile_template",
+            lambda _args, _operation, _path: template(
+                "O-2", [["F-1", "n", "integer"]]))
+        fresh = recompile(None, cached)
+        assert fresh.operation_id == "O-2"
+        assert saved == [fresh]
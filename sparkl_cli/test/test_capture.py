@@ -0,0 +1,129 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test capture and replay of service websocket traffic.
+"""
+from __future__ import print_function
+
+import json
+import os
+import sys
+
+from sparkl_cli.Capture import (
+    INBOUND,
+    Recorder,
+    RecordingSocket,
+    ReplaySocket,
+    read_capture,
+    read_header)
+
+from sparkl_cli.common import mktemp_pathname
+from sparkl_cli.main import sparkl
+
+"""
+Need to load the test_rest.py implementation module from test/data.
+"""
+sys.path.append("sparkl_cli/test/data")
+
+FRAMES = [
+    {"request": "Mix/FirstDivisor", "id": "R1", "data": {"n": 13}},
+    {"response": "Mix/CheckPrime/Yes", "id": "S1"},
+    {"request": "Mix/Test", "id": "R2", "data": {"n": 13, "div": 2}},
+    {"consume": "Mix/Consume", "data": {"n": 13}},
+    {"request": "Mix/Check", "id": "R3", "data": {"n": 13}}]
+
+
+# pylint: disable=too-few-public-methods
+class FakeSocket(object):
+    """
+    Iterates over canned frames and keeps sent frames.
+    """
+    def __init__(self, frames):
+        self.frames = frames
+        self.sent = []
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def close(self):
+        pass
+
+
+class Tests():
+
+    def setup_method(self):
+        self.capture = mktemp_pathname(".gz")
+        recorder = Recorder(self.capture, "Scratch/TestRest/REST")
+        self.socket = RecordingSocket(
+            FakeSocket([json.dumps(frame) for frame in FRAMES]),
+            recorder)
+        for _message in self.socket:
+            pass
+        self.socket.send(json.dumps({"reply": "Mix/Test/Ok", "id": "R1"}))
+        self.socket.close()
+
+    def teardown_method(self):
+        os.remove(self.capture)
+
+    def test_header(self):
+        header = read_header(self.capture)
+        assert header["service"] == "Scratch/TestRest/REST"
+
+    def test_read_capture(self):
+        replayed = [json.loads(message)
+                    for (_offset, message) in read_capture(self.capture)]
+
+        # The response frame is not replayed, nor the outbound reply.
+        assert len(replayed) == 4
+        assert "response" not in replayed[1]
+        assert INBOUND == "in"
+
+    def test_replay(self):
+        result = sparkl(
+            "service",
+            "Scratch/TestRest/REST",
+            "test_rest",
+            replay=self.capture,
+            max_speed=True)
+
+        assert result["tag"] == "replay"
+        assert result["attr"]["events"] == 4
+        assert result["attr"]["replies"] == 3
+
+        # The solicit is answered with the captured response.
+        assert result["attr"]["solicits"] == 1
+        assert result["attr"]["defaulted"] == 0
+
+        paths = [operation["attr"]["path"]
+                 for operation in result["content"]]
+        assert paths == [
+            "Mix/Check", "Mix/CheckPrime", "Mix/CheckPrime/Yes",
+            "Mix/Consume", "Mix/FirstDivisor", "Mix/Test"]
+
+    def test_replay_solicit(self):
+        replay = ReplaySocket(self.capture)
+        delivered = []
+        replay.deliver = delivered.append
+
+        replay.send(json.dumps({"solicit": "Mix/CheckPrime", "id": "A"}))
+        replay.send(json.dumps({"solicit": "Mix/Other", "id": "B"}))
+        assert [json.loads(message) for message in delivered] == [
+            {"response": "Mix/CheckPrime/Yes", "id": "A"},
+            {"response": "Mix/Other/Ok", "id": "B"}]
+        assert (replay.solicits, replay.defaulted, replay.sent) == \
+            (2, 1, 0)
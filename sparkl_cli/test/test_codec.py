@@ -0,0 +1,89 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test module for codec.py
+"""
+import pytest
+
+from sparkl_cli import codec
+from sparkl_cli.CliException import CliException
+from sparkl_cli.main import sparkl
+
+TERM = {
+    "request": "Mix/Test",
+    "id": "A4D9K2L0QZ",
+    "data": {
+        "text": "café",
+        "long": 18446744073709551615,
+        "list": [1, 2.5, None, True]
+    }
+}
+
+
+class Tests():
+
+    def teardown_method(self):
+        codec.select()
+
+    def test_stdlib_always_available(self):
+        names = [each.name for each in codec.available()]
+        assert "json" in names
+        assert codec.select().name == names[0]
+
+    def test_lossy_opt_in(self):
+        assert codec.select().name != "orjson"
+        names = [each.name for each in codec.available()]
+        if "orjson" in names:
+            assert names[-1] == "orjson"
+
+    def test_round_trip(self):
+        for each in codec.available():
+            selected = codec.select(each.name)
+            text = codec.dumps(TERM)
+            assert isinstance(text, str)
+            assert codec.loads(text) == TERM
+            assert codec.loads(text.encode("utf-8")) == TERM
+            assert selected.name == codec.CODEC.name
+
+    def test_big_integer(self):
+        """
+        Integers beyond 64 bits stay exact, except with orjson which
+        decodes them as floats.
+        """
+        big = {"big": 12345678901234567890123}
+        for each in codec.available():
+            codec.select(each.name)
+            text = codec.dumps(big)
+            if each.name != "orjson":
+                assert codec.loads(text) == big
+
+    def test_unknown_codec(self):
+        with pytest.raises(CliException):
+            codec.select("nosuchjson")
+
+    def test_bad_json(self):
+        for each in codec.available():
+            codec.select(each.name)
+            with pytest.raises(ValueError):
+                codec.loads("{not json")
+
+    def test_bench(self):
+        result = sparkl(
+            "bench",
+            "codec",
+            count=10)
+
+        names = set(item["attr"]["name"] for item in result["content"])
+        assert "json" in names
@@ -0,0 +1,135 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test handler deadlines and slow handler detection, using the local
+stand-in.
+"""
+from __future__ import print_function
+
+import sys
+import threading
+import time
+
+from sparkl_cli.Deadlines import Deadlines
+from sparkl_cli.StandIn import StandIn
+from sparkl_cli.main import sparkl
+
+sys.path.append("sparkl_cli/test/data")
+
+import test_keyed  # pylint: disable=wrong-import-position
+
+SERVICE = "Scratch/TestDeadline/REST"
+
+
+class Tests():
+
+    def setup_method(self):
+        self.standin = StandIn(
+            responses={"Mix/Unanswered": None}).start()
+        sparkl(
+            "connect",
+            self.standin.url,
+            alias="pytest_deadline")
+
+        self.service = sparkl(
+            "service",
+            SERVICE,
+            "test_keyed",
+            deadline=0.2,
+            timeout_reply="Expired",
+            slow=0.05,
+            workers=2,
+            alias="pytest_deadline")
+        assert self.standin.wait_session(SERVICE)
+
+    def teardown_method(self):
+        self.service.close()
+        self.standin.close()
+        sparkl(
+            "close",
+            alias="pytest_deadline")
+
+    def request(self, operation, data, timeout=1):
+        result = {}
+        done = threading.Event()
+
+        def callback(reply):
+            result["reply"] = reply["reply"]
+            done.set()
+
+        self.standin.request(SERVICE, operation, data, callback)
+        assert done.wait(timeout)
+        return result["reply"]
+
+    def counter(self, metric, path):
+        for operation in self.service.snapshot()["content"]:
+            if operation["attr"]["path"] == path:
+                return operation["attr"].get(metric, 0)
+        return 0
+
+    def test_timeout_reply(self):
+        assert self.request("Mix/Hang", {}) == "Mix/Hang/Expired"
+        assert self.counter("timeout", "Mix/Hang") == 1
+
+        # The late reply is dropped.
+        test_keyed.hung.pop()({"reply": "Ok"})
+        assert self.counter("late", "Mix/Hang") == 1
+        assert self.counter("reply", "Mix/Hang") == 0
+
+    def test_solicit_deadline(self):
+        """
+        A handler waiting on a solicit is released at its deadline.
+        """
+        del test_keyed.asked[:]
+        assert self.request(
+            "Mix/Ask", {"solicit": "Mix/Unanswered"}) == "Mix/Ask/Expired"
+
+        deadline = time.time() + 1
+        while not test_keyed.asked:
+            assert time.time() < deadline
+            time.sleep(0.01)
+        assert test_keyed.asked == [{"response": "Expired"}]
+        assert self.counter("solicit_timeout", "Mix/Unanswered") == 1
+        assert not self.service.pending
+
+    def test_operation_deadline(self):
+        self.service.deadlines["Mix/Sleep"] = 1.0
+        assert self.request("Mix/Sleep", {"secs": 0.3}) == "Mix/Sleep/Ok"
+        assert self.counter("slow", "Mix/Sleep") == 1
+        assert self.counter("timeout", "Mix/Sleep") == 0
+
+    def test_fast_handler(self):
+        assert self.request("Mix/Sleep", {"secs": 0}) == "Mix/Sleep/Ok"
+        assert self.counter("slow", "Mix/Sleep") == 0
+
+    def test_deadlines_order(self):
+        timer = Deadlines()
+        timer.start()
+        fired = []
+        done = threading.Event()
+
+        def fire(name):
+            fired.append(name)
+            if len(fired) == 2:
+                done.set()
+
+        timer.add(0.1, lambda: fire("second"))
+        timer.add(0.05, lambda: fire("first"))
+        cancelled = timer.add(0.02, lambda: fire("cancelled"))
+        timer.cancel(cancelled)
+
+        assert done.wait(1)
+        timer.close()
+        assert fired == ["first", "second"]
@@ -0,0 +1,127 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test permessage-deflate negotiation against the local stand-in.
+"""
+from __future__ import print_function
+
+import pytest
+
+from websocket import WebSocketPayloadException
+
+from sparkl_cli.Deflate import (
+    DeflateWebSocket,
+    accepted)
+from sparkl_cli.StandIn import (
+    OPCODE_TEXT,
+    StandIn)
+from sparkl_cli.main import sparkl
+
+SUBJECT = "/Scratch/MixA"
+
+
+def event(name):
+    return {
+        "tag": "data_event",
+        "attr": {
+            "name": name
+        },
+        "content": [{
+            "tag": "datum",
+            "attr": {
+                "field": "F-" + str(index),
+                "name": "n"
+            },
+            "content": [index]
+        } for index in range(100)]
+    }
+
+
+class Tests():
+
+    def setup_method(self):
+        self.standin = StandIn(deflate=True).start()
+        sparkl(
+            "connect",
+            self.standin.url,
+            alias="pytest_deflate")
+
+    def teardown_method(self):
+        self.standin.close()
+        sparkl(
+            "close",
+            alias="pytest_deflate")
+
+    def listen(self, **kwargs):
+        events = sparkl(
+            "listen",
+            SUBJECT,
+            no_reconnect=True,
+            bytes=True,
+            alias="pytest_deflate",
+            **kwargs)
+        session = self.standin.wait_listen(SUBJECT)
+        for name in ("One", "Two", "Three"):
+            self.standin.publish(SUBJECT, event(name))
+        session.close()
+        return list(events)
+
+    def test_compressed(self):
+        [one, two, three, counts] = self.listen()
+        assert [one, two, three] == [
+            event("One"), event("Two"), event("Three")]
+        assert counts["tag"] == "listen_bytes"
+        assert counts["attr"]["wire"] < counts["attr"]["raw"]
+        assert counts["attr"]["ratio"] < 0.5
+
+    def test_no_compress(self):
+        events = self.listen(no_compress=True)
+        assert events[:3] == [
+            event("One"), event("Two"), event("Three")]
+        assert events[3]["attr"]["ratio"] == 1.0
+
+    def test_utf8_validation(self):
+        """
+        Text is checked as UTF-8 whether or not compression is
+        negotiated.
+        """
+        plain = StandIn().start()
+        try:
+            for standin in (self.standin, plain):
+                websock = DeflateWebSocket()
+                websock.connect(
+                    standin.url.replace("http", "ws", 1) +
+                    "/sse_listen/websocket" + SUBJECT)
+                session = standin.wait_listen(SUBJECT)
+                assert websock.deflating == (standin is self.standin)
+                session.write(OPCODE_TEXT, b"\xff")
+                with pytest.raises(WebSocketPayloadException):
+                    websock.recv()
+                websock.close()
+        finally:
+            plain.close()
+
+    def test_accepted(self):
+        assert accepted({}) is None
+        assert accepted({
+            "Sec-WebSocket-Extensions": "x-other"}) is None
+        assert accepted({
+            "sec-websocket-extensions": "permessage-deflate"}) == {}
+        assert accepted({
+            "Sec-WebSocket-Extensions":
+            "x-other, permessage-deflate; client_max_window_bits=10; "
+            "client_no_context_takeover"}) == {
+                "client_max_window_bits": "10",
+                "client_no_context_takeover": None}
@@ -0,0 +1,107 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test module for Filter.py
+"""
+import json
+
+import pytest
+
+from sparkl_cli.CliException import CliException
+from sparkl_cli.Filter import Filter
+
+EVENT = {
+    "tag": "data_event",
+    "attr": {
+        "subject": "B-A2-9VX-6BC",
+        "name": "Test"
+    },
+    "content": [
+        {
+            "tag": "datum",
+            "attr": {
+                "name": "n"
+            },
+            "content": [1000003]
+        }
+    ]
+}
+
+ERROR = {
+    "tag": "error",
+    "attr": {
+        "name": "Test",
+        "reason": "café"
+    }
+}
+
+
+def keeps(event_filter, event):
+    raw = json.dumps(event).encode("utf-8")
+    return event_filter.prefilter(raw) and event_filter.match(event)
+
+
+class Tests():
+
+    def test_tag(self):
+        event_filter = Filter(tags=["error"])
+        assert keeps(event_filter, ERROR)
+        assert not keeps(event_filter, EVENT)
+        assert not event_filter.prefilter(json.dumps(EVENT))
+
+    def test_name_and_subject(self):
+        assert keeps(Filter(names=["Test", "Other"]), EVENT)
+        assert keeps(Filter(subject_ids=["B-A2-9VX-6BC"]), EVENT)
+        assert not keeps(Filter(subject_ids=["B-A2-9VX-6BC"]), ERROR)
+
+    def test_where(self):
+        assert keeps(Filter(wheres=["field.n>100"]), EVENT)
+        assert not keeps(Filter(wheres=["field.n<=100"]), EVENT)
+        assert keeps(Filter(wheres=[".attr.name = Test"]), EVENT)
+        assert keeps(Filter(wheres=["content[0].attr.name~n"]), EVENT)
+        assert not keeps(Filter(wheres=["attr.missing=1"]), EVENT)
+
+        # Escaped values are not prefiltered, but still match.
+        assert keeps(Filter(wheres=["attr.reason=café"]), ERROR)
+
+    def test_substring_text(self):
+        # The ~ value is text, even if it reads as JSON.
+        assert keeps(Filter(wheres=["attr.subject~9"]), EVENT)
+        assert keeps(Filter(wheres=["field.n~100"]), EVENT)
+        assert keeps(
+            Filter(wheres=["attr.flag~true"]),
+            {"tag": "x", "attr": {"flag": "untrue"}})
+
+        # A server may send / escaped, so it is not prefiltered.
+        event_filter = Filter(wheres=["attr.path=/Scratch/Mix"])
+        assert not event_filter.needles
+        assert event_filter.prefilter(b'{"attr":{"path":"\\/Scratch"}}')
+
+    def test_bad_where(self):
+        with pytest.raises(CliException):
+            Filter(wheres=["no operator"])
+
+    def test_project(self):
+        event_filter = Filter(selects=["attr.name", "field.n", "attr.x"])
+        assert event_filter.project(EVENT) == {
+            "tag": "data_event",
+            "attr": {
+                "attr.name": "Test",
+                "field.n": 1000003
+            }
+        }
+
+    def test_empty(self):
+        assert not Filter()
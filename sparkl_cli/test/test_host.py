@@ -0,0 +1,257 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test hosting several services from a manifest, using the local
+stand-in.
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from sparkl_cli.KeyedExecutor import KeyedExecutor
+from sparkl_cli.StandIn import StandIn
+from sparkl_cli.main import sparkl
+
+sys.path.append("sparkl_cli/test/data")
+
+import test_keyed  # pylint: disable=wrong-import-position
+
+SERVICES = (
+    "Scratch/TestHostA/REST",
+    "Scratch/TestHostB/REST")
+
+KEYED_SERVICE = "Scratch/TestKeyed/REST"
+
+MANIFEST = """
+# Two services sharing the test_rest module.
+{First}    test_rest
+
+{Second}    test_rest
+"""
+
+
+class Tests():
+
+    def setup_method(self):
+        self.dir = tempfile.mkdtemp()
+        self.manifest = os.path.join(self.dir, "services.txt")
+        with open(self.manifest, "w") as manifest_file:
+            manifest_file.write(MANIFEST.format(
+                First=SERVICES[0],
+                Second=SERVICES[1]))
+
+        self.standin = StandIn().start()
+        sparkl(
+            "connect",
+            self.standin.url,
+            alias="pytest_host")
+
+        self.host = sparkl(
+            "service",
+            manifest=self.manifest,
+            workers=2,
+            reconnect=0.1,
+            alias="pytest_host")
+
+        for service in SERVICES:
+            assert self.standin.wait_session(service)
+
+    def teardown_method(self):
+        self.host.close()
+        self.standin.close()
+        sparkl(
+            "close",
+            alias="pytest_host")
+        shutil.rmtree(self.dir)
+
+    def request(self, service):
+        result = {}
+        done = threading.Event()
+
+        def callback(reply):
+            result["reply"] = reply["reply"]
+            done.set()
+
+        self.standin.request(
+            service, "Mix/Test", {"n": 9, "div": 3}, callback)
+        assert done.wait(1)
+        return result["reply"]
+
+    def test_all_services_reply(self):
+        for service in SERVICES:
+            assert self.request(service) == "Mix/Test/No"
+
+        snapshot = self.host.snapshot()
+        assert snapshot["attr"]["services"] == 2
+        assert [each["attr"]["name"] for each in snapshot["content"]] == \
+            list(SERVICES)
+
+    def test_combined_prometheus(self):
+        for service in SERVICES:
+            self.request(service)
+
+        text = self.host.prometheus()
+        assert text.count(
+            "# TYPE sparkl_service_request_total counter") == 1
+        for service in SERVICES:
+            assert "service=\"" + service + "\"" in text
+
+    def test_reconnect_one_service(self):
+        first = self.standin.wait_session(SERVICES[0])
+        second = self.standin.wait_session(SERVICES[1])
+        first.close()
+
+        deadline = time.time() + 3
+        while self.standin.wait_session(SERVICES[0]) is first:
+            assert time.time() < deadline
+            time.sleep(0.05)
+
+        assert self.standin.wait_session(SERVICES[1]) is second
+        for service in SERVICES:
+            assert self.request(service) == "Mix/Test/No"
+
+    def test_reconnect_wakes_solicit(self):
+        """
+        A handler waiting on a solicit gets an error response when
+        the service reconnects.
+        """
+        self.standin.responses["Mix/CheckPrime"] = None
+        sessions = [self.standin.wait_session(each) for each in SERVICES]
+        result = {}
+        done = threading.Event()
+
+        def callback(reply):
+            result["reply"] = reply["reply"]
+            done.set()
+
+        self.standin.request(
+            SERVICES[0], "Mix/Check", {"n": 13}, callback)
+        deadline = time.time() + 2
+        while not self.standin.solicits.get("Mix/CheckPrime"):
+            assert time.time() < deadline
+            time.sleep(0.01)
+
+        # The services share the module, so either may have solicited.
+        for session in sessions:
+            session.close()
+
+        assert done.wait(3)
+        assert result["reply"] == "Mix/Check/Error"
+
+    def test_keyed_dispatch(self):
+        """
+        Consumes in different transactions overlap, those in the same
+        transaction arrive in order.
+        """
+        service = sparkl(
+            "service",
+            KEYED_SERVICE,
+            "test_keyed",
+            workers=4,
+            alias="pytest_host")
+        assert self.standin.wait_session(KEYED_SERVICE)
+
+        start = time.time()
+        for seq in range(4):
+            for txn in ("T1", "T2", "T3", "T4"):
+                self.standin.consume(
+                    KEYED_SERVICE, "Mix/Record", {"txn": txn, "seq": seq},
+                    txn=txn)
+
+        deadline = start + 3
+        while len(test_keyed.consumed) < 16:
+            assert time.time() < deadline
+            time.sleep(0.01)
+
+        # Sixteen 50ms handlers on four keys take about 200ms.
+        assert time.time() - start < 0.6
+        for txn in ("T1", "T2", "T3", "T4"):
+            assert [seq for (each, seq) in test_keyed.consumed
+                    if each == txn] == [0, 1, 2, 3]
+        service.close()
+
+    def test_same_operation_parallel(self):
+        """
+        Requests for one operation without a transaction overlap.
+        """
+        service = sparkl(
+            "service",
+            KEYED_SERVICE,
+            "test_keyed",
+            workers=4,
+            alias="pytest_host")
+        assert self.standin.wait_session(KEYED_SERVICE)
+
+        replies = []
+        done = threading.Event()
+
+        def callback(reply):
+            replies.append(reply)
+            if len(replies) == 4:
+                done.set()
+
+        start = time.time()
+        for _ in range(4):
+            self.standin.request(
+                KEYED_SERVICE, "Mix/Sleep", {"secs": 0.2}, callback)
+        assert done.wait(2)
+        assert time.time() - start < 0.6
+        service.close()
+
+    def test_keyed_order(self):
+        executor = KeyedExecutor(4)
+        results = []
+        done = threading.Event()
+
+        def task(key, value):
+            time.sleep(0.001)
+            results.append((key, value))
+            if len(results) == 40:
+                done.set()
+
+        for value in range(20):
+            for key in ("a", "b"):
+                executor.submit(key, task, key, value)
+
+        assert done.wait(2)
+        executor.shutdown()
+        for key in ("a", "b"):
+            assert [value for (each, value) in results if each == key] == \
+                list(range(20))
+
+    def test_keyed_shutdown(self):
+        executor = KeyedExecutor(1)
+        started = threading.Event()
+        results = []
+
+        def task(value):
+            started.set()
+            time.sleep(0.1)
+            results.append(value)
+
+        executor.submit("a", task, 1)
+        executor.submit("a", task, 2)
+        assert started.wait(1)
+        executor.shutdown(wait=False)
+
+        # Neither the queued task nor a later one runs, nor raises.
+        executor.submit("a", task, 3)
+        time.sleep(0.3)
+        assert results == [1]
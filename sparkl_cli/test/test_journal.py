@@ -0,0 +1,177 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test module for Journal.py and the replay command.
+"""
+import gzip
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+
+from sparkl_cli import Journal as journal_module
+from sparkl_cli.CliException import CliException
+from sparkl_cli.Journal import (
+    Journal,
+    read_index,
+    replay,
+    segments)
+from sparkl_cli.cmd_replay import epoch_ms
+from sparkl_cli.main import sparkl
+
+START = 1530000000000
+
+
+def event(number):
+    return {
+        "tag": "data_event",
+        "id": "E-" + str(number),
+        "timestamp": START + number * 1000,
+        "attr": {
+            "txn": "T-" + str(number // 10)
+        }
+    }
+
+
+class Tests():
+
+    def setup_method(self):
+        self.dir = tempfile.mkdtemp()
+        journal = Journal(
+            self.dir, block_events=10, segment_bytes=300)
+        for number in range(100):
+            journal.append(event(number))
+        journal.close()
+
+    def teardown_method(self):
+        shutil.rmtree(self.dir)
+
+    def test_all_events(self):
+        assert len(segments(self.dir)) > 1
+        assert list(replay(self.dir)) == [event(n) for n in range(100)]
+
+        # Segments are plain gzip.
+        (_, data_path, index_path) = segments(self.dir)[0]
+        with gzip.open(data_path) as data:
+            assert len(data.read().splitlines()) == \
+                sum(entry["count"] for entry in read_index(index_path))
+
+    def test_time_range(self):
+        events = replay(
+            self.dir,
+            from_ms=START + 15000,
+            to_ms=START + 24000)
+        assert [each["id"] for each in events] == \
+            ["E-" + str(n) for n in range(15, 25)]
+
+    def test_txn_reads_one_block(self, monkeypatch):
+        decompressed = []
+        real = gzip.decompress
+
+        def counting(data):
+            decompressed.append(len(data))
+            return real(data)
+
+        monkeypatch.setattr(journal_module.gzip, "decompress", counting)
+        events = list(replay(self.dir, txn="T-7"))
+        assert [each["id"] for each in events] == \
+            ["E-" + str(n) for n in range(70, 80)]
+        assert len(decompressed) == 1
+
+    def test_cause_reads_one_block(self):
+        directory = os.path.join(self.dir, "causes")
+        journal = Journal(directory, block_events=2)
+        reply = event(200)
+        reply["attr"]["cause"] = "E-100"
+        for each in [event(100), event(101), event(102), reply]:
+            journal.append(each)
+        journal.close()
+
+        assert [entry["keys"] for entry in read_index(
+            segments(directory)[0][2])] == [
+                ["E-100", "E-101", "T-10"],
+                ["E-100", "E-102", "E-200", "T-10", "T-20"]]
+        assert [each["id"] for each in replay(directory, txn="E-100")] == \
+            ["E-100", "E-200"]
+
+    def test_quiet_flush(self, monkeypatch):
+        monkeypatch.setattr(journal_module, "BLOCK_SECS", 0.1)
+        directory = os.path.join(self.dir, "quiet")
+        journal = Journal(directory)
+        journal.append(event(0))
+        deadline = time.time() + 5
+        events = []
+        while not events and time.time() < deadline:
+            time.sleep(0.05)
+            events = list(replay(directory)) if segments(directory) else []
+        assert [each["id"] for each in events] == ["E-0"]
+        journal.close()
+
+    def test_epoch_ms(self):
+        assert epoch_ms(str(START)) == START
+        assert epoch_ms("2018-06-26T08:00:00Z") == START
+        assert epoch_ms("2018-06-26T09:00:00.000+01:00") == START
+        assert epoch_ms("2018-06-26 08:00+0000") == START
+        with pytest.raises(CliException):
+            epoch_ms("yesterday")
+
+    def test_partial_index_line(self):
+        (_, _, index_path) = segments(self.dir)[-1]
+        with open(index_path, "a") as index:
+            index.write('{"offset": ')
+        assert len(list(replay(self.dir))) == 100
+
+    def test_replay_command(self):
+        events = sparkl(
+            "replay",
+            self.dir,
+            from_time=str(START + 98000))
+        assert [each["id"] for each in events] == ["E-98", "E-99"]
+
+        with pytest.raises(CliException):
+            sparkl(
+                "replay",
+                os.path.join(self.dir, "missing"))
+
+    def test_skip_segments(self, monkeypatch):
+        read = []
+        real = journal_module.read_index
+
+        def recording(index_path):
+            read.append(index_path)
+            return real(index_path)
+
+        monkeypatch.setattr(journal_module, "read_index", recording)
+
+        # Only the last segment was started within the clock skew.
+        listed = segments(self.dir)
+        from_ms = listed[-1][0] + journal_module.CLOCK_SKEW_MS
+        assert list(replay(self.dir, from_ms=from_ms)) == []
+        assert read == [listed[-1][2]]
+
+    def test_no_timestamp(self):
+        directory = os.path.join(self.dir, "untimed")
+        journal = Journal(directory)
+        untimed = event(0)
+        del untimed["timestamp"]
+        journal.append(untimed)
+        journal.close()
+
+        assert read_index(segments(directory)[0][2])[0]["first"] is None
+        assert list(replay(directory)) == [untimed]
+        assert list(replay(directory, from_ms=0)) == []
+        assert list(replay(directory, to_ms=START)) == []
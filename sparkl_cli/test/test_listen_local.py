@@ -0,0 +1,335 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test websocket listen against the local stand-in, which needs no
+SPARKL node.
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+
+import pytest
+
+from sparkl_cli.CliException import CliException
+from sparkl_cli.StandIn import (
+    OPCODE_TEXT,
+    StandIn)
+from sparkl_cli.Subscription import Subscription
+from sparkl_cli.main import sparkl
+
+SUBJECTS = (
+    "/Scratch/MixA",
+    "/Scratch/MixB")
+
+
+def event(name):
+    return {
+        "tag": "data_event",
+        "attr": {
+            "name": name
+        }
+    }
+
+
+class Tests():
+
+    def setup_method(self):
+        self.standin = StandIn().start()
+        sparkl(
+            "connect",
+            self.standin.url,
+            alias="pytest_listen")
+
+    def teardown_method(self):
+        self.standin.close()
+        sparkl(
+            "close",
+            alias="pytest_listen")
+
+    def test_single_subject(self):
+        events = sparkl(
+            "listen",
+            SUBJECTS[0],
+            alias="pytest_listen")
+        assert self.standin.wait_listen(SUBJECTS[0])
+
+        self.standin.publish(SUBJECTS[0], event("One"))
+        assert next(events) == event("One")
+        events.close()
+
+    def test_bad_message_skipped(self):
+        events = sparkl(
+            "listen",
+            SUBJECTS[0],
+            alias="pytest_listen")
+        session = self.standin.wait_listen(SUBJECTS[0])
+
+        session.write(OPCODE_TEXT, b'{"tag": ')
+        self.standin.publish(SUBJECTS[0], event("Good"))
+        assert next(events) == event("Good")
+        events.close()
+
+    def test_open_failure_closes_opened(self, monkeypatch):
+        real = Subscription.open
+        opened = []
+
+        def failing(subscription):
+            if subscription.path.endswith("MixB"):
+                raise IOError("refused")
+            real(subscription)
+            opened.append(subscription)
+
+        monkeypatch.setattr(Subscription, "open", failing)
+        with pytest.raises(IOError):
+            sparkl(
+                "listen",
+                *SUBJECTS,
+                alias="pytest_listen")
+
+        # The first subscription was opened, then closed.
+        assert [each.path for each in opened] == [SUBJECTS[0]]
+        assert opened[0].ws is None
+
+    def test_multiplexed_subjects(self):
+        events = sparkl(
+            "listen",
+            *SUBJECTS,
+            alias="pytest_listen")
+        for subject in SUBJECTS:
+            assert self.standin.wait_listen(subject)
+
+        self.standin.publish(SUBJECTS[1], event("B"))
+        self.standin.publish(SUBJECTS[0], event("A"))
+
+        received = [next(events), next(events)]
+        names = set(
+            (each["attr"]["listen"], each["attr"]["name"])
+            for each in received)
+        assert names == set([(SUBJECTS[0], "A"), (SUBJECTS[1], "B")])
+        events.close()
+
+    def test_independent_restart(self):
+        events = sparkl(
+            "listen",
+            *SUBJECTS,
+            alias="pytest_listen")
+        first = self.standin.wait_listen(SUBJECTS[0])
+        assert self.standin.wait_listen(SUBJECTS[1])
+
+        # The second subject carries on while the first restarts.
+        first.close()
+        self.standin.publish(SUBJECTS[1], event("During"))
+        assert next(events)["attr"]["name"] == "During"
+
+        # Events are read, and the restart made, as the generator runs.
+        while self.standin.wait_listen(SUBJECTS[0], 0) in (None, first):
+            self.standin.publish(SUBJECTS[1], event("Tick"))
+            next(events)
+            time.sleep(0.05)
+
+        self.standin.publish(SUBJECTS[0], event("After"))
+        received = next(events)
+        while received["attr"].get("name") != "After":
+            received = next(events)
+        assert received["attr"] == {
+            "listen": SUBJECTS[0],
+            "name": "After"}
+        events.close()
+
+    def test_slow_reopen(self, monkeypatch):
+        real = Subscription.open
+        opened = []
+
+        def slow(subscription):
+            if subscription.path == SUBJECTS[0] and opened:
+                time.sleep(1.0)
+            real(subscription)
+            opened.append(subscription.path)
+
+        monkeypatch.setattr(Subscription, "open", slow)
+        events = sparkl(
+            "listen",
+            *SUBJECTS,
+            backoff=0.01,
+            alias="pytest_listen")
+        first = self.standin.wait_listen(SUBJECTS[0])
+        assert self.standin.wait_listen(SUBJECTS[1])
+
+        # The second subject is read while the first reconnects.
+        first.close()
+        time.sleep(0.1)
+        self.standin.publish(SUBJECTS[1], event("Before"))
+        assert next(events)["attr"]["name"] == "Before"
+        time.sleep(0.1)
+        start = time.time()
+        self.standin.publish(SUBJECTS[1], event("During"))
+        assert next(events)["attr"]["name"] == "During"
+        assert time.time() - start < 0.5
+
+        received = next(events)
+        assert received["tag"] == "listen_gap"
+        assert received["attr"]["listen"] == SUBJECTS[0]
+        events.close()
+
+    def test_filter_and_select(self):
+        events = sparkl(
+            "listen",
+            SUBJECTS[0],
+            tag=["data_event"],
+            where=["attr.name=Keep"],
+            select=["attr.name"],
+            alias="pytest_listen")
+        assert self.standin.wait_listen(SUBJECTS[0])
+
+        self.standin.publish(SUBJECTS[0], event("Drop"))
+        self.standin.publish(SUBJECTS[0], {"tag": "error"})
+        self.standin.publish(SUBJECTS[0], event("Keep"))
+        assert next(events) == {
+            "tag": "data_event",
+            "attr": {
+                "attr.name": "Keep"
+            }
+        }
+        events.close()
+
+    def test_reconnect_gap(self):
+        events = sparkl(
+            "listen",
+            SUBJECTS[0],
+            backoff=0.05,
+            alias="pytest_listen")
+        session = self.standin.wait_listen(SUBJECTS[0])
+
+        self.standin.publish(SUBJECTS[0], event("Before"))
+        assert next(events)["attr"]["name"] == "Before"
+        session.close()
+
+        gap = next(events)
+        assert gap["tag"] == "listen_gap"
+        assert gap["attr"]["listen"] == SUBJECTS[0]
+        assert gap["attr"]["reconnects"] == 1
+        assert gap["attr"]["received"] == 1
+        assert gap["attr"]["to"] >= gap["attr"]["from"]
+
+        assert self.standin.wait_listen(SUBJECTS[0]) is not session
+        self.standin.publish(SUBJECTS[0], event("After"))
+        assert next(events)["attr"]["name"] == "After"
+        events.close()
+
+    def test_no_reconnect(self):
+        events = sparkl(
+            "listen",
+            SUBJECTS[0],
+            no_reconnect=True,
+            alias="pytest_listen")
+        self.standin.wait_listen(SUBJECTS[0]).close()
+
+        assert list(events) == []
+
+    def test_journal(self):
+        journal = tempfile.mkdtemp()
+        events = sparkl(
+            "listen",
+            SUBJECTS[0],
+            journal=journal,
+            alias="pytest_listen")
+        session = self.standin.wait_listen(SUBJECTS[0])
+
+        for name in ("One", "Two"):
+            self.standin.publish(SUBJECTS[0], event(name))
+        session.close()
+
+        # The gap event is output, the data events journalled.
+        assert next(events)["tag"] == "listen_gap"
+        events.close()
+
+        replayed = sparkl(
+            "replay",
+            journal)
+        assert [each["attr"].get("name") for each in replayed] == \
+            ["One", "Two", None]
+        shutil.rmtree(journal)
+
+    def test_sample_all_dropped(self):
+        events = sparkl(
+            "listen",
+            SUBJECTS[0],
+            sample=0.0,
+            no_reconnect=True,
+            alias="pytest_listen")
+        session = self.standin.wait_listen(SUBJECTS[0])
+
+        term = event("One")
+        term["attr"]["txn"] = "T-1"
+        self.standin.publish(SUBJECTS[0], term)
+        session.close()
+
+        [dropped] = list(events)
+        assert dropped == {
+            "tag": "listen_dropped",
+            "attr": {
+                "kept": 0,
+                "sampled": 1,
+                "limited": 0
+            }
+        }
+
+    def test_bad_sample(self):
+        with pytest.raises(CliException):
+            sparkl(
+                "listen",
+                SUBJECTS[0],
+                sample=2.0,
+                alias="pytest_listen")
+
+        with pytest.raises(CliException):
+            sparkl(
+                "listen",
+                SUBJECTS[0],
+                max_rate=0,
+                alias="pytest_listen")
+
+        # Nothing was opened.
+        assert self.standin.wait_listen(SUBJECTS[0], 0.2) is None
+
+    def test_resolve_interrupt(self):
+        events = sparkl(
+            "listen",
+            SUBJECTS[0],
+            sample=0.0,
+            resolve=True,
+            alias="pytest_listen")
+        session = self.standin.wait_listen(SUBJECTS[0])
+        term = event("One")
+        term["attr"]["txn"] = "T-1"
+        self.standin.publish(SUBJECTS[0], term)
+
+        # Ctrl-C still ends the listener cleanly, with its final marker.
+        threading.Timer(
+            0.3, os.kill, (os.getpid(), signal.SIGINT)).start()
+        terms = list(events)
+        assert terms[0]["tag"] == "listen_dropped"
+        assert terms[0]["attr"]["sampled"] == 1
+
+        # The subscription websocket is closed.
+        deadline = time.time() + 1
+        while not session.closed and time.time() < deadline:
+            time.sleep(0.01)
+        assert session.closed
@@ -0,0 +1,83 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test module for Metrics.py
+"""
+import requests
+
+from sparkl_cli.Metrics import (
+    Histogram,
+    Metrics)
+
+
+class Tests():
+
+    def setup_method(self):
+        self.metrics = Metrics("Scratch/TestRest/REST")
+
+    def teardown_method(self):
+        self.metrics.close()
+
+    def test_histogram_percentiles(self):
+        histogram = Histogram()
+        for _ in range(99):
+            histogram.observe(0.002)
+        histogram.observe(3.0)
+
+        assert histogram.count == 100
+        assert histogram.max == 3.0
+        assert 0.001 < histogram.percentile(50) <= 0.0025
+        assert histogram.percentile(100) == 3.0
+
+    def test_empty_histogram(self):
+        assert Histogram().percentile(99) == 0.0
+
+    def test_snapshot(self):
+        self.metrics.count("request", "Mix/Test")
+        self.metrics.count("request", "Mix/Test")
+        self.metrics.observe("handler", "Mix/Test", 0.01)
+
+        snapshot = self.metrics.snapshot()
+        assert snapshot["tag"] == "metrics"
+
+        [operation] = snapshot["content"]
+        assert operation["attr"]["path"] == "Mix/Test"
+        assert operation["attr"]["request"] == 2
+
+        [latency] = operation["content"]
+        assert latency["attr"]["metric"] == "handler"
+        assert latency["attr"]["count"] == 1
+
+    def test_prometheus(self):
+        self.metrics.count("request", "Mix/Test")
+        self.metrics.observe("handler", "Mix/Test", 0.01)
+
+        text = self.metrics.prometheus()
+        assert "# TYPE sparkl_service_request_total counter" in text
+        assert ("sparkl_service_request_total{"
+                "service=\"Scratch/TestRest/REST\",path=\"Mix/Test\"} 1"
+                in text)
+        assert "sparkl_service_handler_seconds_count{" in text
+        assert "le=\"+Inf\"} 1" in text
+
+    def test_serve(self):
+        self.metrics.count("request", "Mix/Test")
+        server = self.metrics.serve(0)
+        (host, port) = server.server_address
+
+        response = requests.get(
+            "http://{Host}:{Port}/metrics".format(Host=host, Port=port))
+        assert response.status_code == 200
+        assert "sparkl_service_request_total" in response.text
@@ -0,0 +1,84 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test module for Output.py and read_terms.
+"""
+import io
+import json
+import subprocess
+import sys
+import time
+
+from sparkl_cli.Output import Output
+from sparkl_cli.common import read_terms
+
+TERMS = [
+    {"tag": "data_event", "attr": {"name": "A"}, "content": []},
+    {"tag": "data_event", "attr": {"name": "B", "text": "line\nbreak"}}
+]
+
+
+class Tests():
+
+    def test_ndjson_lines(self):
+        stream = io.StringIO()
+        output = Output("ndjson", stream)
+        for term in TERMS:
+            output.write(term)
+        output.close()
+
+        lines = stream.getvalue().splitlines()
+        assert [json.loads(line) for line in lines] == TERMS
+
+    def test_periodic_flush(self):
+        stream = io.StringIO()
+        output = Output("ndjson", stream, flush_secs=0.05)
+        output.write(TERMS[0])
+        assert stream.getvalue() == ""
+
+        time.sleep(0.2)
+        assert json.loads(stream.getvalue()) == TERMS[0]
+        output.close()
+
+    def test_json(self):
+        stream = io.StringIO()
+        output = Output("json", stream)
+        output.write(TERMS[0])
+        output.write(None)
+        output.close()
+
+        assert json.loads(stream.getvalue()) == TERMS[0]
+
+    def test_read_terms(self, monkeypatch):
+        stream = io.StringIO()
+        output = Output("ndjson", stream)
+        for term in TERMS:
+            output.write(term)
+        output.close()
+
+        stdin = io.TextIOWrapper(
+            io.BytesIO(stream.getvalue().encode("utf-8")))
+        monkeypatch.setattr(sys, "stdin", stdin)
+        assert list(read_terms()) == TERMS
+
+    def test_format_option(self):
+        result = subprocess.run(
+            [sys.executable, "-m", "sparkl_cli.main",
+             "--format", "ndjson", "bench", "codec", "-n", "5"],
+            stdout=subprocess.PIPE, check=True)
+
+        lines = result.stdout.splitlines()
+        assert len(lines) == 1
+        assert json.loads(lines[0])["attr"]["suite"] == "codec"
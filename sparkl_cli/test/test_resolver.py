@@ -0,0 +1,149 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test module for Resolver.py.
+"""
+import _thread
+import threading
+import time
+from concurrent.futures import wait
+
+from sparkl_cli.Resolver import Resolver, resolving
+
+OBJECTS = {
+    "S-1": {"tag": "request", "attr": {"id": "S-1", "name": "Test"}},
+    "F-1": {"tag": "field", "attr": {"id": "F-1", "name": "n",
+                                     "type": "integer"}},
+    "F-2": {"tag": "field", "attr": {"id": "F-2", "name": "s",
+                                     "type": "string"}}
+}
+
+
+def data_event(number, subject, *fields):
+    return {
+        "tag": "data_event",
+        "attr": {
+            "number": number,
+            "subject": subject
+        },
+        "content": [
+            {"tag": "datum", "attr": {"field": field}, "content": [1]}
+            for field in fields]
+    }
+
+
+class Tests():
+
+    def setup_method(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def fetch(self, ids):
+        with self.lock:
+            self.batches.append(list(ids))
+        time.sleep(0.05)
+        return dict((object_id, OBJECTS[object_id])
+                    for object_id in ids if object_id in OBJECTS)
+
+    def test_order_and_names(self):
+        source = iter([
+            data_event(0, "S-1", "F-1"),
+            data_event(1, "S-X"),
+            data_event(2, "S-1", "F-1", "F-2")] +
+                      [data_event(n, "S-1", "F-2") for n in range(3, 50)])
+        resolver = Resolver(self.fetch, batch_ids=2)
+        events = list(resolving(source, resolver))
+
+        assert [term["attr"]["number"] for term in events] == \
+            list(range(50))
+        assert events[0]["attr"]["subject_name"] == "Test"
+        assert events[0]["attr"]["subject_tag"] == "request"
+        assert events[0]["content"][0]["attr"]["name"] == "n"
+        assert events[0]["content"][0]["attr"]["type"] == "integer"
+        assert "subject_name" not in events[1]["attr"]
+        assert events[2]["content"][1]["attr"]["name"] == "s"
+
+        # Each id is fetched once, in batches.
+        fetched = sorted(sum(self.batches, []))
+        assert fetched == ["F-1", "F-2", "S-1", "S-X"]
+        assert max(len(batch) for batch in self.batches) == 2
+        assert set(resolver.fetched_objects()) == set(OBJECTS)
+
+    def test_cached(self):
+        resolver = Resolver(self.fetch, cache=OBJECTS)
+        events = list(resolving(
+            iter([data_event(0, "S-1", "F-1")]), resolver))
+        assert events[0]["attr"]["subject_name"] == "Test"
+        assert self.batches == []
+
+    def test_fetch_error(self):
+        def failing(_ids):
+            raise IOError("down")
+
+        resolver = Resolver(failing)
+        [term] = list(resolving(iter([data_event(0, "S-1")]), resolver))
+        assert "subject_name" not in term["attr"]
+        assert resolver.lookup("S-1") is None
+
+        # The failed id is not cached, so it is fetched again.
+        resolver = Resolver(self.fetch)
+        resolver.fetch = failing
+        wait(resolver.prefetch(["S-1"]))
+        resolver.fetch = self.fetch
+        wait(resolver.prefetch(["S-1"]))
+        resolver.close()
+        assert resolver.lookup("S-1") == OBJECTS["S-1"]
+
+    def test_interrupt(self):
+        interrupted = threading.Event()
+
+        def source():
+            yield data_event(0, "S-1")
+            interrupted.wait()
+            yield {"tag": "final"}
+
+        threading.Timer(0.2, _thread.interrupt_main).start()
+        events = list(resolving(
+            source(), Resolver(self.fetch), interrupt=interrupted.set))
+        assert interrupted.is_set()
+        assert events[0]["attr"]["subject_name"] == "Test"
+        assert events[1] == {"tag": "final"}
+
+    def test_prefetch_concurrent(self):
+        resolver = Resolver(self.fetch, workers=3, batch_ids=1)
+        start = time.time()
+        wait(resolver.prefetch(["S-1", "F-1", "F-2", "F-1", "S-1"]))
+        elapsed = time.time() - start
+        resolver.close()
+
+        # Each id is fetched once, all at the same time.
+        assert sorted(sum(self.batches, [])) == ["F-1", "F-2", "S-1"]
+        assert elapsed < 0.1
+
+    def test_fetch_per_id(self):
+        def fetch(ids):
+            if "F-1" in ids:
+                raise IOError("down")
+            return self.fetch(ids)
+
+        resolver = Resolver(fetch)
+        wait(resolver.prefetch(["S-1", "F-1", "F-2"]))
+        resolver.close()
+
+        # Each id is a task of its own, so one failure fails only it.
+        assert all(len(batch) == 1 for batch in self.batches)
+        assert resolver.lookup("S-1") == OBJECTS["S-1"]
+        assert resolver.lookup("F-2") == OBJECTS["F-2"]
+        assert resolver.lookup("F-1") is None
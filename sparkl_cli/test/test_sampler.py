@@ -0,0 +1,79 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test module for Sampler.py.
+"""
+from sparkl_cli import Sampler as sampler_module
+from sparkl_cli.Sampler import Sampler
+
+
+def event(txn, number):
+    return {
+        "tag": "data_event",
+        "id": "E-" + str(number),
+        "attr": {
+            "txn": txn
+        }
+    }
+
+
+class Tests():
+
+    def test_sample_whole_transactions(self):
+        sampler = Sampler(rate=0.25)
+        kept = {}
+        for txn in range(1000):
+            for number in range(3):
+                admitted = sampler.admit(event("T-" + str(txn), number))
+                kept.setdefault(txn, set()).add(admitted)
+
+        assert all(len(decisions) == 1 for decisions in kept.values())
+        assert 150 < sampler.kept / 3 < 350
+        assert sampler.kept + sampler.sampled == 3000
+
+        # Another process keeps the same transactions.
+        other = Sampler(rate=0.25)
+        assert [other.admit(event("T-" + str(txn), 0))
+                for txn in range(1000)] == \
+            [True in kept[txn] for txn in range(1000)]
+
+    def test_token_bucket(self, monkeypatch):
+        clock = [100.0]
+        monkeypatch.setattr(
+            sampler_module, "default_timer", lambda: clock[0])
+
+        sampler = Sampler(max_rate=5)
+        assert sum(sampler.admit(event(None, n)) for n in range(10)) == 5
+        assert sampler.limited == 5
+
+        clock[0] += 0.4
+        assert sum(sampler.admit(event(None, n)) for n in range(10)) == 2
+
+    def test_report(self, monkeypatch):
+        clock = [100.0]
+        monkeypatch.setattr(
+            sampler_module, "default_timer", lambda: clock[0])
+
+        sampler = Sampler(rate=0.0)
+        assert sampler.report() is None
+        sampler.admit(event("T", 0))
+        assert sampler.report()["attr"] == \
+            {"kept": 0, "sampled": 1, "limited": 0}
+
+        sampler.admit(event("T", 1))
+        assert sampler.report() is None
+        assert sampler.report(force=True)["attr"]["sampled"] == 2
+        clock[0] += 2
+        assert sampler.report() is None
@@ -0,0 +1,124 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test module for Scanner.py.
+"""
+import base64
+import json
+
+import pytest
+
+from sparkl_cli import upload
+from sparkl_cli.CliException import CliException
+from sparkl_cli.Scanner import Scanner
+from sparkl_cli.upload import Base64File, BinaryFile
+
+BIG = "sparkl_cli/test/data/big.wav"
+
+
+def reply(audio):
+    return {
+        "tag": "data_event",
+        "attr": {
+            "subject": "S-1",
+            "note": "café \"quoted\""
+        },
+        "content": [{
+            "tag": "datum",
+            "attr": {
+                "field": "F-1"
+            },
+            "content": [42]
+        }, {
+            "tag": "datum",
+            "attr": {
+                "field": "F-2"
+            },
+            "content": [audio]
+        }]
+    }
+
+
+def scanned(text, chunk, sink_for=None):
+    scanner = Scanner(sink_for)
+    for start in range(0, len(text), chunk):
+        scanner.feed(text[start:start + chunk])
+    return scanner.close()
+
+
+class Tests():
+
+    def test_no_sinks(self):
+        term = reply("abc\\/def")
+        text = json.dumps(term).encode("utf-8")
+        for chunk in (1, 3, 1000):
+            assert scanned(text, chunk) == term
+
+    def test_sink(self, tmpdir):
+        with open(BIG, "rb") as binary:
+            audio = binary.read()
+
+        # Escaped slashes are split across chunks of 1.
+        small = base64.b64encode(audio[:3000]).decode("ascii")
+        cases = [
+            (json.dumps(reply(small)).replace("/", "\\/").encode("utf-8"),
+             1, audio[:3000]),
+            (b"".join(upload.body(reply(BinaryFile(BIG)))), 5, audio),
+            (b"".join(upload.body(reply(BinaryFile(BIG)))), 65536, audio)]
+
+        for (text, chunk, expected) in cases:
+            fields = []
+            path = str(tmpdir.join("audio"))
+
+            def sink_for(field):
+                fields.append(field)
+                return Base64File(path) if field == "F-2" else None
+
+            term = scanned(text, chunk, sink_for)
+            assert fields == ["F-2"]
+            assert term["content"][0]["content"] == [42]
+            assert term["content"][1]["content"] == [{
+                "tag": "file",
+                "attr": {
+                    "path": path,
+                    "bytes": len(expected)
+                }
+            }]
+            assert term["attr"]["note"] == "café \"quoted\""
+            with open(path, "rb") as binary:
+                assert binary.read() == expected
+
+    def test_incomplete(self):
+        with pytest.raises(CliException):
+            scanned(b'{"content": [{"content": ["abc', 4)
+
+    def test_content_first(self, capsys):
+        term = {
+            "tag": "data_event",
+            "content": [{
+                "tag": "datum",
+                "content": ["abc", "def"],
+                "attr": {
+                    "field": "F-2"
+                }
+            }]
+        }
+        fields = []
+        text = json.dumps(term).encode("utf-8")
+        assert scanned(text, 4, fields.append) == term
+
+        # The value is kept, with one warning.
+        assert fields == []
+        assert capsys.readouterr().err.count("field id") == 1
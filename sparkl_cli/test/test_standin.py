@@ -0,0 +1,201 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test the rest service implementation against the local stand-in,
+which needs no SPARKL node.
+"""
+from __future__ import print_function
+
+import sys
+import threading
+import time
+
+from sparkl_cli.Notifier import Notifier
+from sparkl_cli.StandIn import StandIn
+from sparkl_cli.main import sparkl
+
+"""
+Need to load the test_rest.py implementation module from test/data.
+"""
+sys.path.append("sparkl_cli/test/data")
+
+SERVICE = "Scratch/TestRest/REST"
+
+
+class Tests():
+    """
+    Note that all sparkl calls use the connection alias "pytest_standin".
+    """
+    def setup_method(self):
+        self.standin = StandIn(
+            responses={
+                "Mix/CheckPrime": ("Yes", {})
+            }).start()
+
+        sparkl(
+            "connect",
+            self.standin.url,
+            alias="pytest_standin")
+
+        self.service = sparkl(
+            "service",
+            SERVICE,
+            "test_rest",
+            alias="pytest_standin")
+
+        assert self.standin.wait_session(SERVICE)
+
+    def teardown_method(self):
+        self.service.close()
+        self.standin.close()
+
+        sparkl(
+            "close",
+            alias="pytest_standin")
+
+    def test_request_reply(self):
+        result = {}
+        done = threading.Event()
+
+        def callback(reply):
+            result["reply"] = reply
+            done.set()
+
+        self.standin.request(
+            SERVICE, "Mix/Test", {"n": 9, "div": 3}, callback)
+        assert done.wait(1)
+        assert result["reply"]["reply"] == "Mix/Test/No"
+
+        snapshot = self.service.snapshot()
+        paths = dict(
+            (path["attr"]["path"], path["attr"])
+            for path in snapshot["content"])
+        assert paths["Mix/Test"]["request"] == 1
+        assert paths["Mix/Test"]["reply"] == 1
+        assert paths["websocket"]["bytes_in_wire"] > 0
+
+    def test_consume(self):
+        del self.service.module.consumes[:]
+        self.standin.consume(
+            SERVICE, "Mix/Consume", {"n": 13})
+
+        time.sleep(0.2)
+        assert len(self.service.module.consumes) == 1
+
+    def test_sync_solicit(self):
+        response = self.service.solicit({
+            "solicit": "Mix/CheckPrime",
+            "data": {
+                "n": 13
+            }
+        })
+
+        assert response["response"] == "Yes"
+        assert self.standin.solicits["Mix/CheckPrime"] == 1
+
+    def test_notify(self):
+        self.service.notify({
+            "notify": "Mix/Notify"})
+
+        time.sleep(0.2)
+        assert self.standin.notifies["Mix/Notify"] == 1
+
+    def test_batched_notify(self):
+        """
+        Batched notifies all arrive, the last ones flushed on close.
+        """
+        self.service.close()
+        self.service = sparkl(
+            "service",
+            SERVICE,
+            "test_rest",
+            batch_notify=50,
+            alias="pytest_standin")
+        assert self.standin.wait_session(SERVICE)
+
+        for _ in range(100):
+            self.service.notify({
+                "notify": "Mix/Notify"})
+        self.service.close()
+
+        deadline = time.time() + 2
+        while self.standin.notifies.get("Mix/Notify", 0) < 100:
+            assert time.time() < deadline
+            time.sleep(0.05)
+        assert self.service.notifier.frames == 100
+
+    def test_notify_order(self):
+        """
+        A flush on another thread waits for the batch being sent.
+        """
+        class SlowSocket(object):
+            def __init__(self):
+                self.sent = []
+                self.sending = threading.Event()
+
+            def send_texts(self, texts):
+                if not self.sending.is_set():
+                    self.sending.set()
+                    time.sleep(0.2)
+                self.sent.extend(texts)
+
+        websock = SlowSocket()
+        notifier = Notifier(websock)
+        notifier.notify(1)
+        first = threading.Thread(target=notifier.flush)
+        first.start()
+        assert websock.sending.wait(2)
+        notifier.notify(2)
+        notifier.close()
+        first.join()
+        assert websock.sent == ["1", "2"]
+
+    def test_bench_notify(self):
+        result = sparkl(
+            "bench",
+            "notify",
+            count=100)
+
+        modes = [item["attr"]["mode"] for item in result["content"]]
+        assert modes == ["unbatched", "batched"]
+        assert result["content"][0]["attr"]["bytes"] == \
+            result["content"][1]["attr"]["bytes"]
+
+    def test_load(self):
+        result = sparkl(
+            "load",
+            "test_rest",
+            "Mix/FirstDivisor",
+            count=200,
+            concurrency=4)
+
+        assert result["attr"]["replied"] == 200
+        assert result["attr"]["p50"] <= result["attr"]["p99"]
+
+    def test_load_stall(self):
+        """
+        With no replies, load stops once no slot frees in time.
+        """
+        result = sparkl(
+            "load",
+            "test_rest",
+            "Mix/Ignore",
+            count=200,
+            concurrency=2,
+            wait=0.3)
+
+        assert result["attr"]["stalled"]
+        assert result["attr"]["sent"] == 2
+        assert result["attr"]["replied"] == 0
@@ -0,0 +1,104 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test module for LatencyTable.py and the stats command.
+"""
+import json
+import os
+import tempfile
+
+import pytest
+
+from sparkl_cli import LatencyTable as latency_module
+from sparkl_cli.CliException import CliException
+from sparkl_cli.LatencyTable import LatencyTable
+from sparkl_cli.main import sparkl
+
+
+def pair(number, start_tag, end_tag, name, millis):
+    start = {
+        "tag": start_tag,
+        "id": "S-" + str(number),
+        "timestamp": 1000,
+        "attr": {
+            "name": name,
+            "service": "Svc"
+        }
+    }
+    end = {
+        "tag": end_tag,
+        "id": "E-" + str(number),
+        "timestamp": 1000 + millis,
+        "attr": {
+            "cause": ["S-" + str(number)]
+        }
+    }
+    return [start, end]
+
+
+class Tests():
+
+    def setup_method(self):
+        events = []
+        for number in range(1, 101):
+            events += pair(number, "request", "reply", "Req", number)
+        events += pair(0, "solicit", "response", "Sol", 7)
+        events.append({"tag": "data_event", "attr": {}})
+
+        (handle, self.path) = tempfile.mkstemp()
+        with os.fdopen(handle, "w") as data:
+            for term in events:
+                data.write(json.dumps(term) + "\n")
+            data.write("not json\n")
+
+    def teardown_method(self):
+        os.remove(self.path)
+
+    def test_exact(self):
+        result = sparkl("stats", self.path)
+        assert result["attr"] == {"events": 202, "unmatched": 0}
+
+        [operations, services] = result["content"]
+        [req, sol] = [row["attr"] for row in operations["content"]]
+        assert (req["kind"], req["name"], req["count"]) == \
+            ("request", "Req", 100)
+        assert req["p50"] == pytest.approx(50.0)
+        assert req["p99"] == pytest.approx(99.0)
+        assert req["max"] == pytest.approx(100.0)
+        assert (sol["kind"], sol["name"], sol["max"]) == \
+            ("solicit", "Sol", pytest.approx(7.0))
+
+        assert [row["attr"]["name"] for row in services["content"]] == \
+            ["Svc", "Svc"]
+
+    def test_streaming(self):
+        result = sparkl("stats", self.path, stream=True)
+        req = result["content"][0]["content"][0]["attr"]
+        assert req["count"] == 100
+        assert req["max"] == pytest.approx(100.0)
+        assert 25.0 <= req["p50"] <= 100.0
+
+    def test_without_numpy(self, monkeypatch):
+        monkeypatch.setattr(latency_module, "numpy", None)
+        table = LatencyTable()
+        for value in (0.004, 0.001, 0.003, 0.002):
+            table.add("request", "Op", value)
+        [row] = table.rows()
+        assert row["attr"]["p50"] == pytest.approx(2.0)
+        assert row["attr"]["max"] == pytest.approx(4.0)
+
+    def test_missing_file(self):
+        with pytest.raises(CliException):
+            sparkl("stats", self.path + ".missing")
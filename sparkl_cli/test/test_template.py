@@ -0,0 +1,115 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test module for Template.py.
+"""
+import pytest
+
+from sparkl_cli.CliException import CliException
+from sparkl_cli.StandIn import StandIn
+from sparkl_cli.Template import (
+    Template,
+    drop_template,
+    load_template,
+    save_template)
+from sparkl_cli.main import build_parser, sparkl
+
+OBJECTS = {
+    "S-1": {"tag": "reply", "attr": {"id": "S-1", "name": "Ok"}},
+    "F-1": {"tag": "field", "attr": {"id": "F-1", "name": "n",
+                                     "type": "integer"}}
+}
+
+
+def template():
+    return Template({
+        "id": "O-1",
+        "tag": "request",
+        "path": "/Scratch/Mix/Test",
+        "fields": [
+            ["F-1", "n", "integer"],
+            ["F-2", "s", "string"]]
+    })
+
+
+def reply():
+    return {
+        "tag": "data_event",
+        "attr": {"subject": "S-1"},
+        "content": [
+            {"tag": "datum", "attr": {"field": "F-1"}, "content": [1]}]
+    }
+
+
+class Tests():
+
+    def setup_method(self):
+        self.gets = []
+
+    def get(self, object_id):
+        self.gets.append(object_id)
+        return OBJECTS.get(object_id)
+
+    def test_data(self):
+        def default(field_id, _name, _type):
+            return {"tag": "datum", "attr": {"field": field_id},
+                    "content": ["x"]}
+
+        data = template().data({"n": "13"}, default)
+        assert [datum["content"] for datum in data] == [[13], ["x"]]
+        assert data[0]["attr"]["field"] == "F-1"
+
+        with pytest.raises(CliException):
+            template().data({"n": 1})
+
+        with pytest.raises(CliException):
+            template().data([1])
+
+    def test_simplify(self):
+        compiled = template()
+        result = compiled.simplify(reply(), self.get)
+        assert result["tag"] == "reply"
+        assert result["attr"] == {"id": "S-1", "name": "Ok"}
+        assert result["content"][0]["attr"]["name"] == "n"
+        assert result["content"][0]["attr"]["type"] == "integer"
+        assert compiled.learned
+
+        # Learned objects need no more gets.
+        assert compiled.simplify(reply(), self.get) == result
+        assert self.gets == ["S-1", "F-1"]
+        assert compiled.unknown(["S-1", "F-2"]) == ["F-2"]
+
+    def test_connection_state(self):
+        standin = StandIn().start()
+        try:
+            sparkl("connect", standin.url, alias="pytest_template")
+            args = build_parser().parse_args(
+                ["-a", "pytest_template", "call", "Test"])
+
+            compiled = template()
+            compiled.simplify(reply(), self.get)
+            save_template(args, compiled)
+            assert not compiled.learned
+
+            loaded = load_template(args, "/Scratch/Mix/Test")
+            assert loaded.struct == compiled.struct
+            assert load_template(args, "/Scratch/Mix/Other") is None
+
+            drop_template(args, loaded)
+            assert load_template(args, "/Scratch/Mix/Test") is None
+
+        finally:
+            sparkl("close", alias="pytest_template")
+            standin.close()
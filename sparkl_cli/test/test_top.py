@@ -0,0 +1,103 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test module for the rolling counters behind the top command.
+"""
+import pytest
+
+from sparkl_cli.CliException import CliException
+from sparkl_cli.Correlator import Correlator
+from sparkl_cli.Dashboard import Dashboard, render
+from sparkl_cli.Window import Window
+from sparkl_cli.main import sparkl
+
+
+def event(tag, event_id, stamp, name=None, causes=(), txn=None):
+    return {
+        "tag": tag,
+        "id": event_id,
+        "timestamp": stamp,
+        "attr": {
+            "name": name,
+            "cause": list(causes),
+            "txn": txn
+        }
+    }
+
+
+class Tests():
+
+    def test_window_rolls(self):
+        window = Window(secs=3)
+        for now in (0.1, 0.2, 1.5):
+            window.count(now)
+        window.count(1.6, error=True)
+        window.observe(1.7, 0.002)
+        assert window.rate(2.0) == 4 / 3.0
+        assert window.error_rate(2.0) == 0.25
+
+        # Second 0 leaves the window, then everything does.
+        assert window.rate(3.0) == 2 / 3.0
+        assert window.histogram(3.0).count == 1
+        assert window.rate(100.0) == 0.0
+        assert window.histogram(100.0).count == 0
+
+    def test_correlator(self):
+        correlator = Correlator(max_pending=1)
+        assert correlator.feed(event("request", "R1", 1000)) is None
+        (tag, start, secs) = correlator.feed(
+            event("reply", "P1", 1250, causes=["R1"]))
+        assert (tag, start["id"], secs) == ("request", "R1", 0.25)
+
+        # Only the newest start is held.
+        correlator.feed(event("solicit", "S1", 1000))
+        correlator.feed(event("solicit", "S2", 1000))
+        assert correlator.unmatched == 1
+        assert correlator.feed(
+            event("response", "X", 2000, causes=["S1"])) is None
+        assert correlator.feed(
+            event("response", "X", 2000, causes=["S2"]))[2] == 1.0
+
+    def test_dashboard(self):
+        dashboard = Dashboard(secs=10)
+        dashboard.feed(event("request", "R", 1000, "Op", txn="T"), 1.0)
+        dashboard.feed(
+            event("reply", "P", 1010, "Ok", causes=["R"], txn="T"), 1.1)
+        dashboard.feed(event("error_event", "E", 1020, "Op"), 1.2)
+        dashboard.feed({"tag": "listen_gap", "attr": {}}, 1.3)
+
+        snapshot = dashboard.snapshot(2.0)
+        assert snapshot["attr"]["active_txns"] == 1
+        assert snapshot["attr"]["gaps"] == 1
+        [first, second] = snapshot["content"]
+        assert first["attr"]["operation"] == "Op"
+        assert first["attr"]["err%"] == 50.0
+        assert first["attr"]["replies"] == 1
+        assert first["attr"]["maxms"] == 10.0
+        assert second["attr"]["operation"] == "Ok"
+
+        lines = render(snapshot)
+        assert lines[2].split()[0] == "operation"
+        assert lines[3].split()[0] == "Op"
+
+        assert dashboard.snapshot(20.0)["content"] == []
+        assert dashboard.snapshot(20.0)["attr"]["active_txns"] == 0
+
+    def test_bad_window(self):
+        with pytest.raises(CliException, match="window"):
+            sparkl(
+                "top",
+                "Scratch/Mix",
+                window=0)
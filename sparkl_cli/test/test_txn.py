@@ -0,0 +1,148 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test module for Assembler.py and the txn command.
+"""
+import io
+import json
+import os
+import signal
+import sys
+import threading
+
+from sparkl_cli.Assembler import Assembler
+from sparkl_cli.Filter import Filter
+from sparkl_cli.cmd_txn import assemble
+from sparkl_cli.main import sparkl
+
+
+def event(event_id, causes=(), txn=None, tag="data_event", stamp=0):
+    attr = {"cause": list(causes)}
+    if txn:
+        attr["txn"] = txn
+    return {
+        "tag": tag,
+        "id": event_id,
+        "timestamp": stamp,
+        "attr": attr
+    }
+
+
+def ids(node):
+    return [node["attr"]["id"],
+            [ids(child) for child in node["content"]]]
+
+
+class Tests():
+
+    def test_cause_chain(self):
+        assembler = Assembler(idle_secs=1)
+        for term in (event("A"), event("B", ["A"]),
+                     event("C", ["A"]), event("D", ["C"])):
+            assert assembler.add(term, 0) == []
+
+        [txn] = assembler.expire(1)
+        assert txn["attr"]["id"] == "A"
+        assert txn["attr"]["status"] == "idle"
+        assert txn["attr"]["events"] == 4
+        assert [ids(root) for root in txn["content"]] == \
+            [["A", [["B", []], ["C", [["D", []]]]]]]
+
+        # Late events for the emitted transaction are dropped.
+        assert assembler.add(event("E", ["D"], txn="A"), 2) == []
+        assert assembler.counts["late"] == 1
+
+    def test_out_of_order_and_cycle(self):
+        assembler = Assembler()
+        assembler.add(event("B", ["A"], txn="T"), 0)
+        assembler.add(event("A", ["B"], txn="T"), 0)
+        [txn] = assembler.drain()
+        assert txn["attr"]["status"] == "eof"
+        assert [ids(root) for root in txn["content"]] == \
+            [["A", [["B", []]]]]
+
+    def test_end_predicate(self):
+        end = Filter(wheres=["tag=reply"]).match
+        assembler = Assembler(end=end)
+        assembler.add(event("A", txn="T"), 0)
+        [txn] = assembler.add(event("B", ["A"], tag="reply"), 0)
+        assert txn["attr"]["status"] == "complete"
+        assert assembler.open == {}
+
+    def test_timeout(self):
+        assembler = Assembler(idle_secs=10, timeout_secs=3)
+        for now in range(3):
+            assembler.add(event("A" + str(now), txn="A"), now)
+        [txn] = assembler.add(event("B", txn="B"), 3)
+        assert txn["attr"]["status"] == "timeout"
+        assert txn["attr"]["events"] == 3
+
+    def test_eviction(self):
+        assembler = Assembler(max_txns=2, max_events=3)
+        assembler.add(event("B", txn="B"), 3)
+
+        assembler.add(event("C", txn="C"), 4)
+        [txn] = assembler.add(event("D", txn="D"), 5)
+        assert txn["attr"]["status"] == "evicted"
+        assert txn["attr"]["id"] == "B"
+
+        assembler.add(event("D2", txn="D"), 6)
+        [txn] = assembler.add(event("D3", txn="D"), 7)
+        assert txn["attr"]["id"] == "C"
+        assert assembler.events == 3
+        assert assembler.stats()["attr"]["evicted"] == 2
+
+    def test_command(self, monkeypatch):
+        terms = [
+            event("A", txn="T1", stamp=1000),
+            event("B", ["A"], stamp=1500),
+            event("C", txn="T2", stamp=9000),
+            event("D", ["C"], stamp=20000)]
+        text = "".join(json.dumps(term) + "\n" for term in terms)
+        monkeypatch.setattr(
+            sys, "stdin", io.TextIOWrapper(io.BytesIO(text.encode())))
+
+        results = list(sparkl(
+            "txn",
+            idle=5,
+            event_time=True,
+            stats=True))
+        assert [(result["attr"]["id"], result["attr"]["status"])
+                for result in results[:3]] == \
+            [("T1", "idle"), ("T2", "idle"), ("D", "eof")]
+        assert results[0]["attr"]["duration_ms"] == 500
+        assert results[3]["tag"] == "txn_stats"
+        assert results[3]["attr"]["idle"] == 2
+
+    def test_interrupt(self):
+        interrupted = threading.Event()
+
+        def source():
+            yield event("A", txn="T1")
+            yield event("B", ["A"])
+            interrupted.wait()
+
+        # A signal, as a blocked wait sees it at once.
+        threading.Timer(
+            0.2, os.kill, (os.getpid(), signal.SIGINT)).start()
+        results = list(assemble(
+            source(), Assembler(idle_secs=60), stats=True))
+        interrupted.set()
+
+        # The transaction still open is emitted as at the end of input.
+        assert [(result["attr"]["id"], result["attr"]["status"])
+                for result in results[:1]] == [("T1", "eof")]
+        assert results[0]["attr"]["events"] == 2
+        assert results[1]["tag"] == "txn_stats"
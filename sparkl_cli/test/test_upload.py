@@ -0,0 +1,76 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test module for upload.py.
+"""
+import base64
+import json
+
+from sparkl_cli import upload
+from sparkl_cli.cmd_call import var_to_datum
+from sparkl_cli.upload import BinaryFile
+
+BIG = "sparkl_cli/test/data/big.wav"
+
+PNG = "sparkl_cli/test/data/field2.png"
+
+
+def event(*values):
+    return {
+        "tag": "data_event",
+        "attr": {
+            "subject": "O-1"
+        },
+        "content": [{
+            "tag": "datum",
+            "attr": {
+                "field": "F-" + str(index)
+            },
+            "content": [value]
+        } for (index, value) in enumerate(values)]
+    }
+
+
+def encoded(path):
+    with open(path, "rb") as binary:
+        return base64.b64encode(binary.read()).decode("ascii")
+
+
+class Tests():
+
+    def test_plain(self):
+        term = event(1, "two")
+        assert json.loads(upload.body(term)) == term
+
+    def test_streamed(self):
+        chunks = upload.body(event(1, BinaryFile(BIG), BinaryFile(PNG)))
+        assert not isinstance(chunks, str)
+
+        text = b"".join(chunks)
+        assert json.loads(text) == event(1, encoded(BIG), encoded(PNG))
+
+    def test_chunks(self, tmpdir):
+        for size in (0, 1, 2, 3, 10, 11):
+            path = tmpdir.join(str(size) + ".bin")
+            path.write_binary(bytes(range(size)))
+            chunks = list(upload.b64_chunks(str(path), 3))
+            assert len(chunks) == (size + 2) // 3
+            assert b"".join(chunks).decode("ascii") == encoded(str(path))
+
+    def test_var_to_datum(self):
+        datum = var_to_datum("F-1", "audio", "binary", ["read", BIG])
+        [value] = datum["content"]
+        assert isinstance(value, BinaryFile)
+        assert value.path == BIG
@@ -0,0 +1,129 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Test hot reload of the service implementation module, using the
+local stand-in.
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from sparkl_cli.StandIn import StandIn
+from sparkl_cli.Watcher import Watcher
+from sparkl_cli.main import sparkl
+
+SERVICE = "Scratch/TestReload/REST"
+
+MODULE = """
+def onopen(service):
+    service.impl = {{
+        "Mix/Test": test}}
+
+
+def test(request, callback):
+    callback({{
+        "reply": "{Reply}"}})
+"""
+
+
+class Tests():
+
+    def setup_method(self):
+        self.dir = tempfile.mkdtemp()
+        self.module = os.path.join(self.dir, "reload_impl.py")
+        self.write("First")
+
+        self.standin = StandIn().start()
+        sparkl(
+            "connect",
+            self.standin.url,
+            alias="pytest_reload")
+
+    def teardown_method(self):
+        self.standin.close()
+        sparkl(
+            "close",
+            alias="pytest_reload")
+        shutil.rmtree(self.dir)
+        sys.modules.pop("reload_impl", None)
+
+    def write(self, reply):
+        with open(self.module, "w") as module_file:
+            module_file.write(MODULE.format(Reply=reply))
+
+    def request(self):
+        result = {}
+        done = threading.Event()
+
+        def callback(reply):
+            result["reply"] = reply["reply"]
+            done.set()
+
+        self.standin.request(SERVICE, "Mix/Test", {}, callback)
+        assert done.wait(1)
+        return result["reply"]
+
+    def test_watcher_calls_back(self):
+        changed = threading.Event()
+        watcher = Watcher(self.module, changed.set, poll_secs=0.1)
+        watcher.start()
+
+        self.write("Second")
+        assert changed.wait(2)
+        watcher.stop()
+
+    def test_reload_keeps_connection(self):
+        service = sparkl(
+            "service",
+            SERVICE,
+            "reload_impl",
+            path=self.dir,
+            watch=True,
+            alias="pytest_reload")
+        session = self.standin.wait_session(SERVICE)
+
+        assert self.request() == "Mix/Test/First"
+
+        self.write("Second")
+        deadline = time.time() + 3
+        while self.request() != "Mix/Test/Second":
+            assert time.time() < deadline
+            time.sleep(0.1)
+
+        assert self.standin.wait_session(SERVICE) is session
+        service.close()
+
+    def test_failed_reload_keeps_module(self):
+        service = sparkl(
+            "service",
+            SERVICE,
+            "reload_impl",
+            path=self.dir,
+            alias="pytest_reload")
+        self.standin.wait_session(SERVICE)
+        module = service.module
+
+        with open(self.module, "w") as module_file:
+            module_file.write("this is not python")
+
+        assert not service.reload()
+        assert service.module is module
+        assert self.request() == "Mix/Test/First"
+        service.close()
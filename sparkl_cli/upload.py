@@ -0,0 +1,188 @@
+"""
+Copyright 2018 SPARKL Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Streamed request bodies and responses for call, so that large binary
+field values are never held in memory.
+
+A datum value may be a BinaryFile instead of a base64 string. The
+body function then returns a generator of the JSON text in bytes,
+which requests sends as a chunked upload: the text up to the value,
+then the file base64 encoded a chunk at a time from a memory map, then
+the rest of the text. Otherwise it returns the JSON text as usual.
+
+In the other direction, a Base64File is the Scanner sink used by call
+--output-dir, which decodes a binary value into a file as it arrives,
+leaving in its place:
+
+    {
+        "tag": "file",
+        "attr": {
+            "path": "out/audio",
+            "bytes": 524288000
+        }
+    }
+"""
+from __future__ import print_function
+
+import base64
+import binascii
+import mmap
+import os
+import re
+import uuid
+
+from sparkl_cli import (
+    codec)
+
+from sparkl_cli.CliException import (
+    CliException)
+
+# File bytes encoded per chunk, a multiple of 3 so that chunks join
+# without base64 padding.
+CHUNK_BYTES = 3 * 256 * 1024
+
+
+class BinaryFile(object):  # pylint: disable=too-few-public-methods
+    """
+    A binary datum value to be streamed from the file at path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return "BinaryFile <" + self.path + ">"
+
+
+def body(term):
+    """
+    Returns the JSON text of the term, or a generator of its bytes if
+    any datum value is a BinaryFile.
+    """
+    files = {}
+    prefix = "sparkl-file-" + uuid.uuid4().hex + "-"
+
+    def placeholder(value):
+        """
+        Returns a unique placeholder for a BinaryFile value, noting its
+        file, or the value itself.
+        """
+        if not isinstance(value, BinaryFile):
+            return value
+        key = prefix + str(len(files))
+        files[key] = value
+        return key
+
+    content = []
+    for datum in term.get("content", []):
+        if isinstance(datum, dict) and "content" in datum:
+            datum = dict(datum)
+            datum["content"] = [
+                placeholder(value) for value in datum["content"]]
+        content.append(datum)
+
+    if not files:
+        return codec.dumps(term)
+
+    text = codec.dumps(dict(term, content=content))
+    return streamed(text, files)
+
+
+def streamed(text, files):
+    """
+    Generates the bytes of the JSON text, with each quoted placeholder
+    replaced by the base64 of its file.
+    """
+    pattern = re.compile(
+        '"(' + "|".join(re.escape(key) for key in files) + ')"')
+
+    position = 0
+    for match in pattern.finditer(text):
+        yield text[position:match.start()].encode("utf-8")
+        yield b'"'
+        for chunk in b64_chunks(files[match.group(1)].path):
+            yield chunk
+        yield b'"'
+        position = match.end()
+
+    yield text[position:].encode("utf-8")
+
+
+def b64_chunks(path, chunk_bytes=CHUNK_BYTES):
+    """
+    Generates the base64 encoding of the file, a chunk at a time, from
+    a memory map of it.
+    """
+    with open(path, "rb") as binary:
+        length = os.fstat(binary.fileno()).st_size
+        if not length:
+            return
+
+        with mmap.mmap(
+                binary.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, length, chunk_bytes):
+                yield base64.b64encode(mapped[start:start + chunk_bytes])
+
+
+class Base64File(object):
+    """
+    Scanner sink decoding base64 text into the file at path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")  # pylint: disable=consider-using-with
+        self.remainder = b""
+        self.bytes = 0
+
+    def write(self, data):
+        """
+        Decodes the whole groups of four characters so far.
+        """
+        data = self.remainder + data.translate(None, b"\r\n ")
+        whole = len(data) - len(data) % 4
+        self.remainder = data[whole:]
+        self.__decode(data[:whole])
+
+    def close(self):
+        """
+        Closes the file, returning the struct naming it.
+        """
+        try:
+            self.__decode(self.remainder)
+        finally:
+            self.file.close()
+
+        return {
+            "tag": "file",
+            "attr": {
+                "path": self.path,
+                "bytes": self.bytes
+            }
+        }
+
+    def __decode(self, data):
+        """
+        Decodes the data into the file.
+        """
+        try:
+            decoded = binascii.a2b_base64(data)
+        except binascii.Error as exc:
+            raise CliException(
+                "Bad base64 value for {Path}: {Error}".format(
+                    Path=self.path,
+                    Error=exc))
+        self.file.write(decoded)
+        self.bytes += len(decoded)